@@ -4,8 +4,35 @@ from aiogram import Router
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 
+from subscriptions.prediction_outcomes import live_accuracy, load_summary
+
 router = Router()
 
+
+def accuracy_text():
+    """Точность реальных прогнозов из ночной сводки; до первой сверки - историческая тестовая выборка"""
+    summary = load_summary()
+    windows = [
+        (title, live_accuracy(summary, window))
+        for title, window in (("за 30 дней", '30d'), ("за всё время", 'all'))
+    ]
+    lines = [
+        f"• Точность {title}: {metrics['accuracy']*100:.1f}% ({metrics['evaluated']} прогнозов)\n"
+        for title, metrics in windows if metrics
+    ]
+    if not lines:
+        return (
+            "• Реальные прогнозы еще не сверены с ценой\n"
+            "• Первая версия модели на тестовой выборке 2025 г.: 53.1% (AUC-ROC 0.537)\n"
+        )
+    strong = live_accuracy(summary, 'all')
+    if strong and strong['strong_accuracy'] is not None:
+        lines.append(f"• Сильные сигналы (≥70%): {strong['strong_accuracy']*100:.1f}% "
+                     f"({strong['strong_evaluated']} прогнозов)\n")
+    lines.append("• Прогнозы сверяются с фактической ценой каждую ночь\n")
+    return "".join(lines)
+
+
 @router.message(Command("faq"))
 async def faq_cmd(message: Message):
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -34,9 +61,7 @@ async def faq_cmd(message: Message):
         "   • Целевую цену\n\n"
         
         "<b>🎯 Насколько точны прогнозы?</b>\n"
-        "• Точность на тестовой выборке: 53.1%\n"
-        "• Это на 3.1% выше случайного угадывания\n"
-        "• AUC-ROC: 0.537\n"
+        f"{accuracy_text()}"
         "⚠️ Прогнозы носят информационный характер!\n"
         "Не являются финансовой рекомендацией!\n\n"
         
@@ -268,10 +268,8 @@ async def refresh_prediction_realtime(query: CallbackQuery):
     """
     Генерирует свежий прогноз в реальном времени
     """
-    from subscriptions.tasks import compute_features_for_coin
-    import joblib
+    from subscriptions.tasks import compute_features_for_coin, load_classifier
     import pandas as pd
-    from pathlib import Path
     
     coin_symbol = query.data.replace("refresh_pred_", "")
     
@@ -290,13 +288,9 @@ async def refresh_prediction_realtime(query: CallbackQuery):
             # 1. Получаем монету
             coin = CoinSnapshot.objects.get(symbol=symbol)
             
-            # 2. Загружаем модель
-            BASE_DIR = Path(__file__).resolve().parent.parent.parent
-            ML_MODELS_DIR = BASE_DIR / 'ml' / 'models'
-            
-            model = joblib.load(ML_MODELS_DIR / 'ml_classifier.pkl')
-            scaler = joblib.load(ML_MODELS_DIR / 'ml_classifier_scaler.pkl')
-            feature_cols = joblib.load(ML_MODELS_DIR / 'classifier_features.pkl')
+            # 2. Загружаем модель (скомпилированный классификатор)
+            model = load_classifier()
+            feature_cols = model.feature_cols
             
             # 3. Вычисляем признаки прямо сейчас
             features_df = compute_features_for_coin(coin)
@@ -305,11 +299,10 @@ async def refresh_prediction_realtime(query: CallbackQuery):
                 return None, "Недостаточно данных для прогноза"
             
             # 4. Предсказываем
-            X = features_df[feature_cols]
-            X_scaled = scaler.transform(X)
+            X = features_df[feature_cols].to_numpy(dtype=float)
             
-            direction_code = model.predict(X_scaled)[0]
-            probability = model.predict_proba(X_scaled)[0]
+            direction_code = model.predict(X)[0]
+            probability = model.predict_proba(X)[0]
             
             prob_down = float(probability[0])
             prob_up = float(probability[1])
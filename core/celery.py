@@ -2,6 +2,7 @@
 
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_process_init
 import os
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
@@ -10,6 +11,24 @@ app = Celery('core')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
+
+@worker_process_init.connect
+def preload_sentiment_models(**kwargs):
+    """
+    Прогрев моделей тональности в каждом процессе воркера,
+    чтобы первая задача не тратила время на загрузку весов.
+    При работе через сервер тональности (SENTIMENT_SERVER_URL) веса
+    в воркере не нужны
+    """
+    from django.conf import settings
+    from subscriptions.sentiment_registry import registry
+
+    if getattr(settings, 'SENTIMENT_SERVER_URL', ''):
+        return
+
+    registry.warmup(getattr(settings, 'SENTIMENT_PRELOAD_MODELS', []))
+
+
 # ============================================
 # CELERY BEAT РАСПИСАНИЕ
 # ============================================
@@ -47,6 +66,12 @@ app.conf.beat_schedule = {
         'schedule': crontab(hour=1, minute=0),
     },
     
+    # Сверка прогнозов с фактом и живая точность в 01:30 UTC (после сбора цен)
+    'score-prediction-outcomes': {
+        'task': 'subscriptions.tasks.score_prediction_outcomes',
+        'schedule': crontab(hour=1, minute=30),
+    },
+    
     # Рассылка прогнозов в 07:00 UTC (10:00 MSK)
     'send-daily-predictions': {
         'task': 'subscriptions.tasks.send_daily_predictions_to_users',
@@ -52,6 +52,68 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'  # Планировщик задач
 
 
+# Модели тональности
+# Какие модели прогревать при старте процесса воркера Celery (через запятую)
+SENTIMENT_PRELOAD_MODELS = [
+    name.strip()
+    for name in os.environ.get('SENTIMENT_PRELOAD_MODELS', 'finbert,custom').split(',')
+    if name.strip()
+]
+# Бэкенд инференса: torch (fp32), int8 (динамическая квантизация),
+# onnx / onnx_int8 (нужен экспорт: python manage.py export_sentiment_models)
+SENTIMENT_BACKEND = os.environ.get('SENTIMENT_BACKEND', 'torch')
+# Батчевый инференс: максимум текстов в пачке и бюджет batch × seq_len токенов
+SENTIMENT_BATCH_SIZE = int(os.environ.get('SENTIMENT_BATCH_SIZE', 32))
+SENTIMENT_MAX_BATCH_TOKENS = int(os.environ.get('SENTIMENT_MAX_BATCH_TOKENS', 8192))
+# Сколько новостей читать из БД за один запрос
+SENTIMENT_CHUNK_SIZE = int(os.environ.get('SENTIMENT_CHUNK_SIZE', 256))
+# Конвейерный прогон (чтение / токенизация / инференс / запись параллельно):
+# включен ли по умолчанию, потоки токенизации и размер очередей между шагами (в пачках)
+SENTIMENT_PIPELINED = os.environ.get('SENTIMENT_PIPELINED', '1') == '1'
+SENTIMENT_PIPELINE_TOKENIZE_WORKERS = int(os.environ.get('SENTIMENT_PIPELINE_TOKENIZE_WORKERS', 2))
+SENTIMENT_PIPELINE_QUEUE_SIZE = int(os.environ.get('SENTIMENT_PIPELINE_QUEUE_SIZE', 4))
+# Режим основного прохода тональности: finbert (все новости через FinBERT) или
+# cascade (сначала custom-модель, в FinBERT - только неуверенные новости)
+SENTIMENT_PIPELINE_MODE = os.environ.get('SENTIMENT_PIPELINE_MODE', 'finbert')
+# Модель основного прохода: finbert или distilled (ученик FinBERT,
+# ml/train_crypto_sentiment.py --distill)
+SENTIMENT_PRIMARY_MODEL = os.environ.get('SENTIMENT_PRIMARY_MODEL', 'finbert')
+# Порог уверенности custom-модели, ниже которого новость уходит в FinBERT
+SENTIMENT_CASCADE_THRESHOLD = float(os.environ.get('SENTIMENT_CASCADE_THRESHOLD', 0.85))
+# Сколько новостей, оцененных custom-моделью, перепроверять FinBERT за проход
+SENTIMENT_CASCADE_AUDIT_SIZE = int(os.environ.get('SENTIMENT_CASCADE_AUDIT_SIZE', 100))
+# Сервер инференса тональности (python manage.py run_sentiment_server).
+# Если адрес задан, задачи тональности ходят на сервер, а воркеры не грузят модели
+SENTIMENT_SERVER_URL = os.environ.get('SENTIMENT_SERVER_URL', '')
+SENTIMENT_SERVER_TIMEOUT = float(os.environ.get('SENTIMENT_SERVER_TIMEOUT', 120))
+# Окно сбора микро-пачки на сервере (мс) и максимум текстов в ней
+SENTIMENT_SERVER_BATCH_WINDOW_MS = float(os.environ.get('SENTIMENT_SERVER_BATCH_WINDOW_MS', 10))
+SENTIMENT_SERVER_MAX_BATCH = int(os.environ.get('SENTIMENT_SERVER_MAX_BATCH', 256))
+
+
+# Поиск почти одинаковых новостей (MinHash LSH)
+# Минимальное сходство Жаккара (по словам) для перепечаток одной истории
+NEWS_DEDUP_MIN_JACCARD = float(os.environ.get('NEWS_DEDUP_MIN_JACCARD', 0.75))
+# Перепечатки ищутся среди историй, опубликованных в пределах N дней
+NEWS_DEDUP_WINDOW_DAYS = int(os.environ.get('NEWS_DEDUP_WINDOW_DAYS', 7))
+# Считать в признаках уникальные истории вместо всех строк NewsArticle
+FEATURES_COUNT_UNIQUE_STORIES = os.environ.get('FEATURES_COUNT_UNIQUE_STORIES', '0') == '1'
+# Добавить к признакам классификатора технические индикаторы (RSI, MACD, ...; см. subscriptions/indicators.py)
+FEATURES_TECHNICAL_INDICATORS = os.environ.get('FEATURES_TECHNICAL_INDICATORS', '0') == '1'
+
+# Датасет классификатора: Parquet (ml/models/classification_data/month=YYYY-MM/)
+# Дополнительно выгружать classification_data.csv (для ручного анализа)
+CLASSIFICATION_EXPORT_CSV = os.environ.get('CLASSIFICATION_EXPORT_CSV', '0') == '1'
+
+# Подбор гиперпараметров классификатора (walk-forward, см. subscriptions/model_search.py)
+# Процессов для обучений (-1 - все ядра) и число разбиений по датам
+CLASSIFIER_SEARCH_JOBS = int(os.environ.get('CLASSIFIER_SEARCH_JOBS', '-1'))
+CLASSIFIER_SEARCH_SPLITS = int(os.environ.get('CLASSIFIER_SEARCH_SPLITS', '5'))
+
+# Движок классификатора по умолчанию: gbc, hgb, logreg (см. subscriptions/classifier_engines.py)
+CLASSIFIER_ENGINE = os.environ.get('CLASSIFIER_ENGINE', 'gbc')
+
+
 
 
 
@@ -1,6 +1,10 @@
 # ml/prepare_dataset.py
 
+import json
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from collections import defaultdict
 from datasets import load_dataset
 from pathlib import Path
 import sys
@@ -15,7 +19,25 @@ import django
 django.setup()
 
 # Теперь можем импортировать Django модели
-from subscriptions.models import NewsArticle, NewsSentiment
+from subscriptions.models import NewsSentiment
+from subscriptions.sentiment_inference import build_article_text
+
+
+SENTIMENT_LABELS = ['positive', 'negative', 'neutral']
+
+# Сколько id ниже водяного знака перечитывать: id выдаются при вставке, а
+# транзакции фиксируются не по порядку - разметка с меньшим id может появиться
+# после выгрузки больших. Должно покрывать разметки всех одновременных транзакций
+WATERMARK_OVERLAP_IDS = 20000
+
+NEWS_SCHEMA = pa.schema([
+    ('sentiment_id', pa.int64()),
+    ('article_id', pa.int64()),
+    ('published_at', pa.timestamp('us', tz='UTC')),
+    ('text', pa.string()),
+    ('sentiment', pa.string()),
+    ('source_model', pa.string()),
+])
 
 
 class CryptoDatasetBuilder:
@@ -45,31 +67,121 @@ class CryptoDatasetBuilder:
         print(f"✅ Загружено {len(df)} примеров")
         return df
     
-    def load_news_from_db(self):
-        """Загружаем новости из вашей БД"""
-        print("📥 Загружаю новости из БД...")
-        
-        # Новости с уже проставленным sentiment (от FinBERT)
-        news_qs = NewsArticle.objects.filter(
-            newssentiment__isnull=False
-        ).select_related('newssentiment')[:10000]
-        
-        data = []
-        for article in news_qs:
-            text = f"{article.title}. {article.description or ''}"
-            sentiment = article.newssentiment.sentiment_label
+    def export_news_parquet(self, chunk_size=5000):
+        """
+        Потоковая выгрузка размеченных новостей в Parquet
+        
+        Строки читаются через values_list(...).iterator(chunk_size=...) без
+        ограничения на количество и пишутся пачками в
+        news_labeled/month=YYYY-MM/part-<первый id>-<последний id>.parquet.
+        
+        Водяной знак (последний выгруженный NewsSentiment.id) хранится в
+        news_labeled/_watermark.json и обновляется после каждой пачки:
+        следующий запуск дописывает только новые разметки, а прерванный -
+        продолжает с последней записанной пачки. В памяти не больше одной пачки.
+        
+        Разметки, зафиксированные позже разметок с большим id, не теряются:
+        каждый запуск перечитывает WATERMARK_OVERLAP_IDS id ниже водяного знака,
+        а уже выгруженные id этого окна (recent_ids в _watermark.json) пропускает.
+        """
+        root = self.output_dir / 'news_labeled'
+        root.mkdir(parents=True, exist_ok=True)
+        watermark_file = root / '_watermark.json'
+        
+        watermark = 0
+        recent_ids = set()
+        if watermark_file.exists():
+            with open(watermark_file) as f:
+                state = json.load(f)
+            watermark = state['last_sentiment_id']
+            if 'recent_ids' in state:
+                recent_ids = set(state['recent_ids'])
+            elif any(root.glob('month=*/*.parquet')):
+                # Водяной знак старого формата - выгруженные id окна берем из файлов
+                recent_ids = set(pd.read_parquet(
+                    root, columns=['sentiment_id'],
+                    filters=[('sentiment_id', '>', watermark - WATERMARK_OVERLAP_IDS)],
+                )['sentiment_id'])
+        
+        rescan_from = max(watermark - WATERMARK_OVERLAP_IDS, 0)
+        print(f"📥 Выгружаю размеченные новости из БД (после sentiment_id={watermark}, "
+              f"окно перечитывания с {rescan_from})...")
+        
+        rows = (
+            NewsSentiment.objects
+            .filter(id__gt=rescan_from, sentiment_label__in=SENTIMENT_LABELS)
+            .order_by('id')
+            .values_list(
+                'id', 'article_id', 'article__published_at',
+                'article__title', 'article__description',
+                'sentiment_label', 'source_model',
+            )
+            .iterator(chunk_size=chunk_size)
+        )
+        
+        exported = 0
+        files = 0
+        chunk = []
+        
+        def flush(chunk):
+            by_month = defaultdict(list)
+            for row in chunk:
+                by_month[row[2].strftime('%Y-%m')].append(row)
             
-            # Нормализуем labels
-            if sentiment in ['positive', 'negative', 'neutral']:
-                data.append({'text': text, 'sentiment': sentiment})
-        
-        if data:
-            df = pd.DataFrame(data)
-            print(f"✅ Загружено {len(df)} новостей из БД")
-            return df
-        else:
+            written = 0
+            for month, month_rows in by_month.items():
+                table = pa.Table.from_pydict({
+                    'sentiment_id': [r[0] for r in month_rows],
+                    'article_id': [r[1] for r in month_rows],
+                    'published_at': [r[2] for r in month_rows],
+                    'text': [build_article_text(r[3], r[4]) for r in month_rows],
+                    'sentiment': [r[5] for r in month_rows],
+                    'source_model': [r[6] for r in month_rows],
+                }, schema=NEWS_SCHEMA)
+                
+                partition = root / f'month={month}'
+                partition.mkdir(exist_ok=True)
+                pq.write_table(table, partition / f'part-{month_rows[0][0]:012d}-{month_rows[-1][0]:012d}.parquet')
+                written += 1
+            
+            # Водяной знак - только после записи файлов пачки
+            nonlocal watermark, recent_ids
+            watermark = max(watermark, chunk[-1][0])
+            recent_ids.update(r[0] for r in chunk)
+            recent_ids = {i for i in recent_ids if i > watermark - WATERMARK_OVERLAP_IDS}
+            tmp = watermark_file.with_suffix('.json.tmp')
+            with open(tmp, 'w') as f:
+                json.dump({'last_sentiment_id': watermark, 'recent_ids': sorted(recent_ids)}, f)
+            os.replace(tmp, watermark_file)
+            return written
+        
+        for row in rows:
+            if row[0] in recent_ids:
+                continue
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                files += flush(chunk)
+                exported += len(chunk)
+                chunk = []
+                print(f"  Выгружено: {exported}")
+        if chunk:
+            files += flush(chunk)
+            exported += len(chunk)
+        
+        print(f"✅ Новых размеченных новостей: {exported} ({files} файлов) → {root}")
+        return root
+    
+    def load_news_from_db(self):
+        """Загружаем новости из вашей БД (через инкрементальную выгрузку в Parquet)"""
+        root = self.export_news_parquet()
+        
+        if not any(root.glob('month=*/*.parquet')):
             print("⚠️ Нет новостей с sentiment в БД")
             return pd.DataFrame()
+        
+        df = pd.read_parquet(root, columns=['text', 'sentiment'])
+        print(f"✅ Загружено {len(df)} новостей из БД")
+        return df
     
     def combine_datasets(self):
         """
@@ -2,10 +2,10 @@
 
 import pandas as pd
 import torch
-from torch.utils.data import Dataset
 from transformers import (
     AutoTokenizer,
     AutoModelForSequenceClassification,
+    DataCollatorWithPadding,
     Trainer,
     TrainingArguments
 )
@@ -13,39 +13,79 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, classification_report
 from sklearn.utils.class_weight import compute_class_weight
 import numpy as np
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import datetime
 from pathlib import Path
 
+STUDENT_LABELS = ['negative', 'neutral', 'positive']
+TOKENIZED_CACHE_DIR = Path('ml/data/tokenized')
 
-class CryptoSentimentDataset(Dataset):
-    """Dataset для обучения"""
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django():
+    """Django нужен только для дистилляции (корпус новостей и FinBERT из реестра)"""
+    sys.path.insert(0, PROJECT_ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    import django
+    django.setup()
+
+
+def tokenizer_fingerprint(tokenizer):
+    """Хэш токенизатора (словарь, правила, спец-токены) для ключа кэша"""
+    from datasets.fingerprint import Hasher
+    return Hasher.hash(tokenizer)
+
+
+def build_tokenized_dataset(texts, labels, tokenizer, max_length=128, cache_dir=TOKENIZED_CACHE_DIR):
+    """
+    Токенизирует тексты один раз и сохраняет Arrow-датасет на диск.
     
-    def __init__(self, texts, labels, tokenizer, max_length=128):
-        self.texts = texts
-        self.labels = labels
-        self.tokenizer = tokenizer
-        self.max_length = max_length
+    Ключ кэша - хэш токенизатора, max_length, текстов и меток: повторный
+    запуск на тех же данных берет готовый датасет через load_from_disk
+    (memory-mapped, без загрузки в память). Паддинга нет - он делается
+    по пачке в DataCollatorWithPadding. Колонка length нужна для
+    group_by_length.
+    """
+    from datasets import Dataset as ArrowDataset, load_from_disk
     
-    def __len__(self):
-        return len(self.texts)
+    labels = np.asarray(labels)
+    digest = hashlib.sha256()
+    digest.update(tokenizer_fingerprint(tokenizer).encode())
+    digest.update(str(max_length).encode())
+    for text in texts:
+        digest.update(str(text).encode('utf-8'))
+        digest.update(b'\0')
+    digest.update(str(labels.dtype).encode())
+    digest.update(np.ascontiguousarray(labels).tobytes())
+    cache_path = Path(cache_dir) / digest.hexdigest()[:16]
     
-    def __getitem__(self, idx):
-        text = str(self.texts[idx])
-        label = self.labels[idx]
-        
-        encoding = self.tokenizer(
-            text,
-            add_special_tokens=True,
-            max_length=self.max_length,
-            padding='max_length',
-            truncation=True,
-            return_tensors='pt'
-        )
-        
-        return {
-            'input_ids': encoding['input_ids'].flatten(),
-            'attention_mask': encoding['attention_mask'].flatten(),
-            'labels': torch.tensor(label, dtype=torch.long)
-        }
+    if (cache_path / 'dataset_info.json').exists():
+        print(f"📦 Токенизированный датасет из кэша: {cache_path}")
+        return load_from_disk(str(cache_path))
+    
+    print(f"🔤 Токенизирую {len(texts)} текстов → {cache_path}")
+    dataset = ArrowDataset.from_dict({
+        'text': [str(t) for t in texts],
+        'labels': labels.tolist(),
+    })
+    
+    def tokenize(batch):
+        encoded = tokenizer(batch['text'], truncation=True, max_length=max_length)
+        encoded['length'] = [len(ids) for ids in encoded['input_ids']]
+        return encoded
+    
+    dataset = dataset.map(tokenize, batched=True, remove_columns=['text'])
+    
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    dataset.save_to_disk(str(cache_path))
+    return load_from_disk(str(cache_path))
 
 
 class ImprovedCryptoTrainer:
@@ -56,7 +96,8 @@ class ImprovedCryptoTrainer:
     def __init__(self, data_path='ml/data/combined_dataset.csv'):
         self.data_path = Path(data_path)
         self.model_dir = Path('ml/models/crypto_sentiment')
-        self.model_dir.mkdir(parents=True, exist_ok=True)
+        self.checkpoints_dir = Path('ml/models/crypto_sentiment_checkpoints')
+        self.checkpoints_dir.mkdir(parents=True, exist_ok=True)
         
         self.label_map = {
             'negative': 0,
@@ -121,14 +162,14 @@ class ImprovedCryptoTrainer:
             label2id=self.label_map
         )
         
-        # Datasets
-        train_dataset = CryptoSentimentDataset(
+        # Datasets (токенизация один раз, кэш на диске)
+        train_dataset = build_tokenized_dataset(
             train_df['text'].values,
             train_df['label'].values,
             tokenizer
         )
         
-        val_dataset = CryptoSentimentDataset(
+        val_dataset = build_tokenized_dataset(
             val_df['text'].values,
             val_df['label'].values,
             tokenizer
@@ -156,7 +197,7 @@ class ImprovedCryptoTrainer:
         
         # Training arguments
         training_args = TrainingArguments(
-            output_dir=str(self.model_dir / 'checkpoints'),
+            output_dir=str(self.checkpoints_dir),
             num_train_epochs=epochs,
             per_device_train_batch_size=batch_size,
             per_device_eval_batch_size=batch_size,
@@ -168,6 +209,7 @@ class ImprovedCryptoTrainer:
             save_strategy='epoch',
             load_best_model_at_end=True,
             metric_for_best_model='accuracy',
+            group_by_length=True,
         )
         
         def compute_metrics(pred):
@@ -181,6 +223,7 @@ class ImprovedCryptoTrainer:
             args=training_args,
             train_dataset=train_dataset,
             eval_dataset=val_dataset,
+            data_collator=DataCollatorWithPadding(tokenizer),
             compute_metrics=compute_metrics,
         )
         
@@ -189,7 +232,7 @@ class ImprovedCryptoTrainer:
         
         # Test evaluation
         print("\n📊 Оценка на test set...")
-        test_dataset = CryptoSentimentDataset(
+        test_dataset = build_tokenized_dataset(
             test_df['text'].values,
             test_df['label'].values,
             tokenizer
@@ -209,17 +252,309 @@ class ImprovedCryptoTrainer:
             target_names=['negative', 'neutral', 'positive']
         ))
         
-        # Сохраняем
-        print(f"\n💾 Сохраняю модель...")
-        model.save_pretrained(self.model_dir)
-        tokenizer.save_pretrained(self.model_dir)
+        # Сохраняем рядом и подменяем каталог целиком: воркеры перечитывают
+        # модель по изменению файлов и не должны увидеть половину новой версии
+        sys.path.insert(0, PROJECT_ROOT)
+        from subscriptions.artifacts import atomic_directory
+        
+        # Версия модели - model_version оценок в CustomModelSentiment и SentimentCache
+        version = f"custom_distilbert_{datetime.now().strftime('%Y%m%d_%H%M')}"
+        
+        print(f"\n💾 Сохраняю модель {version}...")
+        with atomic_directory(self.model_dir) as new_dir:
+            model.save_pretrained(new_dir)
+            tokenizer.save_pretrained(new_dir)
+            with open(new_dir / 'model_version.json', 'w') as f:
+                json.dump({'version': version, 'trained_at': datetime.now().isoformat()}, f, indent=2)
         
         print("✅ Обучение завершено!")
         
         return model, tokenizer, accuracy_score(labels, preds)
 
 
+class FinBertDistiller:
+    """
+    Дистилляция FinBERT в маленькую модель-ученика
+    
+    1. FinBERT размечает новости из БД (NewsArticle) мягкими метками -
+       вероятностями классов. Разметка кэшируется в teacher_cache и при
+       повторном запуске досчитывается только для новых новостей.
+    2. Ученик обучается на смеси KL(ученик || учитель) с температурой
+       и cross-entropy по жестким меткам учителя.
+    3. Проверка качества на отложенных (самых свежих) новостях: совпадение
+       меток с FinBERT и ускорение относительно FinBERT. Только прошедшая
+       проверку версия становится текущей (current.json), ее берет
+       SENTIMENT_PRIMARY_MODEL=distilled.
+    """
+    
+    def __init__(self, output_root='ml/models/crypto_sentiment_distilled',
+                 teacher_cache='ml/data/finbert_teacher.csv'):
+        setup_django()
+        
+        self.output_root = Path(output_root)
+        self.output_root.mkdir(parents=True, exist_ok=True)
+        self.teacher_cache = Path(teacher_cache)
+        self.teacher_cache.parent.mkdir(parents=True, exist_ok=True)
+        
+        self.label_map = {label: i for i, label in enumerate(STUDENT_LABELS)}
+        self.id2label = {i: label for label, i in self.label_map.items()}
+        
+        print("🚀 Инициализация дистилляции FinBERT...")
+    
+    def collect_teacher_targets(self, limit=None, chunk_size=512):
+        """Мягкие метки FinBERT для новостей из БД (с кэшем на диске)"""
+        from subscriptions.models import NewsArticle
+        from subscriptions.sentiment_inference import BatchedSentimentEngine, build_article_text, iter_article_chunks
+        
+        columns = ['article_id', 'text'] + [f'p_{label}' for label in STUDENT_LABELS]
+        if self.teacher_cache.exists():
+            cached = pd.read_csv(self.teacher_cache)
+        else:
+            cached = pd.DataFrame(columns=columns)
+        
+        known_ids = set(cached['article_id'].astype(int))
+        articles = NewsArticle.objects.exclude(id__in=known_ids) if known_ids else NewsArticle.objects.all()
+        if limit:
+            articles = articles.filter(id__in=list(articles.order_by('-id').values_list('id', flat=True)[:limit]))
+        
+        total = articles.count()
+        print(f"📥 Разметка FinBERT: в кэше {len(cached)}, новых новостей {total}")
+        
+        teacher = BatchedSentimentEngine('finbert', backend='torch')
+        order = [teacher.spec.labels.index(label) for label in STUDENT_LABELS]
+        
+        rows = []
+        for chunk in iter_article_chunks(articles, chunk_size):
+            texts = [build_article_text(title, description) for _, title, description, *_ in chunk]
+            probs = teacher.predict_proba(texts)
+            for (article_id, *_), text, row in zip(chunk, texts, probs):
+                rows.append([article_id, text] + [row[i] for i in order])
+            print(f"  Размечено: {len(rows)}/{total}")
+        
+        if rows:
+            cached = pd.concat([cached, pd.DataFrame(rows, columns=columns)], ignore_index=True)
+            cached.to_csv(self.teacher_cache, index=False)
+        
+        return cached.sort_values('article_id').reset_index(drop=True)
+    
+    def split(self, df, val_share=0.1, test_share=0.1):
+        """Разделение по времени: самые свежие новости - в test, перед ними - val"""
+        n = len(df)
+        n_test = int(n * test_share)
+        n_val = int(n * val_share)
+        train_df = df.iloc[:n - n_val - n_test]
+        val_df = df.iloc[n - n_val - n_test:n - n_test]
+        test_df = df.iloc[n - n_test:]
+        
+        print(f"\n✂️ Разделение:")
+        print(f"   Train: {len(train_df)}")
+        print(f"   Val: {len(val_df)}")
+        print(f"   Test: {len(test_df)}")
+        return train_df, val_df, test_df
+    
+    @staticmethod
+    def soft_targets(df):
+        return df[[f'p_{label}' for label in STUDENT_LABELS]].values.astype(np.float32)
+    
+    def train(self, student_name='prajjwal1/bert-tiny', epochs=5, batch_size=32, learning_rate=5e-5,
+              temperature=2.0, alpha=0.7, limit=None, min_agreement=0.85, min_speedup=10.0):
+        """Дистилляция + проверка качества. Возвращает метаданные версии"""
+        print(f"\n🎯 Дистилляция FinBERT → {student_name} (T={temperature}, alpha={alpha})")
+        
+        df = self.collect_teacher_targets(limit=limit)
+        if len(df) < 100:
+            raise ValueError(f"Слишком мало новостей для дистилляции: {len(df)}")
+        train_df, val_df, test_df = self.split(df)
+        
+        version = f"distilled_{student_name.split('/')[-1]}_{datetime.now().strftime('%Y%m%d_%H%M')}"
+        version_dir = self.output_root / version
+        
+        tokenizer = AutoTokenizer.from_pretrained(student_name)
+        model = AutoModelForSequenceClassification.from_pretrained(
+            student_name,
+            num_labels=3,
+            id2label=self.id2label,
+            label2id=self.label_map
+        )
+        
+        train_dataset = build_tokenized_dataset(train_df['text'].values, self.soft_targets(train_df), tokenizer)
+        val_dataset = build_tokenized_dataset(val_df['text'].values, self.soft_targets(val_df), tokenizer)
+        
+        class DistillationTrainer(Trainer):
+            def compute_loss(self, model, inputs, return_outputs=False, num_items_in_batch=None):
+                teacher_probs = inputs.pop("labels")
+                outputs = model(**inputs)
+                logits = outputs.logits
+                
+                # Смягчение учителя: softmax(log p / T) == p^(1/T) / sum
+                teacher_soft = teacher_probs.clamp_min(1e-8) ** (1.0 / temperature)
+                teacher_soft = teacher_soft / teacher_soft.sum(dim=-1, keepdim=True)
+                kl = torch.nn.functional.kl_div(
+                    torch.nn.functional.log_softmax(logits / temperature, dim=-1),
+                    teacher_soft,
+                    reduction='batchmean',
+                ) * temperature ** 2
+                ce = torch.nn.functional.cross_entropy(logits, teacher_probs.argmax(dim=-1))
+                
+                loss = alpha * kl + (1 - alpha) * ce
+                return (loss, outputs) if return_outputs else loss
+        
+        training_args = TrainingArguments(
+            output_dir=str(self.output_root / 'checkpoints'),
+            num_train_epochs=epochs,
+            per_device_train_batch_size=batch_size,
+            per_device_eval_batch_size=batch_size,
+            learning_rate=learning_rate,
+            warmup_steps=100,
+            weight_decay=0.01,
+            logging_steps=50,
+            eval_strategy='epoch',
+            save_strategy='epoch',
+            load_best_model_at_end=True,
+            metric_for_best_model='agreement',
+            group_by_length=True,
+        )
+        
+        def compute_metrics(pred):
+            teacher_labels = pred.label_ids.argmax(-1)
+            preds = pred.predictions.argmax(-1)
+            return {'agreement': accuracy_score(teacher_labels, preds)}
+        
+        trainer = DistillationTrainer(
+            model=model,
+            args=training_args,
+            train_dataset=train_dataset,
+            eval_dataset=val_dataset,
+            data_collator=DataCollatorWithPadding(tokenizer),
+            compute_metrics=compute_metrics,
+        )
+        
+        print("\n🏋️ Обучение началось...")
+        trainer.train()
+        
+        print(f"\n💾 Сохраняю {version}...")
+        model.save_pretrained(version_dir)
+        tokenizer.save_pretrained(version_dir)
+        
+        gate = self.quality_gate(version, version_dir, test_df, min_agreement, min_speedup)
+        
+        meta = {
+            'version': version,
+            'student': student_name,
+            'teacher': 'ProsusAI/finbert',
+            'temperature': temperature,
+            'alpha': alpha,
+            'epochs': epochs,
+            'train_size': len(train_df),
+            'val_size': len(val_df),
+            'test_size': len(test_df),
+            'trained_at': datetime.now().isoformat(),
+            **gate,
+        }
+        with open(version_dir / 'distill_meta.json', 'w') as f:
+            json.dump(meta, f, indent=2)
+        
+        if gate['passed']:
+            self.promote(version)
+            print(f"✅ {version} прошла проверку и стала текущей моделью")
+        else:
+            print(f"❌ {version} не прошла проверку, текущая модель не изменена")
+        
+        return meta
+    
+    def quality_gate(self, version, version_dir, test_df, min_agreement, min_speedup, speed_sample=512):
+        """
+        Совпадение меток ученика с FinBERT на test и ускорение относительно
+        FinBERT (одинаковый батчевый инференс, одни и те же тексты)
+        """
+        from subscriptions.sentiment_inference import BatchedSentimentEngine
+        from subscriptions.sentiment_registry import ModelSpec, registry
+        
+        registry.register(ModelSpec(
+            'distilled_candidate', str(version_dir), version, STUDENT_LABELS,
+            max_length=128, score_mode='difference', local=True,
+        ))
+        
+        texts = list(test_df['text'].values)
+        teacher_labels = [STUDENT_LABELS[i] for i in self.soft_targets(test_df).argmax(axis=1)]
+        
+        student = BatchedSentimentEngine('distilled_candidate', backend='torch')
+        predictions = student.predict(texts)
+        agreement = accuracy_score(teacher_labels, [p['sentiment_label'] for p in predictions])
+        
+        print("\n" + "="*60)
+        print("ПРОВЕРКА КАЧЕСТВА (test, ученик против FinBERT):")
+        print("="*60)
+        print(f"\nСовпадение меток: {agreement:.4f} (порог {min_agreement})")
+        print(classification_report(
+            teacher_labels, [p['sentiment_label'] for p in predictions],
+            labels=STUDENT_LABELS, zero_division=0
+        ))
+        
+        # Скорость: прогрев, затем замер на одних и тех же текстах
+        sample = texts[:speed_sample]
+        seconds = {}
+        for name in ('finbert', 'distilled_candidate'):
+            engine = BatchedSentimentEngine(name, backend='torch')
+            engine.predict(sample[:8])
+            started = time.perf_counter()
+            engine.predict(sample)
+            seconds[name] = time.perf_counter() - started
+        
+        speedup = seconds['finbert'] / seconds['distilled_candidate'] if seconds['distilled_candidate'] else 0.0
+        print(f"Скорость на {len(sample)} новостях: FinBERT {seconds['finbert']:.2f}s, "
+              f"ученик {seconds['distilled_candidate']:.2f}s (x{speedup:.1f}, порог x{min_speedup})")
+        
+        return {
+            'agreement': round(float(agreement), 4),
+            'speedup': round(speedup, 2),
+            'finbert_ms_per_article': round(seconds['finbert'] / len(sample) * 1000, 3),
+            'student_ms_per_article': round(seconds['distilled_candidate'] / len(sample) * 1000, 3),
+            'min_agreement': min_agreement,
+            'min_speedup': min_speedup,
+            'passed': bool(agreement >= min_agreement and speedup >= min_speedup),
+        }
+    
+    def promote(self, version):
+        """Делает версию текущей (атомарная запись current.json)"""
+        current = self.output_root / 'current.json'
+        tmp = current.with_suffix('.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump({'version': version, 'promoted_at': datetime.now().isoformat()}, f, indent=2)
+        os.replace(tmp, current)
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Обучение модели тональности')
+    parser.add_argument('--distill', action='store_true',
+                        help='Дистилляция FinBERT на новостях из БД вместо обучения на combined_dataset.csv')
+    parser.add_argument('--student', default='prajjwal1/bert-tiny', help='Базовая модель ученика')
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--temperature', type=float, default=2.0)
+    parser.add_argument('--alpha', type=float, default=0.7, help='Вес KL-части в loss')
+    parser.add_argument('--limit', type=int, default=None, help='Сколько последних новостей разметить')
+    parser.add_argument('--min-agreement', type=float, default=0.85)
+    parser.add_argument('--min-speedup', type=float, default=10.0)
+    args = parser.parse_args()
+    
+    if args.distill:
+        print("="*60)
+        print("🧪 ДИСТИЛЛЯЦИЯ FINBERT")
+        print("="*60)
+        
+        meta = FinBertDistiller().train(
+            student_name=args.student,
+            epochs=args.epochs,
+            temperature=args.temperature,
+            alpha=args.alpha,
+            limit=args.limit,
+            min_agreement=args.min_agreement,
+            min_speedup=args.min_speedup,
+        )
+        
+        print(f"\n🎉 {meta['version']}: совпадение {meta['agreement']:.4f}, ускорение x{meta['speedup']}")
+        sys.exit(0 if meta['passed'] else 1)
+    
     print("="*60)
     print("🎓 УЛУЧШЕННОЕ ОБУЧЕНИЕ МОДЕЛИ")
     print("="*60)
@@ -149,12 +149,12 @@ from subscriptions.models import NewsSentiment
 
 from django.contrib import admin
 from django.utils.html import format_html
-from subscriptions.models import NewsSentiment, CustomModelSentiment
+from subscriptions.models import NewsSentiment, CustomModelSentiment, SentimentCache, NewsStory, CoinDailySentiment, CoinFeatureSnapshot, CoinRollingState, PredictionAccuracyStat
 
 @admin.register(NewsSentiment)
 class NewsSentimentAdmin(admin.ModelAdmin):
-    list_display = ['article_title', 'coin_symbol', 'sentiment_display', 'confidence_display', 'analyzed_at']
-    list_filter = ['sentiment_label', 'analyzed_at']
+    list_display = ['article_title', 'coin_symbol', 'sentiment_display', 'confidence_display', 'source_model', 'analyzed_at']
+    list_filter = ['sentiment_label', 'source_model', 'analyzed_at']
     search_fields = ['article__title', 'article__coin__symbol']
     
     def article_title(self, obj):
@@ -221,6 +221,59 @@ class CustomModelSentimentAdmin(admin.ModelAdmin):
 
 
 
+@admin.register(NewsStory)
+class NewsStoryAdmin(admin.ModelAdmin):
+    list_display = ['id', 'canonical_title', 'article_count', 'first_published_at']
+    ordering = ['-first_published_at']
+    search_fields = ['canonical_article__title']
+    
+    def canonical_title(self, obj):
+        return obj.canonical_article.title[:80] if obj.canonical_article else '-'
+    canonical_title.short_description = 'Новость'
+
+
+@admin.register(CoinDailySentiment)
+class CoinDailySentimentAdmin(admin.ModelAdmin):
+    list_display = ['coin', 'date', 'model_version', 'article_count', 'scored_count', 'avg_sentiment', 'positive_count', 'negative_count', 'story_count']
+    list_filter = ['model_version', 'coin']
+    ordering = ['-date']
+    
+    def avg_sentiment(self, obj):
+        return round(obj.sentiment_sum / obj.scored_count, 3) if obj.scored_count else 0.0
+    avg_sentiment.short_description = 'Средняя тональность'
+
+
+@admin.register(CoinFeatureSnapshot)
+class CoinFeatureSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['coin', 'date', 'feature_set_version', 'price', 'price_change_percent', 'computed_at']
+    list_filter = ['feature_set_version', 'coin']
+    ordering = ['-date']
+
+
+@admin.register(CoinRollingState)
+class CoinRollingStateAdmin(admin.ModelAdmin):
+    list_display = ['coin', 'last_date', 'window', 'days_seen', 'price_mean', 'updated_at']
+    ordering = ['coin']
+
+
+@admin.register(PredictionAccuracyStat)
+class PredictionAccuracyStatAdmin(admin.ModelAdmin):
+    list_display = ['model_version', 'coin', 'window_days', 'evaluated', 'correct', 'accuracy', 'date_to', 'updated_at']
+    list_filter = ['model_version', 'window_days']
+    ordering = ['model_version', 'window_days', 'coin']
+
+
+@admin.register(SentimentCache)
+class SentimentCacheAdmin(admin.ModelAdmin):
+    list_display = ['fingerprint_short', 'model_version', 'sentiment_label', 'sentiment_score', 'confidence', 'created_at']
+    list_filter = ['model_version', 'sentiment_label']
+    search_fields = ['fingerprint']
+    
+    def fingerprint_short(self, obj):
+        return format_html('<code>{}</code>', obj.fingerprint[:16])
+    fingerprint_short.short_description = 'Отпечаток'
+
+
 @admin.register(PriceEvent)
 class PriceEventAdmin(admin.ModelAdmin):
     list_display = ['coin', 'date', 'event_type', 'price_change_percent', 'news_count']
@@ -247,9 +300,11 @@ class DirectionPredictionAdmin(admin.ModelAdmin):
         'estimated_change_colored',
         'current_price',
         'estimated_price',
+        'actual_change_percent',
+        'is_correct',
         'created_at'
     ]
-    list_filter = ['prediction_date', 'predicted_direction', 'coin']
+    list_filter = ['prediction_date', 'predicted_direction', 'is_correct', 'model_version', 'coin']
     search_fields = ['coin__symbol', 'coin__name']
     ordering = ['-prediction_date', '-confidence_score']
     readonly_fields = ['created_at']
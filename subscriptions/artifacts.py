@@ -0,0 +1,248 @@
+# subscriptions/artifacts.py
+
+"""
+Процессный кэш артефактов из ml/models/ с горячей заменой
+
+Каждый артефакт (файл или каталог модели) загружается один раз на процесс.
+При каждом обращении кэш сверяет подпись на диске - stat файла
+(mtime_ns, размер, inode), для каталога - stat его файлов верхнего уровня.
+Это несколько системных вызовов, без чтения содержимого. Если подпись
+изменилась (обучение записало новую версию), артефакт перечитывается и
+подменяется одной заменой ссылки: параллельные обращения получают либо
+старую, либо новую версию целиком. Если новая версия не читается, остается
+работать старая.
+
+Запись артефактов - через atomic_write / atomic_directory: новая версия
+пишется рядом и подменяет старую переименованием, поэтому читатель никогда
+не видит наполовину записанный файл.
+
+Живые версии (что загружено в этом процессе и что лежит на диске) -
+describe(), отдаются в /api/model/info/.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+ML_MODELS_DIR = BASE_DIR / 'ml' / 'models'
+
+# Артефакты, версии которых показываются в describe()
+TRACKED_ARTIFACTS = {
+    'classifier': ML_MODELS_DIR / 'ml_classifier.npz',
+    'model_report': ML_MODELS_DIR / 'model_report.json',
+    'prediction_accuracy': ML_MODELS_DIR / 'prediction_accuracy.json',
+    'custom_sentiment': ML_MODELS_DIR / 'crypto_sentiment',
+    'distilled_sentiment': ML_MODELS_DIR / 'crypto_sentiment_distilled' / 'current.json',
+}
+
+
+def signature(path):
+    """
+    Подпись артефакта по stat: для файла - (inode, mtime_ns, размер),
+    для каталога - то же по каждому файлу верхнего уровня. None, если нет
+    """
+    path = Path(path)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    if not path.is_dir():
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    files = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_file():
+                file_stat = entry.stat()
+                files.append((entry.name, file_stat.st_mtime_ns, file_stat.st_size))
+    return (stat.st_ino, tuple(sorted(files)))
+
+
+def version_id(sig):
+    """Короткий идентификатор версии по подписи"""
+    if sig is None:
+        return None
+    return hashlib.sha1(repr(sig).encode()).hexdigest()[:12]
+
+
+def _modified_at(sig):
+    if sig is None:
+        return None
+    if isinstance(sig[1], tuple):
+        mtimes = [mtime for _, mtime, _ in sig[1]]
+        mtime_ns = max(mtimes) if mtimes else 0
+    else:
+        mtime_ns = sig[1]
+    return datetime.fromtimestamp(mtime_ns / 1e9).isoformat()
+
+
+def load_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _tmp_path(path, tag):
+    return path.with_name(f".{path.name}.{tag}-{os.getpid()}-{threading.get_ident()}")
+
+
+@contextmanager
+def atomic_write(path, mode='wb'):
+    """Файл для записи новой версии path; подменяет path после успешной записи"""
+    path = Path(path)
+    tmp = _tmp_path(path, 'tmp')
+    try:
+        with open(tmp, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+@contextmanager
+def atomic_directory(path):
+    """Пустой каталог для новой версии path; подменяет path после успешной записи"""
+    path = Path(path)
+    tmp = _tmp_path(path, 'tmp')
+    old = _tmp_path(path, 'old')
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    try:
+        yield tmp
+        if path.exists():
+            os.replace(path, old)
+        os.replace(tmp, path)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+        shutil.rmtree(old, ignore_errors=True)
+
+
+class Artifact:
+    """Загруженная версия артефакта"""
+
+    def __init__(self, path, value, sig, load_seconds):
+        self.path = path
+        self.value = value
+        self.signature = sig
+        self.version = version_id(sig)
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.hits = 0
+        # Подпись версии на диске, которую не удалось загрузить (не пробуем снова)
+        self.failed_signature = None
+
+    def is_current(self, sig):
+        return sig in (self.signature, self.failed_signature)
+
+    def stats(self):
+        return {
+            'version': self.version,
+            'modified_at': _modified_at(self.signature),
+            'loaded_at': datetime.fromtimestamp(self.loaded_at).isoformat(),
+            'load_seconds': round(self.load_seconds, 4),
+            'hits': self.hits,
+        }
+
+
+class ArtifactCache:
+    """
+    Кэш артефактов процесса: get(path, loader) возвращает loader(path),
+    перечитывая его только после изменения файла на диске.
+    loader - функция уровня модуля (ключ кэша - путь и loader)
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def get(self, path, loader):
+        path = Path(path)
+        key = (path, loader)
+        sig = signature(path)
+        entry = self._entries.get(key)
+
+        if entry is None or not entry.is_current(sig):
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None or not entry.is_current(sig):
+                    entry = self._load(key, entry, sig)
+
+        entry.hits += 1
+        return entry.value
+
+    def _load(self, key, previous, sig):
+        path, loader = key
+        if sig is None and previous is None:
+            raise FileNotFoundError(f"Артефакт не найден: {path}")
+
+        started = time.perf_counter()
+        try:
+            value = loader(path)
+        except Exception as e:
+            if previous is None:
+                raise
+            print(f"⚠️ Новая версия {path} не загружена ({e}), остается {previous.version}")
+            previous.failed_signature = sig
+            return previous
+
+        entry = Artifact(path, value, sig, time.perf_counter() - started)
+        if previous is not None:
+            self.reloads += 1
+            print(f"🔄 {path.name}: версия {previous.version} → {entry.version}")
+        # Подмена одной записью в словарь - читатели видят старую или новую версию целиком
+        self._entries[key] = entry
+        return entry
+
+    def record(self, path, sig, load_seconds=0.0):
+        """Учитывает артефакт, загруженный в обход get (модели тональности из реестра)"""
+        path = Path(path)
+        self._entries[(path, None)] = Artifact(path, None, sig, load_seconds)
+
+    def version(self, path):
+        """Версия path, загруженная в этом процессе (None, если не загружалась)"""
+        path = Path(path)
+        versions = [entry for (entry_path, _), entry in self._entries.items() if entry_path == path]
+        return max(versions, key=lambda entry: entry.loaded_at).version if versions else None
+
+    def invalidate(self, path=None):
+        with self._lock:
+            for key in [key for key in self._entries if path is None or key[0] == Path(path)]:
+                del self._entries[key]
+
+    def stats(self):
+        return {
+            str(path.relative_to(ML_MODELS_DIR) if path.is_relative_to(ML_MODELS_DIR) else path): entry.stats()
+            for (path, _), entry in self._entries.items()
+        }
+
+
+cache = ArtifactCache()
+
+
+def describe(artifacts=None):
+    """
+    Версии артефактов: на диске и загруженная в этом процессе
+    (live=False - процесс еще работает со старой версией или не загружал артефакт)
+    """
+    result = {}
+    for name, path in (artifacts or TRACKED_ARTIFACTS).items():
+        sig = signature(path)
+        loaded = cache.version(path)
+        result[name] = {
+            'path': str(path),
+            'version': version_id(sig),
+            'modified_at': _modified_at(sig),
+            'loaded_version': loaded,
+            'live': loaded is not None and loaded == version_id(sig),
+        }
+    return result
@@ -0,0 +1,246 @@
+# subscriptions/backtest.py
+
+"""
+Бэктест классификатора направления
+
+Вся история оценивается векторно, без цикла по дням и монетам:
+
+  replay_history   - классификатор прогоняется по всем строкам хранилища
+                     признаков (CoinFeatureSnapshot) одним вызовом predict_proba
+  prediction_history - сохраненные прогнозы (DirectionPrediction), склеенные
+                     с фактическим изменением цены из CoinDailyStat
+  evaluate         - метрики по таблице (coin_id, date, probability_up,
+                     change_percent): accuracy, AUC, точность по силе сигнала,
+                     доходность стратегии long/flat по монетам и портфелю
+
+Фактическое изменение - от цены дня прогноза к цене следующего дня истории
+монеты, как цель при обучении (features.compute_feature_frame).
+
+Запуск: python manage.py backtest_classifier, последний результат -
+ml/models/backtest_report.json. В generate_model_report попадает только
+отчет вне выборки (is_out_of_sample): сохраненные прогнозы или replay
+по отложенным датам; replay с --no-holdout включает дни обучения.
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import roc_auc_score
+
+from .artifacts import ML_MODELS_DIR, atomic_write
+from .feature_store import load_feature_frame
+from .features import NOISE_THRESHOLD, load_daily_stats
+from .models import DirectionPrediction
+
+BACKTEST_REPORT_PATH = ML_MODELS_DIR / 'backtest_report.json'
+
+# Пороги уверенности, как DirectionPrediction.signal_strength
+SIGNAL_STRENGTHS = [('strong', 0.7), ('moderate', 0.6), ('weak', 0.0)]
+
+HISTORY_COLUMNS = ['coin_id', 'date', 'probability_up', 'change_percent']
+
+TRADING_DAYS_PER_YEAR = 365  # крипторынок торгуется каждый день
+
+
+def signal_strength(confidence):
+    """Сила сигнала для массива уверенностей"""
+    confidence = np.asarray(confidence, dtype=float)
+    return np.select(
+        [confidence >= threshold for _, threshold in SIGNAL_STRENGTHS],
+        [name for name, _ in SIGNAL_STRENGTHS],
+        default=SIGNAL_STRENGTHS[-1][0],
+    )
+
+
+def replay_history(model, unique_stories=False, indicators=False, coin_ids=None, date_from=None, date_to=None):
+    """
+    Прогноз model (CompiledClassifier) для каждой строки хранилища признаков
+    с известным изменением к следующему дню. Строки с пропусками в признаках
+    пропускаются. Возвращает HISTORY_COLUMNS
+    """
+    frame = load_feature_frame(unique_stories, indicators, coin_ids=coin_ids, date_from=date_from, date_to=date_to)
+    if frame.empty:
+        return pd.DataFrame(columns=HISTORY_COLUMNS)
+
+    X = frame[model.feature_cols].to_numpy(dtype=float)
+    change = frame['price_change_percent'].to_numpy(dtype=float)
+    usable = np.isfinite(X).all(axis=1) & np.isfinite(change)
+
+    history = frame.loc[usable, ['coin_id', 'date']].reset_index(drop=True)
+    history['probability_up'] = model.predict_proba(X[usable])[:, 1] if usable.any() else []
+    history['change_percent'] = change[usable]
+    return history
+
+
+def realized_changes(coin_ids=None, date_from=None):
+    """Изменение цены (%) от каждого дня CoinDailyStat к следующему дню монеты: coin_id, date, change_percent"""
+    daily = load_daily_stats(coin_ids, date_from)
+    next_price = daily.groupby('coin_id', sort=False)['price'].shift(-1)
+    daily['change_percent'] = (next_price - daily['price']) / daily['price'] * 100
+    return daily[['coin_id', 'date', 'change_percent']]
+
+
+def prediction_history(model_version=None, coin_ids=None, date_from=None, date_to=None):
+    """
+    Сохраненные прогнозы с фактическим изменением цены одним запросом к каждой таблице.
+    Прогнозы, для дня которых еще нет цены следующего дня, пропускаются.
+    Возвращает HISTORY_COLUMNS + model_version
+    """
+    qs = DirectionPrediction.objects.all()
+    if model_version is not None:
+        qs = qs.filter(model_version=model_version)
+    if coin_ids is not None:
+        qs = qs.filter(coin_id__in=list(coin_ids))
+    if date_from is not None:
+        qs = qs.filter(prediction_date__gte=date_from)
+    if date_to is not None:
+        qs = qs.filter(prediction_date__lte=date_to)
+
+    columns = ['coin_id', 'date', 'probability_up', 'model_version']
+    predictions = pd.DataFrame(
+        list(qs.values_list('coin_id', 'prediction_date', 'probability_up', 'model_version')),
+        columns=columns,
+    )
+    if predictions.empty:
+        return pd.DataFrame(columns=HISTORY_COLUMNS + ['model_version'])
+
+    changes = realized_changes(set(predictions['coin_id']), predictions['date'].min())
+    history = predictions.merge(changes, on=['coin_id', 'date'], how='inner')
+    history = history[history['change_percent'].notna()]
+    return history.sort_values(['coin_id', 'date'], kind='stable')[HISTORY_COLUMNS + ['model_version']].reset_index(drop=True)
+
+
+def _classification_metrics(up, probability_up, predicted_up):
+    metrics = {
+        'samples': int(len(up)),
+        'accuracy': float((predicted_up == up).mean()) if len(up) else None,
+        'auc': None,
+    }
+    # AUC определен, только если в выборке есть оба направления
+    if len(np.unique(up)) == 2:
+        metrics['auc'] = float(roc_auc_score(up, probability_up))
+    return metrics
+
+
+def _strategy_metrics(daily_returns):
+    """Метрики ряда дневных доходностей (доли)"""
+    if len(daily_returns) == 0:
+        return {'total_return': 0.0, 'annualized_sharpe': None, 'max_drawdown': 0.0}
+    equity = np.cumprod(1 + daily_returns)
+    drawdown = 1 - equity / np.maximum.accumulate(np.maximum(equity, 1.0))
+    std = daily_returns.std()
+    return {
+        'total_return': float(equity[-1] - 1),
+        'annualized_sharpe': float(daily_returns.mean() / std * np.sqrt(TRADING_DAYS_PER_YEAR)) if std > 0 else None,
+        'max_drawdown': float(drawdown.max()),
+    }
+
+
+def evaluate(history, cost_bps=0.0):
+    """
+    Метрики бэктеста по history (HISTORY_COLUMNS):
+      - accuracy и AUC по всем дням с изменением цены и без шумовых дней
+        (|изменение| < NOISE_THRESHOLD, как при обучении)
+      - точность по силе сигнала (strong / moderate / weak)
+      - стратегия long/flat: в рынке на следующий день, если прогноз UP;
+        cost_bps - комиссия (б.п.) за каждый вход и выход. По монетам и для
+        портфеля с равными весами по монетам, в сравнении с buy & hold
+    """
+    history = history.sort_values(['coin_id', 'date'], kind='stable').reset_index(drop=True)
+    probability_up = history['probability_up'].to_numpy(dtype=float)
+    change = history['change_percent'].to_numpy(dtype=float)
+    predicted_up = probability_up > 0.5
+    confidence = np.maximum(probability_up, 1 - probability_up)
+    strength = signal_strength(confidence)
+
+    moved = change != 0
+    significant = np.abs(change) >= NOISE_THRESHOLD
+    up = change > 0
+    correct = predicted_up == up
+
+    result = {
+        'samples': int(len(history)),
+        'coins': int(history['coin_id'].nunique()),
+        'date_from': str(history['date'].min()) if len(history) else None,
+        'date_to': str(history['date'].max()) if len(history) else None,
+        'all_days': _classification_metrics(up[moved], probability_up[moved], predicted_up[moved]),
+        'significant_days': _classification_metrics(up[significant], probability_up[significant], predicted_up[significant]),
+        'predicted_up_share': float(predicted_up.mean()) if len(history) else None,
+        'by_signal': {},
+    }
+
+    for name, _ in SIGNAL_STRENGTHS:
+        mask = (strength == name) & moved
+        result['by_signal'][name] = {
+            'samples': int(mask.sum()),
+            'hit_rate': float(correct[mask].mean()) if mask.any() else None,
+            'avg_move_percent': float(np.where(predicted_up, change, -change)[mask].mean()) if mask.any() else None,
+        }
+
+    # Стратегия long/flat: позиция дня - прогноз UP, доходность - изменение к следующему дню
+    position = predicted_up.astype(float)
+    coin_ids = history['coin_id'].to_numpy()
+    first_row = np.r_[True, coin_ids[1:] != coin_ids[:-1]]
+    previous_position = np.where(first_row, 0.0, np.r_[0.0, position[:-1]])
+    asset_return = change / 100
+    strategy_return = position * asset_return - np.abs(position - previous_position) * cost_bps / 1e4
+
+    returns = pd.DataFrame({
+        'coin_id': coin_ids,
+        'date': history['date'].to_numpy(),
+        'strategy': strategy_return,
+        'buy_and_hold': asset_return,
+        'position': position,
+        'trade': np.abs(position - previous_position),
+    })
+    # Суммарная доходность монеты = exp(sum log(1 + r)) - 1
+    compounded = (
+        returns.assign(strategy=np.log1p(returns['strategy']), buy_and_hold=np.log1p(returns['buy_and_hold']))
+        .groupby('coin_id')
+        .agg(days=('date', 'size'), strategy=('strategy', 'sum'), buy_and_hold=('buy_and_hold', 'sum'),
+             exposure=('position', 'mean'), trades=('trade', 'sum'))
+    )
+    compounded[['strategy', 'buy_and_hold']] = np.expm1(compounded[['strategy', 'buy_and_hold']])
+    result['per_coin'] = {
+        int(coin_id): {
+            'days': int(row.days),
+            'strategy_return': float(row.strategy),
+            'buy_and_hold_return': float(row.buy_and_hold),
+            'exposure': float(row.exposure),
+            'trades': int(row.trades),
+        }
+        for coin_id, row in compounded.iterrows()
+    }
+
+    # Портфель: равные веса по монетам, у которых есть строка за день
+    portfolio = returns.groupby('date')[['strategy', 'buy_and_hold']].mean().sort_index()
+    result['portfolio'] = {
+        'days': int(len(portfolio)),
+        'cost_bps': cost_bps,
+        'strategy': _strategy_metrics(portfolio['strategy'].to_numpy()),
+        'buy_and_hold': _strategy_metrics(portfolio['buy_and_hold'].to_numpy()),
+    }
+    return result
+
+
+def save_report(report):
+    with atomic_write(BACKTEST_REPORT_PATH, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+
+
+def load_report():
+    """Последний сохраненный бэктест (None, если не запускался)"""
+    if not BACKTEST_REPORT_PATH.exists():
+        return None
+    with open(BACKTEST_REPORT_PATH) as f:
+        return json.load(f)
+
+
+def is_out_of_sample(report):
+    """
+    Отчет не видел дней обучения модели: сохраненные прогнозы или replay
+    по отложенной выборке. Отчеты без поля holdout (до появления границы
+    по умолчанию) считаются replay по всей истории
+    """
+    return report.get('source') == 'predictions' or bool(report.get('holdout'))
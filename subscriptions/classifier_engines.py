@@ -0,0 +1,216 @@
+# subscriptions/classifier_engines.py
+
+"""
+Движки классификатора направления
+
+Движок описывает модель: как ее построить (параметры по умолчанию),
+какую сетку перебирать при подборе (model_search.py) и как считать
+важность признаков. Обучение (train_classification_model_v2) и подбор
+берут движок по имени, прогноз от движка не зависит - любая модель
+выгружается в CompiledClassifier (compiled_classifier.py).
+
+  gbc     GradientBoostingClassifier - текущая модель
+  hgb     HistGradientBoostingClassifier - гистограммный бустинг,
+          обучение почти не растет с числом строк
+  logreg  LogisticRegression - линейная модель, базовая линия
+
+Движок по умолчанию - CLASSIFIER_ENGINE. Сравнение движков на текущем
+датасете: python manage.py benchmark_classifiers
+"""
+
+import io
+import time
+
+import joblib
+import numpy as np
+from sklearn.ensemble import GradientBoostingClassifier, HistGradientBoostingClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, roc_auc_score
+from sklearn.preprocessing import StandardScaler
+
+from .compiled_classifier import compile_classifier, CompiledClassifier
+
+
+class ClassifierEngine:
+    """Описание модели для обучения и подбора"""
+
+    name = None
+    estimator_class = None
+    description = ''
+    default_params = {}
+    param_grid = {}
+
+    @property
+    def model_version(self):
+        """
+        Движок в model_version прогнозов (DirectionPrediction); у GBC - прежнее classifier_v2.
+        К нему добавляется версия обученной модели, см. tasks.classifier_model_version
+        """
+        return 'classifier_v2' if self.name == GBCEngine.name else f'classifier_v2_{self.name}'
+
+    def build(self, params=None, random_state=42):
+        """Необученная модель: default_params, поверх - params"""
+        return self.estimator_class(**{**self.default_params, **(params or {})}, random_state=random_state)
+
+    def feature_importances(self, model):
+        return model.feature_importances_
+
+
+class GBCEngine(ClassifierEngine):
+    name = 'gbc'
+    estimator_class = GradientBoostingClassifier
+    description = 'GradientBoostingClassifier'
+    # Параметры модели в проде до появления подбора
+    default_params = {
+        'n_estimators': 30,
+        'learning_rate': 0.1,
+        'max_depth': 3,
+        'min_samples_split': 30,
+        'min_samples_leaf': 15,
+        'subsample': 0.7,
+        'max_features': 'sqrt',
+    }
+    param_grid = {
+        'n_estimators': [30, 100, 200],
+        'learning_rate': [0.03, 0.1],
+        'max_depth': [2, 3, 4],
+        'min_samples_split': [30],
+        'min_samples_leaf': [15, 50],
+        'subsample': [0.7, 1.0],
+        'max_features': ['sqrt', None],
+    }
+
+
+class HGBEngine(ClassifierEngine):
+    name = 'hgb'
+    estimator_class = HistGradientBoostingClassifier
+    description = 'HistGradientBoostingClassifier'
+    default_params = {
+        'max_iter': 200,
+        'learning_rate': 0.05,
+        'max_leaf_nodes': 15,
+        'min_samples_leaf': 30,
+        'l2_regularization': 1.0,
+        'early_stopping': False,
+    }
+    param_grid = {
+        'max_iter': [100, 300],
+        'learning_rate': [0.03, 0.1],
+        'max_leaf_nodes': [7, 15, 31],
+        'min_samples_leaf': [30, 100],
+        'l2_regularization': [0.0, 1.0],
+        'early_stopping': [False],
+    }
+
+    def feature_importances(self, model):
+        # У HGB нет встроенной важности: доля разбиений по признаку
+        counts = np.zeros(model.n_features_in_)
+        for (predictor,) in model._predictors:
+            nodes = predictor.nodes[~predictor.nodes['is_leaf'].astype(bool)]
+            np.add.at(counts, nodes['feature_idx'], 1)
+        return counts / counts.sum() if counts.sum() else counts
+
+
+class LogRegEngine(ClassifierEngine):
+    name = 'logreg'
+    estimator_class = LogisticRegression
+    description = 'LogisticRegression'
+    default_params = {
+        'C': 1.0,
+        'max_iter': 1000,
+    }
+    param_grid = {
+        'C': [0.01, 0.1, 1.0, 10.0],
+        'max_iter': [1000],
+    }
+
+    def feature_importances(self, model):
+        # Признаки масштабированы - модуль веса сравним между признаками
+        weights = np.abs(model.coef_[0])
+        return weights / weights.sum() if weights.sum() else weights
+
+
+ENGINES = {engine.name: engine for engine in (GBCEngine(), HGBEngine(), LogRegEngine())}
+
+
+def get_engine(name):
+    if name not in ENGINES:
+        raise ValueError(f"Неизвестный движок классификатора '{name}', доступны: {', '.join(ENGINES)}")
+    return ENGINES[name]
+
+
+def engine_for_model(model):
+    """Движок обученной модели: по классу или по имени класса (CompiledClassifier.model_class)"""
+    class_name = model if isinstance(model, str) else type(model).__name__
+    for engine in ENGINES.values():
+        if engine.estimator_class.__name__ == class_name:
+            return engine
+    raise ValueError(f"Нет движка для {class_name}")
+
+
+def benchmark_engine(engine, df, feature_cols, splits, holdout_share=0.2, live_rows=20, repeats=20, params=None):
+    """
+    Замеры движка на датасете df (date, target + feature_cols, по возрастанию даты):
+      - walk-forward AUC/accuracy по splits (model_search.walk_forward_splits)
+      - на обучении до отложенных holdout_share строк: время обучения,
+        AUC/accuracy на отложенных, задержка прогноза (sklearn и скомпилированный,
+        пачка live_rows строк и вся отложенная часть), размер модели (.pkl и .npz)
+    """
+    X = df[feature_cols].to_numpy(dtype=float)
+    y = df['target'].to_numpy()
+
+    fold_auc, fold_accuracy = [], []
+    for train, test in splits:
+        scaler = StandardScaler().fit(X[train])
+        model = engine.build(params).fit(scaler.transform(X[train]), y[train])
+        X_test = scaler.transform(X[test])
+        fold_auc.append(roc_auc_score(y[test], model.predict_proba(X_test)[:, 1]))
+        fold_accuracy.append(accuracy_score(y[test], model.predict(X_test)))
+
+    split_idx = int(len(df) * (1 - holdout_share))
+    X_train, y_train, X_test, y_test = X[:split_idx], y[:split_idx], X[split_idx:], y[split_idx:]
+
+    started = time.perf_counter()
+    scaler = StandardScaler().fit(X_train)
+    model = engine.build(params).fit(scaler.transform(X_train), y_train)
+    fit_seconds = time.perf_counter() - started
+
+    arrays = compile_classifier(model, scaler, feature_cols)
+    compiled = CompiledClassifier(arrays)
+
+    def best_of(predict, rows):
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            predict(rows)
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    live = X_test[:live_rows]
+    pickled, packed = io.BytesIO(), io.BytesIO()
+    joblib.dump((model, scaler), pickled)
+    np.savez(packed, **arrays)
+
+    proba = compiled.predict_proba(X_test)[:, 1]
+    return {
+        'engine': engine.name,
+        'params': {**engine.default_params, **(params or {})},
+        'walk_forward_auc': float(np.mean(fold_auc)),
+        'walk_forward_auc_std': float(np.std(fold_auc)),
+        'walk_forward_accuracy': float(np.mean(fold_accuracy)),
+        'holdout_auc': float(roc_auc_score(y_test, proba)),
+        'holdout_accuracy': float(accuracy_score(y_test, compiled.predict(X_test))),
+        'fit_seconds': fit_seconds,
+        'live_batch_ms': {
+            'sklearn': best_of(lambda rows: model.predict_proba(scaler.transform(rows)), live) * 1e3,
+            'compiled': best_of(compiled.predict_proba, live) * 1e3,
+        },
+        'per_row_us': {
+            'sklearn': best_of(lambda rows: model.predict_proba(scaler.transform(rows)), X_test) / len(X_test) * 1e6,
+            'compiled': best_of(compiled.predict_proba, X_test) / len(X_test) * 1e6,
+        },
+        'model_bytes': {
+            'pickle': pickled.getbuffer().nbytes,
+            'npz': packed.getbuffer().nbytes,
+        },
+    }
@@ -0,0 +1,256 @@
+# subscriptions/compiled_classifier.py
+
+"""
+Скомпилированный классификатор направления (модель + StandardScaler)
+
+Обученная модель и scaler выгружаются в плоские массивы NumPy (.npz):
+
+  mean, scale           параметры StandardScaler
+  kind                  'trees' (ансамбль деревьев) или 'linear'
+
+  для ансамблей деревьев (GradientBoostingClassifier, HistGradientBoostingClassifier):
+  feature, threshold    узлы всех деревьев подряд (у листа feature = -1)
+  left, right           индексы детей в общих массивах (у листа - сам узел)
+  value                 значение листа
+  roots                 корень каждого дерева (по порядку стадий)
+  init_raw              начальное значение (log-odds априорной вероятности)
+
+  для линейной модели (LogisticRegression):
+  coef, intercept       веса и свободный член
+
+  trained_at            время обучения модели (TRAINED_AT_FORMAT) - версия
+                        обученной модели в model_version прогнозов
+
+CompiledClassifier.predict_proba считает вероятности для всей матрицы сразу:
+все деревья проходятся одновременно, по одному шагу глубины за итерацию.
+Порядок операций повторяет sklearn (масштабирование в float64, сравнение
+признаков в типе модели - float32 у GBC, float64 у HGB, сумма стадий по
+порядку), поэтому результат совпадает с scaler.transform + model.predict_proba
+бит в бит. Файл грузится без joblib/pickle и без проверок sklearn на каждом вызове.
+
+Поддерживается бинарная классификация (для GBC - с init по умолчанию или 'zero',
+для HGB - без категориальных признаков).
+"""
+
+import numpy as np
+from scipy.special import expit
+from sklearn.dummy import DummyClassifier
+from sklearn.ensemble import GradientBoostingClassifier, HistGradientBoostingClassifier
+from sklearn.linear_model import LogisticRegression
+
+from .artifacts import atomic_write
+
+TREE_LEAF = -1
+TRAINED_AT_FORMAT = '%Y%m%d_%H%M%S'
+
+
+def _flat_trees(trees):
+    """
+    Узлы деревьев подряд в общих массивах. trees - список
+    (feature, threshold, left, right, value, is_leaf, max_depth) по стадиям
+    """
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    for feature, threshold, left, right, value, is_leaf, _ in trees:
+        nodes = np.arange(len(value))
+        features.append(np.where(is_leaf, TREE_LEAF, feature))
+        thresholds.append(np.where(is_leaf, 0.0, threshold))
+        lefts.append(np.where(is_leaf, nodes, left) + offset)
+        rights.append(np.where(is_leaf, nodes, right) + offset)
+        values.append(value)
+        roots.append(offset)
+        offset += len(value)
+
+    return {
+        'kind': np.array('trees'),
+        'feature': np.concatenate(features).astype(np.int32),
+        'threshold': np.concatenate(thresholds).astype(np.float64),
+        'left': np.concatenate(lefts).astype(np.int32),
+        'right': np.concatenate(rights).astype(np.int32),
+        'value': np.concatenate(values).astype(np.float64),
+        'roots': np.asarray(roots, dtype=np.int32),
+        'max_depth': np.int32(max(tree[-1] for tree in trees)),
+    }
+
+
+def compile_gbc(model):
+    if model.n_trees_per_iteration_ != 1:
+        raise ValueError("Поддерживается только бинарный классификатор")
+    if model.init_ != 'zero' and not isinstance(model.init_, DummyClassifier):
+        raise ValueError(f"Init-оценщик {type(model.init_).__name__} не поддерживается")
+
+    trees = []
+    for stage in model.estimators_[:, 0]:
+        tree = stage.tree_
+        trees.append((
+            tree.feature, tree.threshold, tree.children_left, tree.children_right,
+            tree.value[:, 0, 0], tree.children_left == TREE_LEAF, tree.max_depth,
+        ))
+
+    # Начальное значение ансамбля не зависит от X (prior или ноль)
+    init_raw = model._raw_predict_init(np.zeros((1, model.n_features_in_), dtype=np.float32))[0, 0]
+
+    return {
+        **_flat_trees(trees),
+        'learning_rate': np.float64(model.learning_rate),
+        'init_raw': np.float64(init_raw),
+        # Деревья sklearn читают X как float32; raw = 0 относится к classes_[1]
+        'input_dtype': np.array('float32'),
+        'positive_at_zero': np.bool_(True),
+    }
+
+
+def compile_hgb(model):
+    if model.n_trees_per_iteration_ != 1:
+        raise ValueError("Поддерживается только бинарный классификатор")
+
+    trees = []
+    for (predictor,) in model._predictors:
+        nodes = predictor.nodes
+        if nodes['is_categorical'].any():
+            raise ValueError("Категориальные признаки HGB не поддерживаются")
+        trees.append((
+            nodes['feature_idx'], nodes['num_threshold'], nodes['left'], nodes['right'],
+            nodes['value'], nodes['is_leaf'].astype(bool), int(nodes['depth'].max()),
+        ))
+
+    return {
+        **_flat_trees(trees),
+        # Значения листьев HGB уже умножены на learning_rate
+        'learning_rate': np.float64(1.0),
+        'init_raw': np.float64(model._baseline_prediction.ravel()[0]),
+        'input_dtype': np.array('float64'),
+        'positive_at_zero': np.bool_(False),
+    }
+
+
+def compile_logreg(model):
+    if len(model.classes_) != 2:
+        raise ValueError("Поддерживается только бинарный классификатор")
+    return {
+        'kind': np.array('linear'),
+        'coef': np.asarray(model.coef_, dtype=np.float64),
+        'intercept': np.asarray(model.intercept_, dtype=np.float64),
+        'input_dtype': np.array('float64'),
+        'positive_at_zero': np.bool_(False),
+    }
+
+
+COMPILERS = {
+    GradientBoostingClassifier: compile_gbc,
+    HistGradientBoostingClassifier: compile_hgb,
+    LogisticRegression: compile_logreg,
+}
+
+
+def compile_classifier(model, scaler, feature_cols):
+    """Массивы для CompiledClassifier из обученных model и scaler"""
+    compiler = COMPILERS.get(type(model))
+    if compiler is None:
+        raise ValueError(f"Компиляция {type(model).__name__} не поддерживается")
+
+    return {
+        **compiler(model),
+        'model_class': np.array(type(model).__name__),
+        'feature_cols': np.asarray(feature_cols, dtype=str),
+        'classes': np.asarray(model.classes_),
+        'mean': np.asarray(scaler.mean_, dtype=np.float64),
+        'scale': np.asarray(scaler.scale_, dtype=np.float64),
+    }
+
+
+def export_classifier(model, scaler, feature_cols, path, trained_at=None):
+    """
+    Сохраняет скомпилированный классификатор в path (.npz, атомарная замена).
+    trained_at (datetime) - время обучения модели, записывается в trained_at
+    """
+    arrays = compile_classifier(model, scaler, feature_cols)
+    if trained_at is not None:
+        arrays['trained_at'] = np.array(trained_at.strftime(TRAINED_AT_FORMAT))
+    with atomic_write(path) as f:
+        np.savez(f, **arrays)
+    return CompiledClassifier(arrays)
+
+
+class CompiledClassifier:
+    """Классификатор из плоских массивов: predict_proba / predict для матрицы признаков"""
+
+    def __init__(self, arrays):
+        self.feature_cols = [str(name) for name in arrays['feature_cols']]
+        self.classes_ = arrays['classes']
+        self.mean = arrays['mean']
+        self.scale = arrays['scale']
+        # Выгрузки до появления других моделей - только GBC
+        self.model_class = str(arrays.get('model_class', 'GradientBoostingClassifier'))
+        self.kind = str(arrays.get('kind', 'trees'))
+        self.input_dtype = np.dtype(str(arrays.get('input_dtype', 'float32')))
+        self.positive_at_zero = bool(arrays.get('positive_at_zero', True))
+        # Выгрузки до появления версий - без времени обучения
+        self.trained_at = str(arrays['trained_at']) if 'trained_at' in arrays else None
+
+        if self.kind == 'linear':
+            self.coef = arrays['coef']
+            self.intercept = arrays['intercept']
+            return
+
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.learning_rate = float(arrays['learning_rate'])
+        self.init_raw = float(arrays['init_raw'])
+        self.max_depth = int(arrays['max_depth'])
+        # Для листа сравнение ни на что не влияет - читаем нулевой признак
+        self._split_feature = np.maximum(self.feature, 0).astype(np.intp)
+        # Дети узла i: children[2*i] - левый, children[2*i + 1] - правый
+        self._children = np.column_stack([self.left, self.right]).astype(np.intp).ravel()
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def transform(self, X):
+        """Как StandardScaler.transform, затем тип, в котором модель sklearn читает X"""
+        X = np.array(X, dtype=np.float64)
+        if not np.isfinite(X).all():
+            # sklearn тоже не принимает пропуски в GradientBoostingClassifier
+            raise ValueError("Признаки содержат NaN или бесконечность")
+        X -= self.mean
+        X /= self.scale
+        return X.astype(self.input_dtype, copy=False)
+
+    def leaves(self, X_scaled):
+        """Индексы листьев: (n_rows, n_trees)"""
+        n_rows, n_features = X_scaled.shape
+        flat = X_scaled.ravel()
+        row_offsets = (np.arange(n_rows, dtype=np.intp) * n_features)[:, None]
+        nodes = np.broadcast_to(self.roots.astype(np.intp), (n_rows, len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            go_right = ~(flat[row_offsets + self._split_feature[nodes]] <= self.threshold[nodes])
+            nodes = self._children[2 * nodes + go_right]
+        return nodes
+
+    def decision_function(self, X):
+        """Сырой выход модели (log-odds класса classes_[1])"""
+        X = np.asarray(X, dtype=np.float64)
+        if self.kind == 'linear':
+            # Как LinearClassifierMixin.decision_function
+            return (self.transform(X) @ self.coef.T + self.intercept).reshape(-1)
+
+        contributions = self.learning_rate * self.value[self.leaves(self.transform(X))]
+        # cumsum складывает стадии по порядку, как sklearn
+        raw = np.column_stack([np.full(len(X), self.init_raw), contributions])
+        return np.cumsum(raw, axis=1)[:, -1]
+
+    def predict_proba(self, X):
+        proba_up = expit(self.decision_function(X))
+        return np.column_stack([1.0 - proba_up, proba_up])
+
+    def predict(self, X):
+        raw = self.decision_function(X)
+        # GBC относит raw = 0 к classes_[1], HGB и LogisticRegression - к classes_[0]
+        positive = raw >= 0 if self.positive_at_zero else raw > 0
+        return self.classes_[positive.astype(int)]
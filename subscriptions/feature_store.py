@@ -0,0 +1,193 @@
+# subscriptions/feature_store.py
+
+"""
+Хранилище признаков классификатора (CoinFeatureSnapshot)
+
+Признаки считаются одним модулем (features.compute_feature_frame) и
+записываются по ключу (монета, день, версия набора признаков). Обучение
+(prepare_classification_dataset) и прогноз (generate_daily_predictions_classifier)
+читают одни и те же строки, поэтому признаки на обучении и в проде не могут
+разойтись. Обновление прогноза по запросу (compute_features_for_coin) считает
+признаки тем же кодом прямо сейчас (compute_live_features) и в хранилище не пишет.
+Технические индикаторы последних дней берутся из переносимого состояния
+(rolling_state.window_indicator_frame), без загрузки всей истории цен.
+
+Заполнение:
+  materialize_feature_store (в update_daily_data) - последние дни: сегодня
+      и несколько прошлых, у которых за это время появилась/уточнилась
+      цена следующего дня (цель)
+  python manage.py backfill_feature_store - вся история или период
+"""
+
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import rolling_state
+from .features import compute_feature_frame, feature_columns, feature_set_version, to_training_frame
+from .models import CoinFeatureSnapshot, CoinSnapshot
+
+# Признаки для прогноза - строка за сегодня или за вчера (если цена за сегодня еще не собрана)
+LIVE_MAX_AGE_DAYS = 1
+
+STORE_COLUMNS = ['coin_id', 'date', 'price', 'price_change_percent']
+
+
+def _none_if_nan(value):
+    return None if value is None or np.isnan(value) else float(value)
+
+
+def materialize(date_from=None, date_to=None, coin_ids=None, unique_stories=False, indicators=False, batch_size=1000):
+    """
+    Считает признаки за [date_from, date_to] (по умолчанию вся история)
+    и записывает их в хранилище (upsert). Возвращает число строк
+    """
+    frame = compute_feature_frame(
+        coin_ids, date_from=date_from, date_to=date_to,
+        unique_stories=unique_stories, indicators=indicators,
+        carried_indicators=_carried_indicators(coin_ids, date_from, indicators),
+    )
+    return write_feature_frame(frame, unique_stories, indicators, batch_size)
+
+
+def _carried_indicators(coin_ids, date_from, indicators):
+    """Индикаторы дней окна из состояния - для расчета последних дней (с date_from)"""
+    if not indicators or date_from is None:
+        return None
+    return rolling_state.window_indicator_frame(coin_ids)
+
+
+def write_feature_frame(frame, unique_stories=False, indicators=False, batch_size=1000):
+    """Записывает строки frame (формат compute_feature_frame) в хранилище (upsert)"""
+    version = feature_set_version(unique_stories, indicators)
+    columns = feature_columns(indicators)
+    features = frame[columns].to_numpy(dtype=float)
+    snapshots = [
+        CoinFeatureSnapshot(
+            coin_id=int(coin_id),
+            date=day,
+            feature_set_version=version,
+            features=dict(zip(columns, map(float, values))),
+            price=float(price),
+            price_change_percent=_none_if_nan(change),
+        )
+        for coin_id, day, price, change, values in zip(
+            frame['coin_id'], frame['date'], frame['price'], frame['price_change_percent'], features
+        )
+    ]
+
+    with transaction.atomic():
+        CoinFeatureSnapshot.objects.bulk_create(
+            snapshots,
+            update_conflicts=True,
+            unique_fields=['coin', 'date', 'feature_set_version'],
+            update_fields=['features', 'price', 'price_change_percent', 'computed_at'],
+            batch_size=batch_size,
+        )
+    return len(snapshots)
+
+
+def load_feature_frame(unique_stories=False, indicators=False, coin_ids=None, date_from=None, date_to=None):
+    """Строки хранилища одним запросом: STORE_COLUMNS + признаки набора, по (coin_id, date)"""
+    columns = STORE_COLUMNS + feature_columns(indicators)
+    qs = CoinFeatureSnapshot.objects.filter(feature_set_version=feature_set_version(unique_stories, indicators))
+    if coin_ids is not None:
+        qs = qs.filter(coin_id__in=list(coin_ids))
+    if date_from is not None:
+        qs = qs.filter(date__gte=date_from)
+    if date_to is not None:
+        qs = qs.filter(date__lte=date_to)
+
+    rows = list(qs.order_by('coin_id', 'date').values_list('coin_id', 'date', 'price', 'price_change_percent', 'features'))
+    if not rows:
+        return pd.DataFrame(columns=columns)
+
+    frame = pd.DataFrame([row[:4] for row in rows], columns=STORE_COLUMNS)
+    values = pd.DataFrame([row[4] for row in rows], columns=feature_columns(indicators))
+    frame['price_change_percent'] = frame['price_change_percent'].astype(float)
+    return pd.concat([frame, values], axis=1)[columns]
+
+
+def is_empty(unique_stories=False, indicators=False):
+    version = feature_set_version(unique_stories, indicators)
+    return not CoinFeatureSnapshot.objects.filter(feature_set_version=version).exists()
+
+
+def load_training_frame(unique_stories=False, indicators=False):
+    """Датасет классификатора (DATASET_COLUMNS + индикаторы) из хранилища"""
+    return to_training_frame(load_feature_frame(unique_stories, indicators))
+
+
+def load_live_features(coin_ids=None, today=None, unique_stories=False, indicators=False, materialize_missing=True):
+    """
+    Признаки для прогноза: последняя строка каждой монеты не старше
+    LIVE_MAX_AGE_DAYS. Монеты без такой строки (хранилище еще не
+    заполнено за сегодня) досчитываются и записываются: без индикаторов -
+    по скользящему состоянию цен (rolling_state.py), остальные - расчетом последних
+    дней (materialize, индикаторы из переносимого состояния).
+    Возвращает DataFrame coin_id, date + признаки набора
+    """
+    today = today or timezone.now().date()
+    date_from = today - timedelta(days=LIVE_MAX_AGE_DAYS)
+
+    frame = load_feature_frame(unique_stories, indicators, coin_ids=coin_ids, date_from=date_from, date_to=today)
+
+    if materialize_missing:
+        wanted = set(coin_ids) if coin_ids is not None else set(CoinSnapshot.objects.values_list('id', flat=True))
+        missing = wanted - set(frame['coin_id'])
+        if missing and not indicators:
+            rows = compute_live_features(missing, today, unique_stories, indicators)
+            write_feature_frame(rows, unique_stories, indicators)
+            missing -= set(rows['coin_id'])
+        if missing:
+            materialize(date_from, today, coin_ids=missing, unique_stories=unique_stories, indicators=indicators)
+        if wanted - set(frame['coin_id']):
+            frame = load_feature_frame(unique_stories, indicators, coin_ids=coin_ids, date_from=date_from, date_to=today)
+
+    # Последний день каждой монеты
+    frame = frame.drop_duplicates(subset='coin_id', keep='last')
+    return frame[['coin_id', 'date'] + feature_columns(indicators)].reset_index(drop=True)
+
+
+def compute_live_features(coin_ids=None, today=None, unique_stories=False, indicators=False):
+    """
+    Признаки последнего дня монет (не старше LIVE_MAX_AGE_DAYS), посчитанные
+    сейчас по текущим ценам и сводке новостей, без чтения и записи хранилища:
+    без индикаторов - по скользящему состоянию цен (монеты без состояния -
+    полным расчетом), с индикаторами - тем же расчетом, что и хранилище,
+    с индикаторами из состояния. Формат compute_feature_frame
+    """
+    today = today or timezone.now().date()
+    date_from = today - timedelta(days=LIVE_MAX_AGE_DAYS)
+
+    if indicators:
+        frame = compute_feature_frame(
+            coin_ids, date_from=date_from, date_to=today, unique_stories=unique_stories, indicators=True,
+            carried_indicators=rolling_state.window_indicator_frame(coin_ids),
+        )
+    else:
+        frame = rolling_state.live_feature_frame(coin_ids, unique_stories)
+        # Монеты без скользящего состояния (еще не собрано) - тем же расчетом по таблице цен
+        stateless = rolling_state.coins_without_state(coin_ids)
+        if stateless:
+            computed = compute_feature_frame(stateless, date_from=date_from, date_to=today, unique_stories=unique_stories)
+            frame = pd.concat([part for part in (frame, computed) if not part.empty] or [frame], ignore_index=True)
+    frame = frame[(frame['date'] >= date_from) & (frame['date'] <= today)]
+    return frame.drop_duplicates(subset='coin_id', keep='last').reset_index(drop=True)
+
+
+def stats(unique_stories=False, indicators=False):
+    """Размер и свежесть хранилища для текущей версии признаков"""
+    version = feature_set_version(unique_stories, indicators)
+    qs = CoinFeatureSnapshot.objects.filter(feature_set_version=version)
+    latest = qs.aggregate(latest_date=Max('date'), computed_at=Max('computed_at'))
+    return {
+        'feature_set_version': version,
+        'rows': qs.count(),
+        'latest_date': latest['latest_date'].isoformat() if latest['latest_date'] else None,
+        'computed_at': latest['computed_at'].isoformat() if latest['computed_at'] else None,
+    }
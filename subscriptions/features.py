@@ -0,0 +1,331 @@
+# subscriptions/features.py
+
+"""
+Векторизованный расчет признаков классификатора направления
+
+Единственное место, где считаются признаки: результат
+compute_feature_frame записывается в хранилище признаков
+(feature_store.py), откуда их читают и обучение, и прогноз.
+
+Вместо запросов на каждую пару (монета, день) данные грузятся двумя
+запросами (дневная статистика цен и дневная сводка тональности
+CoinDailySentiment всех монет), а признаки считаются оконными
+операциями pandas/numpy.
+
+Окна новостей - календарные дни в часовом поясе settings.TIME_ZONE
+(как published_at__date в ORM):
+  текущее окно     [d-3, d]
+  предыдущее окно  [d-6, d-4]
+
+Метрики окна собираются из дневных сумм сводки (см. sentiment_rollup.py),
+средняя тональность - сумма оценок / число оцененных новостей.
+"""
+
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .indicators import INDICATOR_COLUMNS, indicator_frame
+from .models import CoinDailySentiment, CoinDailyStat, CoinSnapshot
+from .sentiment_rollup import PRIMARY_ROLLUP_VERSION, ROLLUP_FIELDS
+
+PRICE_WINDOW = 7
+
+# (первый, последний) сдвиг дня новости относительно дня d
+CURRENT_NEWS_WINDOW = (0, 3)
+PREVIOUS_NEWS_WINDOW = (4, 6)
+
+# Минимальное изменение цены (%), ниже которого день считается шумом
+NOISE_THRESHOLD = 0.5
+
+
+def load_daily_stats(coin_ids=None, date_from=None):
+    """Дневная статистика монет одним запросом: coin_id, date, price, volume"""
+    qs = CoinDailyStat.objects.all()
+    if coin_ids is not None:
+        qs = qs.filter(coin_id__in=list(coin_ids))
+    if date_from is not None:
+        qs = qs.filter(date__gte=date_from)
+
+    rows = qs.order_by('coin_id', 'date').values_list('coin_id', 'date', 'price', 'volume')
+    df = pd.DataFrame(list(rows), columns=['coin_id', 'date', 'price', 'volume'])
+    df['price'] = df['price'].astype(float)
+    df['volume'] = df['volume'].astype(float)
+    return df
+
+
+def load_daily_sentiment(coin_ids=None, date_from=None, model_version=PRIMARY_ROLLUP_VERSION):
+    """Дневная сводка тональности монет одним запросом (см. CoinDailySentiment)"""
+    qs = CoinDailySentiment.objects.filter(model_version=model_version)
+    if coin_ids is not None:
+        qs = qs.filter(coin_id__in=list(coin_ids))
+    if date_from is not None:
+        qs = qs.filter(date__gte=date_from)
+
+    columns = ['coin_id', 'date'] + ROLLUP_FIELDS
+    rows = qs.order_by('coin_id', 'date').values_list(*columns)
+    return pd.DataFrame(list(rows), columns=columns)
+
+
+NEWS_STATS_COLUMNS = ['news_count', 'avg_sentiment', 'positive', 'negative']
+
+
+def news_window_features(daily_sentiment, window, unique_stories=False):
+    """
+    Метрики новостей по окнам для каждого (coin_id, date):
+    news_count, avg_sentiment, positive, negative.
+
+    Каждый день сводки копируется во все дни d, в окна которых он попадает,
+    затем суммы группируются по (coin_id, date).
+    При unique_stories news_count - число уникальных историй (история,
+    перепечатанная в разные дни окна, считается в каждом из них)
+    """
+    if daily_sentiment.empty:
+        return pd.DataFrame(columns=['coin_id', 'date'] + NEWS_STATS_COLUMNS)
+
+    first, last = window
+    offsets = np.arange(first, last + 1)
+
+    expanded = daily_sentiment.loc[daily_sentiment.index.repeat(len(offsets))].reset_index(drop=True)
+    expanded['date'] = (
+        pd.to_datetime(expanded['date'])
+        + pd.to_timedelta(np.tile(offsets, len(daily_sentiment)), unit='D')
+    ).dt.date
+
+    sums = expanded.groupby(['coin_id', 'date'], sort=False)[ROLLUP_FIELDS].sum().reset_index()
+    scored = sums['scored_count'].to_numpy()
+    avg = np.divide(
+        sums['sentiment_sum'].to_numpy(dtype=float), scored,
+        out=np.zeros(len(sums)), where=scored > 0,
+    )
+
+    return pd.DataFrame({
+        'coin_id': sums['coin_id'],
+        'date': sums['date'],
+        'news_count': sums['story_count' if unique_stories else 'article_count'],
+        'avg_sentiment': avg,
+        'positive': sums['positive_count'],
+        'negative': sums['negative_count'],
+    })
+
+
+def price_window_features(daily):
+    """
+    Ценовые признаки по 7-дневному окну для каждой строки daily
+    (кроме первых 6 дней монеты) и целевая переменная по следующему дню
+    """
+    frames = []
+    for coin_id, group in daily.groupby('coin_id', sort=False):
+        prices = group['price'].to_numpy()
+        volumes = group['volume'].to_numpy()
+        n = len(prices)
+        if n < PRICE_WINDOW:
+            continue
+
+        price_windows = sliding_window_view(prices, PRICE_WINDOW)
+        volume_windows = sliding_window_view(volumes, PRICE_WINDOW)
+
+        # Строка i - день, окно - prices[i-6:i+1]
+        next_price = np.append(prices[PRICE_WINDOW:], np.nan)
+        current = prices[PRICE_WINDOW - 1:]
+        first = price_windows[:, 0]
+
+        frames.append(pd.DataFrame({
+            'coin_id': coin_id,
+            'position': np.arange(PRICE_WINDOW - 1, n),
+            'coin_days': n,
+            'date': group['date'].to_numpy()[PRICE_WINDOW - 1:],
+            'price': current,
+            'price_change_percent': ((next_price - current) / current) * 100,
+            'price_trend_7d': ((current - first) / first) * 100,
+            'volatility_7d': price_windows.std(axis=1),
+            'avg_volume_7d': volume_windows.mean(axis=1),
+            'avg_price_7d': price_windows.mean(axis=1),
+        }))
+
+    if not frames:
+        return pd.DataFrame(columns=[
+            'coin_id', 'position', 'coin_days', 'date', 'price', 'price_change_percent',
+            'price_trend_7d', 'volatility_7d', 'avg_volume_7d', 'avg_price_7d',
+        ])
+    return pd.concat(frames, ignore_index=True)
+
+
+def fill_news_stats(frame):
+    """Нули для монет/дней без новостей в окне"""
+    for period in ('current', 'previous'):
+        frame[f'news_count_{period}'] = frame[f'news_count_{period}'].fillna(0).astype(int)
+        frame[f'avg_sentiment_{period}'] = frame[f'avg_sentiment_{period}'].astype(float).fillna(0.0)
+        frame[f'positive_{period}'] = frame[f'positive_{period}'].fillna(0).astype(int)
+        frame[f'negative_{period}'] = frame[f'negative_{period}'].fillna(0).astype(int)
+    return frame
+
+
+def derive_news_features(frame):
+    """Производные признаки из метрик текущего и предыдущего окна новостей"""
+    # === ДИНАМИЧЕСКИЕ ПРИЗНАКИ ===
+    frame['news_volume_change'] = (frame['news_count_current'] - frame['news_count_previous']).astype(float)
+    frame['sentiment_change'] = frame['avg_sentiment_current'] - frame['avg_sentiment_previous']
+    positive_change = frame['positive_current'] - frame['positive_previous']
+    negative_change = frame['negative_current'] - frame['negative_previous']
+    frame['positive_change'] = positive_change.astype(float)
+    frame['negative_change'] = negative_change.astype(float)
+
+    # Всплески
+    frame['negative_spike'] = ((frame['negative_current'] > 5) & (negative_change > 3)).astype(float)
+    frame['positive_spike'] = ((frame['positive_current'] > 5) & (positive_change > 3)).astype(float)
+
+    # Взаимодействия
+    frame['price_sentiment_alignment'] = frame['price_trend_7d'] * frame['avg_sentiment_current']
+    frame['divergence'] = ((frame['price_trend_7d'] < -1) & (frame['avg_sentiment_current'] > 0.1)).astype(float)
+    return frame
+
+
+def add_news_features(frame, daily_sentiment, unique_stories=False):
+    """Присоединяет к frame (coin_id, date, price_trend_7d) новостные и производные признаки"""
+    current = news_window_features(daily_sentiment, CURRENT_NEWS_WINDOW, unique_stories)
+    previous = news_window_features(daily_sentiment, PREVIOUS_NEWS_WINDOW, unique_stories)
+
+    frame = (
+        frame
+        .merge(current, on=['coin_id', 'date'], how='left')
+        .merge(previous, on=['coin_id', 'date'], how='left', suffixes=('_current', '_previous'))
+    )
+    return derive_news_features(fill_news_stats(frame))
+
+
+# Версия набора признаков в хранилище (CoinFeatureSnapshot). При любом
+# изменении расчета признаков ниже - увеличить, старые строки не смешаются
+FEATURE_SET_VERSION = 'v1'
+
+FEATURE_COLUMNS = [
+    'price_trend_7d', 'volatility_7d', 'avg_volume_7d', 'avg_price_7d',
+    'news_volume_change', 'sentiment_change', 'positive_change', 'negative_change',
+    'negative_spike', 'positive_spike', 'price_sentiment_alignment', 'divergence',
+]
+
+DATASET_COLUMNS = ['coin', 'date', 'target', 'price_change_percent'] + FEATURE_COLUMNS
+
+# Запас дней цен перед date_from: окно цен - 7 строк, а не 7 календарных дней
+PRICE_HISTORY_MARGIN_DAYS = 30
+
+
+def feature_set_version(unique_stories=False, indicators=False):
+    version = FEATURE_SET_VERSION
+    if unique_stories:
+        version += '-stories'
+    if indicators:
+        version += '-indicators'
+    return version
+
+
+def feature_columns(indicators=False):
+    """Признаки набора: базовые + технические индикаторы (если включены)"""
+    return FEATURE_COLUMNS + INDICATOR_COLUMNS if indicators else FEATURE_COLUMNS
+
+
+def _carried_indicators(carried, daily, date_from):
+    """
+    Строки carried (rolling_state.window_indicator_frame) монет, у которых окно
+    состояния начинается не позже date_from и совпадает с последними днями daily
+    (даты, цены и объемы): для них индикаторы не нужно считать по истории
+    """
+    columns = ['coin_id', 'date'] + INDICATOR_COLUMNS
+    if carried is None or carried.empty or date_from is None:
+        return pd.DataFrame(columns=columns)
+
+    matched = []
+    prices = {coin_id: group for coin_id, group in daily.groupby('coin_id', sort=False)}
+    for coin_id, window in carried.groupby('coin_id', sort=False):
+        tail = prices.get(coin_id)
+        if tail is None or window['date'].iloc[0] > date_from:
+            continue
+        tail = tail.tail(len(window))
+        if (list(tail['date']) == list(window['date'])
+                and np.array_equal(tail['price'].to_numpy(), window['price'].to_numpy(dtype=float))
+                and np.array_equal(np.nan_to_num(tail['volume'].to_numpy()), window['volume'].to_numpy(dtype=float))):
+            matched.append(window[columns])
+
+    return pd.concat(matched, ignore_index=True) if matched else pd.DataFrame(columns=columns)
+
+
+def compute_feature_frame(coin_ids=None, date_from=None, date_to=None, unique_stories=False, indicators=False,
+                          carried_indicators=None):
+    """
+    Признаки для каждого (coin_id, date) с date в [date_from, date_to]:
+    coin_id, date, price, price_change_percent (изменение к следующему дню,
+    NaN для последнего дня) + feature_columns(indicators).
+
+    Единственный расчет признаков: из него заполняется хранилище
+    признаков (feature_store.py), а обучение и прогноз читают хранилище.
+    Как и в прежнем расчете датасета, день попадает в результат, только
+    если перед ним есть 7 дней цен и еще один день (монета с историей от 8 дней)
+
+    indicators=True - добавить технические индикаторы (indicators.py).
+    Экспоненциальные средние зависят от всей истории: индикаторы монет,
+    у которых carried_indicators (rolling_state.window_indicator_frame)
+    покрывают дни с date_from и совпадают с таблицей цен, берутся из
+    переносимого состояния, для остальных монет цены грузятся целиком
+    """
+    price_from = date_from - timedelta(days=PRICE_HISTORY_MARGIN_DAYS) if date_from else None
+    daily = load_daily_stats(coin_ids, date_from=price_from)
+
+    if indicators:
+        carried = _carried_indicators(carried_indicators, daily, date_from)
+        rest = sorted(set(daily['coin_id']) - set(carried['coin_id']))
+        history = load_daily_stats(rest) if rest and price_from is not None else daily[daily['coin_id'].isin(rest)]
+        computed = indicator_frame(history)
+        indicator_values = pd.concat([part for part in (carried, computed) if not part.empty] or [computed],
+                                     ignore_index=True)
+
+    if date_to is not None:
+        daily = daily[daily['date'] <= date_to + timedelta(days=1)]
+
+    frame = price_window_features(daily)
+    frame = frame[frame['position'] >= PRICE_WINDOW]
+    if date_from is not None:
+        frame = frame[frame['date'] >= date_from]
+    if date_to is not None:
+        frame = frame[frame['date'] <= date_to]
+
+    news_from = date_from - timedelta(days=PREVIOUS_NEWS_WINDOW[1]) if date_from else None
+    daily_sentiment = load_daily_sentiment(coin_ids, date_from=news_from)
+
+    frame = add_news_features(frame.copy(), daily_sentiment, unique_stories)
+    if indicators:
+        frame = frame.merge(indicator_values, on=['coin_id', 'date'], how='left')
+
+    columns = ['coin_id', 'date', 'price', 'price_change_percent'] + feature_columns(indicators)
+    return frame[columns].reset_index(drop=True)
+
+
+def to_training_frame(frame):
+    """
+    Строки датасета классификатора из признаков compute_feature_frame
+    (или хранилища): дни с известным изменением цены, без шума, с target.
+    Колонки - DATASET_COLUMNS и индикаторы, если они есть в frame
+    """
+    coins = pd.DataFrame(
+        list(CoinSnapshot.objects.order_by('id').values_list('id', 'symbol')),
+        columns=['coin_id', 'coin'],
+    )
+
+    change = frame['price_change_percent'].astype(float)
+    # Игнорируем шум (<0.5%) и последний день монеты (следующего еще нет)
+    frame = frame[change.notna() & (change.abs() >= NOISE_THRESHOLD)].copy()
+    frame['price_change_percent'] = frame['price_change_percent'].astype(float)
+    frame['target'] = (frame['price_change_percent'] > 0).astype(int)
+
+    frame = coins.merge(frame, on='coin_id', how='inner')
+    indicator_columns = [name for name in INDICATOR_COLUMNS if name in frame.columns]
+    return frame[DATASET_COLUMNS + indicator_columns].reset_index(drop=True)
+
+
+def build_classification_frame(unique_stories=False, indicators=False):
+    """
+    Датасет классификатора направления (все монеты, вся история),
+    посчитанный заново, без хранилища признаков
+    """
+    return to_training_frame(compute_feature_frame(unique_stories=unique_stories, indicators=indicators))
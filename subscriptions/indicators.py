@@ -0,0 +1,165 @@
+# subscriptions/indicators.py
+
+"""
+Технические индикаторы по дневным ценам (CoinDailyStat)
+
+Все индикаторы считаются векторно по всему ряду монеты:
+экспоненциальные средние - одним вызовом scipy.signal.lfilter,
+скользящие окна - через sliding_window_view.
+
+Расчет можно продолжить с сохраненного состояния: compute_indicators
+возвращает state (последние значения средних и хвосты окон), и вызов на
+новых днях с этим state дает те же значения, что и пересчет всей истории.
+Так новый день добавляется без пересчета истории (append_day).
+Состояние каждой монеты хранится в CoinRollingState.indicator_state и
+сдвигается на день, когда день уходит из окна цен (rolling_state.py).
+
+Данных high/low в CoinDailyStat нет, поэтому ATR считается по модулю
+изменения цены закрытия (средний истинный диапазон close-to-close).
+
+Индикаторы (INDICATOR_COLUMNS):
+  ema_gap_pct          отклонение цены от EMA(20), %
+  rsi_14               RSI Уайлдера (14)
+  macd_pct             MACD (EMA12 - EMA26), % от цены
+  macd_hist_pct        MACD - сигнальная EMA(9), % от цены
+  bollinger_width_pct  ширина полос Боллинджера (20, 2σ), % от средней
+  atr_pct              ATR (14, Уайлдер) по |Δ цены|, % от цены
+  volume_z             z-оценка объема в окне 20 дней
+"""
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
+
+EMA_SPANS = {'ema_12': 12, 'ema_20': 20, 'ema_26': 26}
+MACD_SIGNAL_SPAN = 9
+RSI_PERIOD = 14
+ATR_PERIOD = 14
+BOLLINGER_WINDOW = 20
+BOLLINGER_STDS = 2
+VOLUME_WINDOW = 20
+
+INDICATOR_COLUMNS = [
+    'ema_gap_pct', 'rsi_14', 'macd_pct', 'macd_hist_pct',
+    'bollinger_width_pct', 'atr_pct', 'volume_z',
+]
+
+
+def _smooth(values, alpha, previous=None):
+    """
+    y[t] = alpha * x[t] + (1 - alpha) * y[t-1] одним вызовом lfilter.
+    previous - y[-1] из прошлого расчета; без него ряд начинается с x[0]
+    """
+    values = np.asarray(values, dtype=float)
+    if previous is None:
+        previous = values[0]
+    smoothed, _ = lfilter([alpha], [1.0, alpha - 1.0], values, zi=[(1.0 - alpha) * previous])
+    return smoothed
+
+
+def _ema(values, span, previous=None):
+    return _smooth(values, 2.0 / (span + 1), previous)
+
+
+def _wilder(values, period, previous=None):
+    return _smooth(values, 1.0 / period, previous)
+
+
+def _rolling_mean_std(values, window, tail):
+    """
+    Среднее и стандартное отклонение (ddof=0) по последним window значениям
+    (в начале ряда - по всем имеющимся). tail - последние window-1 значений
+    из прошлого расчета
+    """
+    padding = np.full(window - 1 - len(tail), np.nan)
+    extended = np.concatenate([padding, tail, values])
+    windows = sliding_window_view(extended, window)
+    return np.nanmean(windows, axis=1), np.nanstd(windows, axis=1)
+
+
+def compute_indicators(prices, volumes, state=None):
+    """
+    Индикаторы для каждого дня ряда (prices, volumes по возрастанию даты).
+    state - состояние после предыдущих дней того же ряда (или None).
+    Возвращает (DataFrame с INDICATOR_COLUMNS, новое состояние)
+    """
+    prices = np.asarray(prices, dtype=float)
+    volumes = np.nan_to_num(np.asarray(volumes, dtype=float))
+    state = state or {}
+
+    if len(prices) == 0:
+        return pd.DataFrame(columns=INDICATOR_COLUMNS), state
+
+    # Экспоненциальные средние цены
+    emas = {name: _ema(prices, span, state.get(name)) for name, span in EMA_SPANS.items()}
+    macd = emas['ema_12'] - emas['ema_26']
+    macd_signal = _ema(macd, MACD_SIGNAL_SPAN, state.get('macd_signal'))
+
+    # Изменения цены (первый день ряда - без изменения)
+    last_price = state.get('last_price', prices[0])
+    deltas = np.diff(prices, prepend=last_price)
+
+    avg_gain = _wilder(np.maximum(deltas, 0.0), RSI_PERIOD, state.get('avg_gain'))
+    avg_loss = _wilder(np.maximum(-deltas, 0.0), RSI_PERIOD, state.get('avg_loss'))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = np.where(
+            avg_loss > 0,
+            100.0 - 100.0 / (1.0 + avg_gain / avg_loss),
+            np.where(avg_gain > 0, 100.0, 50.0),
+        )
+
+    atr = _wilder(np.abs(deltas), ATR_PERIOD, state.get('atr'))
+
+    # Скользящие окна
+    price_tail = np.asarray(state.get('price_tail', []), dtype=float)
+    volume_tail = np.asarray(state.get('volume_tail', []), dtype=float)
+    band_mean, band_std = _rolling_mean_std(prices, BOLLINGER_WINDOW, price_tail)
+    volume_mean, volume_std = _rolling_mean_std(volumes, VOLUME_WINDOW, volume_tail)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frame = pd.DataFrame({
+            'ema_gap_pct': (prices / emas['ema_20'] - 1.0) * 100,
+            'rsi_14': rsi,
+            'macd_pct': macd / prices * 100,
+            'macd_hist_pct': (macd - macd_signal) / prices * 100,
+            'bollinger_width_pct': np.where(band_mean > 0, 2 * BOLLINGER_STDS * band_std / band_mean * 100, 0.0),
+            'atr_pct': atr / prices * 100,
+            'volume_z': np.where(volume_std > 0, (volumes - volume_mean) / volume_std, 0.0),
+        })
+
+    new_state = {
+        **{name: float(values[-1]) for name, values in emas.items()},
+        'macd_signal': float(macd_signal[-1]),
+        'avg_gain': float(avg_gain[-1]),
+        'avg_loss': float(avg_loss[-1]),
+        'atr': float(atr[-1]),
+        'last_price': float(prices[-1]),
+        'price_tail': np.concatenate([price_tail, prices])[-(BOLLINGER_WINDOW - 1):].tolist(),
+        'volume_tail': np.concatenate([volume_tail, volumes])[-(VOLUME_WINDOW - 1):].tolist(),
+        'days': state.get('days', 0) + len(prices),
+    }
+    return frame, new_state
+
+
+def append_day(state, price, volume):
+    """Индикаторы нового дня по состоянию ряда: (dict индикаторов, новое состояние)"""
+    frame, new_state = compute_indicators([price], [volume], state)
+    return frame.iloc[0].to_dict(), new_state
+
+
+def indicator_frame(daily):
+    """
+    Индикаторы для всех монет: daily (coin_id, date, price, volume,
+    по возрастанию даты внутри монеты) -> coin_id, date + INDICATOR_COLUMNS
+    """
+    frames = []
+    for coin_id, group in daily.groupby('coin_id', sort=False):
+        values, _ = compute_indicators(group['price'].to_numpy(), group['volume'].to_numpy())
+        values.insert(0, 'coin_id', coin_id)
+        values.insert(1, 'date', group['date'].to_numpy())
+        frames.append(values)
+
+    if not frames:
+        return pd.DataFrame(columns=['coin_id', 'date'] + INDICATOR_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
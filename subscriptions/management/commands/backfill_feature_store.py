@@ -0,0 +1,47 @@
+# subscriptions/management/commands/backfill_feature_store.py
+
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from subscriptions import feature_store
+
+
+class Command(BaseCommand):
+    help = 'Заполнение хранилища признаков (CoinFeatureSnapshot) за всю историю или период'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat, default=None,
+                            help='Первый день (YYYY-MM-DD), по умолчанию - начало истории')
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat, default=None,
+                            help='Последний день (YYYY-MM-DD), по умолчанию - сегодня')
+        parser.add_argument('--unique-stories', action='store_true', default=None,
+                            help='Набор признаков с уникальными историями (по умолчанию FEATURES_COUNT_UNIQUE_STORIES)')
+        parser.add_argument('--indicators', action='store_true', default=None,
+                            help='Набор признаков с техническими индикаторами (по умолчанию FEATURES_TECHNICAL_INDICATORS)')
+
+    def handle(self, *args, **options):
+        unique_stories = options['unique_stories']
+        if unique_stories is None:
+            unique_stories = settings.FEATURES_COUNT_UNIQUE_STORIES
+        indicators = options['indicators']
+        if indicators is None:
+            indicators = settings.FEATURES_TECHNICAL_INDICATORS
+
+        self.stdout.write("="*60)
+        self.stdout.write("🗄️ ХРАНИЛИЩЕ ПРИЗНАКОВ")
+        self.stdout.write("="*60)
+
+        started = time.perf_counter()
+        rows = feature_store.materialize(
+            options['date_from'], options['date_to'], unique_stories=unique_stories, indicators=indicators
+        )
+        seconds = time.perf_counter() - started
+
+        stats = feature_store.stats(unique_stories, indicators)
+        self.stdout.write(f"✅ Записано строк: {rows} за {seconds:.2f}s")
+        self.stdout.write(f"   Версия признаков: {stats['feature_set_version']}, "
+                          f"всего строк: {stats['rows']}, последний день: {stats['latest_date']}")
+        self.stdout.write("="*60)
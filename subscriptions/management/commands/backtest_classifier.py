@@ -0,0 +1,118 @@
+# subscriptions/management/commands/backtest_classifier.py
+
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from subscriptions import backtest
+from subscriptions.features import NOISE_THRESHOLD
+from subscriptions.tasks import TRAINING_DATA_DIR, load_classifier
+from subscriptions.training_data import read_classification_dataset
+
+
+class Command(BaseCommand):
+    help = 'Бэктест классификатора направления по истории признаков или сохраненным прогнозам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=['replay', 'predictions'], default='replay',
+                            help='replay - прогон текущей модели по хранилищу признаков, '
+                                 'predictions - сохраненные DirectionPrediction')
+        parser.add_argument('--model-version', default=None,
+                            help='Только прогнозы этой model_version (для --source predictions)')
+        parser.add_argument('--coin-id', type=int, action='append', default=None, help='Только эти монеты')
+        parser.add_argument('--date-from', type=date.fromisoformat, default=None, help='YYYY-MM-DD')
+        parser.add_argument('--date-to', type=date.fromisoformat, default=None, help='YYYY-MM-DD')
+        parser.add_argument('--no-holdout', action='store_true',
+                            help='replay по всей истории, включая дни обучения модели (по умолчанию - '
+                                 'только отложенные 20%% дат датасета); такой отчет не попадает в model_report')
+        parser.add_argument('--cost-bps', type=float, default=0.0, help='Комиссия за вход/выход, б.п.')
+        parser.add_argument('--no-save', action='store_true', help=f'Не сохранять в {backtest.BACKTEST_REPORT_PATH.name}')
+
+    def handle(self, *args, **options):
+        self.stdout.write("="*60)
+        self.stdout.write(f"📈 БЭКТЕСТ КЛАССИФИКАТОРА ({options['source']})")
+        self.stdout.write("="*60)
+
+        date_from = options['date_from']
+        # Сохраненные прогнозы сделаны до исхода - они вне выборки и без границы;
+        # replay по умолчанию только по датам, которых модель не видела
+        holdout = options['source'] == 'replay' and not options['no_holdout']
+        if holdout:
+            # Граница как в train_classification_model_v2 (первые 80% строк датасета по дате);
+            # день на границе мог попасть в обучение - начинаем со следующего
+            dates = read_classification_dataset(TRAINING_DATA_DIR, columns=['date'])['date'].sort_values(kind='stable')
+            last_train_day = dates.iloc[int(len(dates) * 0.8) - 1].date()
+            date_from = max(filter(None, [date_from, last_train_day + timedelta(days=1)]))
+            self.stdout.write(f"🔒 Отложенная выборка: с {date_from}")
+
+        started = time.perf_counter()
+        if options['source'] == 'replay':
+            model = load_classifier()
+            history = backtest.replay_history(
+                model,
+                unique_stories=settings.FEATURES_COUNT_UNIQUE_STORIES,
+                indicators=settings.FEATURES_TECHNICAL_INDICATORS,
+                coin_ids=options['coin_id'], date_from=date_from, date_to=options['date_to'],
+            )
+            if not holdout:
+                self.stdout.write("⚠️ В историю входят дни обучения модели - метрики завышены, "
+                                  "отчет не попадет в model_report")
+        else:
+            history = backtest.prediction_history(
+                options['model_version'], coin_ids=options['coin_id'],
+                date_from=date_from, date_to=options['date_to'],
+            )
+        loaded = time.perf_counter() - started
+
+        if history.empty:
+            self.stdout.write("❌ Нет строк для бэктеста")
+            return
+
+        started = time.perf_counter()
+        report = backtest.evaluate(history, cost_bps=options['cost_bps'])
+        evaluated = time.perf_counter() - started
+        report['source'] = options['source']
+        report['holdout'] = holdout
+        report['holdout_from'] = date_from.isoformat() if holdout else None
+        report['seconds'] = {'load': round(loaded, 3), 'evaluate': round(evaluated, 3)}
+
+        self.stdout.write(f"📊 {report['samples']} прогнозов, {report['coins']} монет, "
+                          f"{report['date_from']} — {report['date_to']} "
+                          f"(загрузка {loaded:.2f}s, расчет {evaluated:.2f}s)")
+
+        self.stdout.write("\n🎯 Направление")
+        for name, title in (('all_days', 'Все дни'), ('significant_days', f'|Δ| ≥ {NOISE_THRESHOLD}%')):
+            metrics = report[name]
+            auc = f"{metrics['auc']:.4f}" if metrics['auc'] is not None else '—'
+            accuracy = f"{metrics['accuracy'] * 100:.1f}%" if metrics['accuracy'] is not None else '—'
+            self.stdout.write(f"   {title:<10} accuracy {accuracy:>6}  AUC {auc}  ({metrics['samples']})")
+
+        self.stdout.write("\n💪 По силе сигнала")
+        for name, metrics in report['by_signal'].items():
+            if metrics['samples']:
+                self.stdout.write(f"   {name:<9} hit rate {metrics['hit_rate'] * 100:>5.1f}%  "
+                                  f"средний ход {metrics['avg_move_percent']:>+6.2f}%  ({metrics['samples']})")
+            else:
+                self.stdout.write(f"   {name:<9} —")
+
+        portfolio = report['portfolio']
+        self.stdout.write(f"\n💰 Long/flat, портфель {portfolio['days']} дней (комиссия {portfolio['cost_bps']} б.п.)")
+        for name, title in (('strategy', 'Стратегия'), ('buy_and_hold', 'Buy & hold')):
+            metrics = portfolio[name]
+            sharpe = f"{metrics['annualized_sharpe']:.2f}" if metrics['annualized_sharpe'] is not None else '—'
+            self.stdout.write(f"   {title:<11} {metrics['total_return'] * 100:>+8.1f}%  "
+                              f"Sharpe {sharpe:>5}  просадка {metrics['max_drawdown'] * 100:.1f}%")
+
+        per_coin = sorted(report['per_coin'].items(), key=lambda item: -item[1]['strategy_return'])
+        self.stdout.write("\n🪙 По монетам (стратегия / buy & hold, доля дней в рынке)")
+        for coin_id, metrics in per_coin[:10]:
+            self.stdout.write(f"   #{coin_id:<5} {metrics['strategy_return'] * 100:>+8.1f}% / "
+                              f"{metrics['buy_and_hold_return'] * 100:>+8.1f}%  "
+                              f"{metrics['exposure'] * 100:>3.0f}%  ({metrics['days']} дней)")
+
+        if not options['no_save']:
+            backtest.save_report(report)
+            self.stdout.write(f"\n💾 {backtest.BACKTEST_REPORT_PATH}")
+        self.stdout.write("="*60)
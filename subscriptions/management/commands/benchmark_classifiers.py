@@ -0,0 +1,73 @@
+# subscriptions/management/commands/benchmark_classifiers.py
+
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from subscriptions.artifacts import atomic_write
+from subscriptions.classifier_engines import ENGINES, benchmark_engine, get_engine
+from subscriptions.model_search import load_search_results, walk_forward_splits
+from subscriptions.tasks import TRAINING_DATA_DIR, classifier_feature_cols
+from subscriptions.training_data import read_classification_dataset
+
+
+class Command(BaseCommand):
+    help = 'Сравнение движков классификатора: качество walk-forward, время обучения, задержка прогноза, размер модели'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engine', action='append', choices=list(ENGINES), default=None,
+                            help='Движок (можно несколько раз, по умолчанию все)')
+        parser.add_argument('--splits', type=int, default=None,
+                            help='Число walk-forward разбиений (по умолчанию CLASSIFIER_SEARCH_SPLITS)')
+        parser.add_argument('--best-params', action='store_true',
+                            help='Параметры победителя последнего подбора (classifier_search.json) '
+                                 'для его движка вместо параметров по умолчанию')
+        parser.add_argument('--output', default=None, help='Сохранить результаты в JSON')
+
+    def handle(self, *args, **options):
+        self.stdout.write("="*60)
+        self.stdout.write("🏎️ СРАВНЕНИЕ ДВИЖКОВ КЛАССИФИКАТОРА")
+        self.stdout.write("="*60)
+
+        feature_cols = classifier_feature_cols()
+        df = read_classification_dataset(TRAINING_DATA_DIR, columns=['date', 'target'] + feature_cols)
+        df = df.sort_values('date', kind='stable').reset_index(drop=True)
+        splits = walk_forward_splits(df['date'].to_numpy(), options['splits'] or settings.CLASSIFIER_SEARCH_SPLITS)
+        self.stdout.write(f"📊 {len(df)} строк, {len(feature_cols)} признаков, {len(splits)} разбиений")
+
+        best = None
+        if options['best_params']:
+            search = load_search_results()
+            best = search['best'] if search else None
+
+        results = []
+        for name in options['engine'] or list(ENGINES):
+            engine = get_engine(name)
+            params = best['params'] if best and best.get('engine', 'gbc') == name else None
+            self.stdout.write(f"\n🔧 {name} ({engine.description})...")
+            results.append(benchmark_engine(engine, df, feature_cols, splits, params=params))
+
+        self.stdout.write("\n" + "="*60)
+        self.stdout.write(f"{'engine':<7} {'wf AUC':>13} {'wf acc':>7} {'hold AUC':>8} {'fit s':>7} "
+                          f"{'20 rows ms':>17} {'µs/row':>13} {'pkl KB':>7} {'npz KB':>7}")
+        self.stdout.write(f"{'':<7} {'':>13} {'':>7} {'':>8} {'':>7} {'skl / comp':>17} {'skl / comp':>13}")
+        for row in results:
+            batch, per_row, size = row['live_batch_ms'], row['per_row_us'], row['model_bytes']
+            self.stdout.write(
+                f"{row['engine']:<7} {row['walk_forward_auc']:.4f}±{row['walk_forward_auc_std']:.4f} "
+                f"{row['walk_forward_accuracy']:>7.4f} {row['holdout_auc']:>8.4f} {row['fit_seconds']:>7.2f} "
+                f"{batch['sklearn']:>8.3f}/{batch['compiled']:<8.3f} "
+                f"{per_row['sklearn']:>6.1f}/{per_row['compiled']:<6.1f} "
+                f"{size['pickle'] / 1024:>7.1f} {size['npz'] / 1024:>7.1f}"
+            )
+
+        best_row = max(results, key=lambda row: row['walk_forward_auc'])
+        self.stdout.write(f"\n🏆 Лучший walk-forward AUC: {best_row['engine']} ({best_row['walk_forward_auc']:.4f}); "
+                          f"текущий движок: {settings.CLASSIFIER_ENGINE}")
+
+        if options['output']:
+            with atomic_write(options['output'], 'w') as f:
+                json.dump({'samples': len(df), 'features': feature_cols, 'results': results}, f, indent=2, default=str)
+            self.stdout.write(f"💾 {options['output']}")
+        self.stdout.write("="*60)
@@ -0,0 +1,63 @@
+# subscriptions/management/commands/compile_classifier.py
+
+import time
+
+import joblib
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from subscriptions.compiled_classifier import export_classifier
+from subscriptions.tasks import (
+    CLASSIFIER_COMPILED_PATH, CLASSIFIER_FEATURES_PATH, CLASSIFIER_MODEL_PATH,
+    CLASSIFIER_SCALER_PATH, TRAINING_DATA_DIR, classifier_trained_at,
+)
+from subscriptions.training_data import read_classification_dataset
+
+
+class Command(BaseCommand):
+    help = 'Компиляция классификатора (.pkl) в массивы NumPy (.npz) и сверка с sklearn'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-verify', action='store_true',
+                            help='Не сверять прогнозы с sklearn на обучающем датасете')
+
+    def handle(self, *args, **options):
+        self.stdout.write("="*60)
+        self.stdout.write("🔧 КОМПИЛЯЦИЯ КЛАССИФИКАТОРА")
+        self.stdout.write("="*60)
+
+        model = joblib.load(CLASSIFIER_MODEL_PATH)
+        scaler = joblib.load(CLASSIFIER_SCALER_PATH)
+        feature_cols = joblib.load(CLASSIFIER_FEATURES_PATH)
+
+        compiled = export_classifier(model, scaler, feature_cols, CLASSIFIER_COMPILED_PATH,
+                                     trained_at=classifier_trained_at())
+        if compiled.kind == 'linear':
+            size = f"{compiled.coef.size} весов"
+        else:
+            size = f"{len(compiled.roots)} деревьев, {len(compiled.value)} узлов"
+        self.stdout.write(f"✅ {compiled.model_class}: {size} → {CLASSIFIER_COMPILED_PATH}")
+
+        if options['no_verify'] or not TRAINING_DATA_DIR.exists():
+            self.stdout.write("="*60)
+            return
+
+        X = read_classification_dataset(TRAINING_DATA_DIR, columns=feature_cols)[feature_cols].to_numpy(dtype=float)
+
+        started = time.perf_counter()
+        expected = model.predict_proba(scaler.transform(X))
+        sklearn_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        actual = compiled.predict_proba(X)
+        compiled_seconds = time.perf_counter() - started
+
+        rows = max(len(X), 1)
+        self.stdout.write(f"\n📊 Сверка на {len(X)} строках датасета")
+        self.stdout.write(f"   sklearn:      {sklearn_seconds * 1e6 / rows:.2f} мкс/строка")
+        self.stdout.write(f"   compiled:     {compiled_seconds * 1e6 / rows:.2f} мкс/строка")
+        if np.array_equal(expected, actual):
+            self.stdout.write("✅ predict_proba совпадает бит в бит")
+        else:
+            self.stdout.write(f"❌ Расхождение predict_proba: {np.abs(expected - actual).max():.3e}")
+        self.stdout.write("="*60)
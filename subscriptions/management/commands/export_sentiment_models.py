@@ -0,0 +1,77 @@
+# subscriptions/management/commands/export_sentiment_models.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from subscriptions.models import NewsArticle
+from subscriptions.sentiment_backends import BACKENDS, export_onnx
+from subscriptions.sentiment_inference import build_article_text, compare_backends
+from subscriptions.sentiment_registry import registry
+
+
+class Command(BaseCommand):
+    help = 'Экспорт моделей тональности в ONNX / int8 и проверка точности относительно fp32'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--models', nargs='+', default=['finbert', 'custom'],
+                            help='Какие модели экспортировать')
+        parser.add_argument('--no-quantize', action='store_true',
+                            help='Не создавать int8-копию ONNX модели')
+        parser.add_argument('--skip-export', action='store_true',
+                            help='Только проверка точности уже экспортированных моделей')
+        parser.add_argument('--check-backend', choices=[b for b in BACKENDS if b != 'torch'],
+                            default='onnx_int8', help='Бэкенд для сравнения с fp32')
+        parser.add_argument('--sample', type=int, default=500,
+                            help='Сколько последних новостей из БД взять для проверки')
+        parser.add_argument('--tolerance', type=float, default=0.97,
+                            help='Минимальная доля совпадающих меток')
+
+    def handle(self, *args, **options):
+        self.stdout.write("="*60)
+        self.stdout.write("⚙️ ЭКСПОРТ МОДЕЛЕЙ ТОНАЛЬНОСТИ")
+        self.stdout.write("="*60)
+
+        if not options['skip_export']:
+            for name in options['models']:
+                spec = registry.spec(name)
+                self.stdout.write(f"\n📦 {name}: экспорт в ONNX...")
+                try:
+                    paths = export_onnx(spec, quantize=not options['no_quantize'])
+                except (FileNotFoundError, ImportError) as e:
+                    raise CommandError(f"Не удалось экспортировать {name}: {e}")
+                for backend, path in paths.items():
+                    self.stdout.write(f"   {backend}: {path}")
+
+        # Отложенная выборка: свежие новости, на которых модели не обучались
+        rows = NewsArticle.objects.order_by('-id').values_list('title', 'description')[:options['sample']]
+        texts = [build_article_text(title, description) for title, description in rows]
+        if not texts:
+            self.stdout.write("\n⚠️ В БД нет новостей, проверка точности пропущена")
+            return
+
+        backend = options['check_backend']
+        failed = []
+        for name in options['models']:
+            report = compare_backends(name, texts, backend)
+
+            self.stdout.write(f"\n🤖 {name}: {backend} против fp32 ({report['samples']} новостей)")
+            self.stdout.write(f"   Совпадение меток:     {report['label_agreement']*100:.1f}%")
+            self.stdout.write(f"   Расхождение score:    avg {report['mean_score_diff']:.4f}, "
+                              f"max {report['max_score_diff']:.4f}")
+            self.stdout.write(f"   Время fp32 / {backend}: {report['reference_seconds']:.2f}s / "
+                              f"{report['backend_seconds']:.2f}s (x{report['speedup'] or 0:.1f})")
+            self.stdout.write(f"   Веса fp32 / {backend}:  {report['reference_param_mb']} MB / "
+                              f"{report['backend_param_mb']} MB")
+
+            if report['label_agreement'] < options['tolerance']:
+                failed.append(name)
+                self.stdout.write(f"   ❌ Ниже допуска {options['tolerance']*100:.0f}%")
+            else:
+                self.stdout.write(f"   ✅ В пределах допуска")
+
+        self.stdout.write("\n" + "="*60)
+
+        if failed:
+            raise CommandError(
+                f"Бэкенд {backend} не прошел проверку точности для: {', '.join(failed)}. "
+                f"Не переключайте SENTIMENT_BACKEND."
+            )
@@ -0,0 +1,48 @@
+# subscriptions/management/commands/rebuild_news_stories.py
+
+from django.core.management.base import BaseCommand
+
+from subscriptions.models import NewsArticle, NewsStory
+from subscriptions.news_dedup import assign_story
+
+
+class Command(BaseCommand):
+    help = 'Кластеризация почти одинаковых новостей (MinHash) для уже собранных новостей'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='Удалить все кластеры и построить их заново')
+
+    def handle(self, *args, **options):
+        self.stdout.write("="*60)
+        self.stdout.write("🧩 КЛАСТЕРИЗАЦИЯ НОВОСТЕЙ")
+        self.stdout.write("="*60)
+
+        if options['reset']:
+            NewsArticle.objects.update(story=None)
+            NewsStory.objects.all().delete()
+            self.stdout.write("🗑️ Кластеры удалены")
+
+        # В порядке публикации: каноническая новость кластера - самая ранняя
+        pending = (
+            NewsArticle.objects
+            .filter(story__isnull=True)
+            .order_by('published_at', 'id')
+            .only('id', 'title', 'description', 'content_hash', 'published_at')
+        )
+
+        processed = 0
+        new_stories = 0
+        for article in pending.iterator(chunk_size=1000):
+            _, created = assign_story(article)
+            processed += 1
+            new_stories += int(created)
+            if processed % 1000 == 0:
+                self.stdout.write(f"   Обработано: {processed}")
+
+        self.stdout.write(f"\n✅ Новостей: {processed}")
+        self.stdout.write(f"   Новых историй: {new_stories}")
+        if processed:
+            self.stdout.write(f"   Дубликатов: {processed - new_stories} "
+                              f"({(processed - new_stories) / processed * 100:.1f}%)")
+        self.stdout.write("="*60)
@@ -0,0 +1,31 @@
+# subscriptions/management/commands/rebuild_sentiment_rollup.py
+
+from django.core.management.base import BaseCommand
+
+from subscriptions.models import CustomModelSentiment
+from subscriptions.sentiment_rollup import PRIMARY_ROLLUP_VERSION, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Перестройка дневной сводки тональности (CoinDailySentiment) по сырым новостям'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model-version', action='append', dest='model_versions',
+                            help='Какие сводки перестроить (по умолчанию primary и все версии custom-моделей)')
+        parser.add_argument('--coin-id', action='append', type=int, dest='coin_ids',
+                            help='Только для этих монет')
+
+    def handle(self, *args, **options):
+        model_versions = options['model_versions'] or [PRIMARY_ROLLUP_VERSION] + list(
+            CustomModelSentiment.objects.order_by().values_list('model_version', flat=True).distinct()
+        )
+
+        self.stdout.write("="*60)
+        self.stdout.write("📅 ДНЕВНАЯ СВОДКА ТОНАЛЬНОСТИ")
+        self.stdout.write("="*60)
+
+        for model_version in model_versions:
+            days = rebuild(model_version, coin_ids=options['coin_ids'])
+            self.stdout.write(f"✅ {model_version}: {days} дней (монета × дата)")
+
+        self.stdout.write("="*60)
@@ -0,0 +1,56 @@
+# subscriptions/management/commands/run_sentiment_server.py
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from subscriptions.sentiment_registry import registry
+from subscriptions.sentiment_server import SentimentServer
+
+
+class Command(BaseCommand):
+    help = 'Сервер инференса тональности с микро-пачками (модели загружаются один раз)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='0.0.0.0')
+        parser.add_argument('--port', type=int, default=8001)
+        parser.add_argument('--models', nargs='+', default=None,
+                            help='Какие модели обслуживать (по умолчанию SENTIMENT_PRELOAD_MODELS)')
+        parser.add_argument('--window-ms', type=float, default=None,
+                            help='Окно сбора микро-пачки, мс')
+        parser.add_argument('--max-batch', type=int, default=None,
+                            help='Максимум текстов в микро-пачке')
+        parser.add_argument('--verbose', action='store_true', help='Логировать каждый запрос')
+
+    def handle(self, *args, **options):
+        model_names = options['models'] or settings.SENTIMENT_PRELOAD_MODELS
+
+        self.stdout.write("="*60)
+        self.stdout.write("🛰️ СЕРВЕР ТОНАЛЬНОСТИ")
+        self.stdout.write("="*60)
+
+        # Загружаем веса до того, как начнем принимать запросы
+        registry.warmup(model_names)
+        model_names = [name for name in model_names if registry.is_loaded(name)]
+        if not model_names:
+            raise CommandError("Ни одна модель тональности не загрузилась")
+
+        for name in model_names:
+            stats = registry.entry_stats(name)
+            self.stdout.write(f"   {name}: {stats['load_seconds']}s, {stats['param_mb']} MB")
+
+        server = SentimentServer(
+            (options['host'], options['port']),
+            model_names,
+            window_ms=options['window_ms'],
+            max_batch=options['max_batch'],
+            verbose=options['verbose'],
+        )
+        self.stdout.write(f"\n✅ Слушаю http://{options['host']}:{options['port']} "
+                          f"(/predict, /metrics, /health)")
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write("\n⏹️ Остановка сервера")
+        finally:
+            server.server_close()
@@ -0,0 +1,54 @@
+# subscriptions/management/commands/search_classifier.py
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from subscriptions import model_search
+from subscriptions.classifier_engines import ENGINES
+from subscriptions.tasks import (
+    TRAINING_DATA_DIR, classifier_feature_cols, print_search_leaderboard, train_classification_model_v2,
+)
+from subscriptions.training_data import read_classification_dataset
+
+
+class Command(BaseCommand):
+    help = 'Walk-forward подбор гиперпараметров классификатора направления по всем ядрам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engine', action='append', choices=list(ENGINES), default=None,
+                            help='Движок (можно несколько раз - сетки перебираются вместе; '
+                                 'по умолчанию CLASSIFIER_ENGINE)')
+        parser.add_argument('--random', type=int, default=None, metavar='N',
+                            help='Случайный поиск из N точек сетки вместо полного перебора')
+        parser.add_argument('--splits', type=int, default=None,
+                            help='Число walk-forward разбиений (по умолчанию CLASSIFIER_SEARCH_SPLITS)')
+        parser.add_argument('--jobs', type=int, default=None,
+                            help='Процессов (по умолчанию CLASSIFIER_SEARCH_JOBS, -1 - все ядра)')
+        parser.add_argument('--top', type=int, default=10, help='Сколько строк таблицы показать')
+        parser.add_argument('--train', action='store_true',
+                            help='Обучить и сохранить победителя (train_classification_model_v2)')
+
+    def handle(self, *args, **options):
+        self.stdout.write("="*60)
+        self.stdout.write("🔍 ПОДБОР КЛАССИФИКАТОРА (WALK-FORWARD)")
+        self.stdout.write("="*60)
+
+        feature_cols = classifier_feature_cols()
+        df = read_classification_dataset(TRAINING_DATA_DIR, columns=['date', 'target'] + feature_cols)
+        # Последние 20% дат - отложенная выборка train_classification_model_v2, в подборе не участвуют
+        df = df.sort_values('date', kind='stable').iloc[:int(len(df) * 0.8)]
+        self.stdout.write(f"📊 {len(df)} строк, {len(feature_cols)} признаков")
+
+        engines = options['engine'] or [settings.CLASSIFIER_ENGINE]
+        results = model_search.run_search(
+            df, feature_cols, engines=engines,
+            n_splits=options['splits'] or settings.CLASSIFIER_SEARCH_SPLITS,
+            n_iter=options['random'],
+            n_jobs=options['jobs'] or settings.CLASSIFIER_SEARCH_JOBS,
+        )
+        print_search_leaderboard(results, top=options['top'])
+        self.stdout.write(f"\n💾 Таблица результатов: {model_search.SEARCH_RESULTS_PATH}")
+
+        if options['train']:
+            train_classification_model_v2(params=results['best']['params'], engine=results['best']['engine'])
+        self.stdout.write("="*60)
@@ -0,0 +1,58 @@
+# subscriptions/management/commands/verify_rolling_state.py
+
+from django.core.management.base import BaseCommand
+
+from subscriptions import rolling_state
+from subscriptions.models import CoinDailyStat
+
+
+class Command(BaseCommand):
+    help = 'Сверка скользящего состояния цен (CoinRollingState) с полным пересчетом из CoinDailyStat'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--coin-id', type=int, action='append', default=None,
+                            help='Проверить только эту монету (можно несколько раз)')
+        parser.add_argument('--rtol', type=float, default=1e-9,
+                            help='Допустимое относительное расхождение признаков')
+        parser.add_argument('--fix', action='store_true',
+                            help='Пересобрать состояние монет с расхождениями')
+        parser.add_argument('--rebuild-all', action='store_true',
+                            help='Пересобрать состояние всех монет без сверки')
+
+    def handle(self, *args, **options):
+        coin_ids = options['coin_id']
+
+        self.stdout.write("="*60)
+        self.stdout.write("🔁 СКОЛЬЗЯЩЕЕ СОСТОЯНИЕ ЦЕН")
+        self.stdout.write("="*60)
+
+        if options['rebuild_all']:
+            coins = CoinDailyStat.objects.order_by().values_list('coin_id', flat=True).distinct()
+            if coin_ids is not None:
+                coins = coins.filter(coin_id__in=coin_ids)
+            coins = list(coins)
+            for coin_id in coins:
+                rolling_state.rebuild_state(coin_id)
+            self.stdout.write(f"✅ Пересобрано монет: {len(coins)}")
+            self.stdout.write("="*60)
+            return
+
+        problems = rolling_state.verify(coin_ids, rtol=options['rtol'])
+        if not problems:
+            self.stdout.write("✅ Состояние совпадает с пересчетом")
+            self.stdout.write("="*60)
+            return
+
+        for problem in problems:
+            self.stdout.write(
+                f"❌ coin_id={problem['coin_id']} {problem['field']}: "
+                f"в состоянии {problem['stored']}, пересчет {problem['expected']}"
+            )
+
+        broken = sorted({problem['coin_id'] for problem in problems})
+        self.stdout.write(f"⚠️ Монет с расхождениями: {len(broken)}")
+        if options['fix']:
+            for coin_id in broken:
+                rolling_state.rebuild_state(coin_id)
+            self.stdout.write(f"✅ Пересобрано монет: {len(broken)}")
+        self.stdout.write("="*60)
@@ -0,0 +1,110 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:42
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def _fingerprint(title, description):
+    text = f"{title or ''} {description or ''}"
+    normalized = " ".join(text.lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def backfill_fingerprints(apps, schema_editor):
+    """Отпечатки для уже собранных новостей + заполнение кэша готовыми оценками"""
+    NewsArticle = apps.get_model("subscriptions", "NewsArticle")
+    NewsSentiment = apps.get_model("subscriptions", "NewsSentiment")
+    CustomModelSentiment = apps.get_model("subscriptions", "CustomModelSentiment")
+    SentimentCache = apps.get_model("subscriptions", "SentimentCache")
+
+    batch = []
+    for article in NewsArticle.objects.only("id", "title", "description").iterator(
+        chunk_size=2000
+    ):
+        article.content_hash = _fingerprint(article.title, article.description)
+        batch.append(article)
+        if len(batch) >= 2000:
+            NewsArticle.objects.bulk_update(batch, ["content_hash"])
+            batch = []
+    if batch:
+        NewsArticle.objects.bulk_update(batch, ["content_hash"])
+
+    sources = [
+        (
+            NewsSentiment.objects.values_list(
+                "article__content_hash",
+                "sentiment_label",
+                "sentiment_score",
+                "confidence",
+            ),
+            lambda row: "finbert",
+        ),
+        (
+            CustomModelSentiment.objects.values_list(
+                "article__content_hash",
+                "sentiment_label",
+                "sentiment_score",
+                "confidence",
+                "model_version",
+            ),
+            lambda row: row[4],
+        ),
+    ]
+    for queryset, version_of in sources:
+        entries = [
+            SentimentCache(
+                fingerprint=row[0],
+                model_version=version_of(row),
+                sentiment_label=row[1],
+                sentiment_score=row[2],
+                confidence=row[3],
+            )
+            for row in queryset.iterator(chunk_size=2000)
+        ]
+        SentimentCache.objects.bulk_create(
+            entries, batch_size=2000, ignore_conflicts=True
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("subscriptions", "0016_alter_newssentiment_options_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="newsarticle",
+            name="content_hash",
+            field=models.CharField(
+                blank=True, db_index=True, default="", max_length=64
+            ),
+        ),
+        migrations.CreateModel(
+            name="SentimentCache",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("fingerprint", models.CharField(max_length=64)),
+                ("model_version", models.CharField(max_length=50)),
+                ("sentiment_label", models.CharField(max_length=50)),
+                ("sentiment_score", models.FloatField()),
+                ("confidence", models.FloatField(default=0.0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Sentiment Cache",
+                "verbose_name_plural": "Sentiment Cache",
+                "unique_together": {("fingerprint", "model_version")},
+            },
+        ),
+        migrations.RunPython(backfill_fingerprints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("subscriptions", "0017_newsarticle_content_hash_sentimentcache"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NewsStory",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("minhash", models.BinaryField()),
+                ("fingerprint", models.CharField(max_length=64)),
+                ("article_count", models.IntegerField(default=1)),
+                ("first_published_at", models.DateTimeField(db_index=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "canonical_article",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="subscriptions.newsarticle",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "News Story",
+                "verbose_name_plural": "News Stories",
+                "ordering": ["-first_published_at"],
+            },
+        ),
+        migrations.AddField(
+            model_name="newsarticle",
+            name="story",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="articles",
+                to="subscriptions.newsstory",
+            ),
+        ),
+        migrations.CreateModel(
+            name="NewsStoryBand",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("band", models.PositiveSmallIntegerField()),
+                ("value", models.BigIntegerField()),
+                (
+                    "story",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="bands",
+                        to="subscriptions.newsstory",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["band", "value"], name="subscriptio_band_0b712b_idx"
+                    )
+                ],
+                "unique_together": {("story", "band")},
+            },
+        ),
+    ]
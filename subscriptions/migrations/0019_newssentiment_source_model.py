@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("subscriptions", "0018_newsstory"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="newssentiment",
+            name="source_model",
+            field=models.CharField(db_index=True, default="finbert", max_length=50),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.4 on 2026-10-18 01:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("subscriptions", "0019_newssentiment_source_model"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CoinDailySentiment",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("model_version", models.CharField(max_length=50)),
+                ("article_count", models.IntegerField(default=0)),
+                ("scored_count", models.IntegerField(default=0)),
+                ("sentiment_sum", models.FloatField(default=0.0)),
+                ("positive_count", models.IntegerField(default=0)),
+                ("negative_count", models.IntegerField(default=0)),
+                ("story_count", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "coin",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_sentiment",
+                        to="subscriptions.coinsnapshot",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Coin Daily Sentiment",
+                "verbose_name_plural": "Coin Daily Sentiment",
+                "ordering": ["-date"],
+                "unique_together": {("coin", "date", "model_version")},
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("subscriptions", "0020_coindailysentiment"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CoinFeatureSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("feature_set_version", models.CharField(max_length=30)),
+                ("features", models.JSONField()),
+                ("price", models.FloatField()),
+                ("price_change_percent", models.FloatField(blank=True, null=True)),
+                ("computed_at", models.DateTimeField(auto_now=True)),
+                (
+                    "coin",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="feature_snapshots",
+                        to="subscriptions.coinsnapshot",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Coin Feature Snapshot",
+                "verbose_name_plural": "Coin Feature Snapshots",
+                "ordering": ["-date"],
+                "indexes": [
+                    models.Index(
+                        fields=["feature_set_version", "date"],
+                        name="subscriptio_feature_5f5c06_idx",
+                    )
+                ],
+                "unique_together": {("coin", "date", "feature_set_version")},
+            },
+        ),
+    ]
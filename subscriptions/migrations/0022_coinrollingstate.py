@@ -0,0 +1,46 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("subscriptions", "0021_coinfeaturesnapshot"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CoinRollingState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("window", models.PositiveSmallIntegerField(default=7)),
+                ("last_date", models.DateField(blank=True, null=True)),
+                ("dates", models.JSONField(default=list)),
+                ("prices", models.JSONField(default=list)),
+                ("volumes", models.JSONField(default=list)),
+                ("price_mean", models.FloatField(default=0.0)),
+                ("price_m2", models.FloatField(default=0.0)),
+                ("volume_sum", models.FloatField(default=0.0)),
+                ("days_seen", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "coin",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rolling_state",
+                        to="subscriptions.coinsnapshot",
+                    ),
+                ),
+            ],
+        ),
+    ]
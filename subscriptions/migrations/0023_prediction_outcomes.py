@@ -0,0 +1,89 @@
+# Generated by Django 5.2.4 on 2026-10-18 02:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("subscriptions", "0022_coinrollingstate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PredictionAccuracyStat",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("model_version", models.CharField(max_length=50)),
+                ("window_days", models.PositiveSmallIntegerField()),
+                ("evaluated", models.IntegerField(default=0)),
+                ("correct", models.IntegerField(default=0)),
+                ("accuracy", models.FloatField(blank=True, null=True)),
+                ("avg_confidence", models.FloatField(blank=True, null=True)),
+                ("strong_evaluated", models.IntegerField(default=0)),
+                ("strong_correct", models.IntegerField(default=0)),
+                ("date_from", models.DateField(blank=True, null=True)),
+                ("date_to", models.DateField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Prediction Accuracy Stat",
+                "verbose_name_plural": "Prediction Accuracy Stats",
+                "ordering": ["model_version", "window_days", "coin"],
+            },
+        ),
+        migrations.AddField(
+            model_name="directionprediction",
+            name="actual_change_percent",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="directionprediction",
+            name="actual_direction",
+            field=models.CharField(blank=True, max_length=4, null=True),
+        ),
+        migrations.AddField(
+            model_name="directionprediction",
+            name="evaluated_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="directionprediction",
+            name="is_correct",
+            field=models.BooleanField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="directionprediction",
+            index=models.Index(
+                fields=["model_version", "prediction_date"],
+                name="subscriptio_model_v_b51cfa_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="predictionaccuracystat",
+            name="coin",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="accuracy_stats",
+                to="subscriptions.coinsnapshot",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="predictionaccuracystat",
+            index=models.Index(
+                fields=["model_version", "window_days"],
+                name="subscriptio_model_v_600d7d_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+def purge_story_entries(apps, schema_editor):
+    """
+    До этой миграции новости кластера писали в кэш под отпечатком кластера
+    (= content_hash канонической новости) оценку своего текста. Записи таких
+    отпечатков у кластеров с другими текстами могли получить оценку перепечатки
+    вместо текста канонической новости - удаляем, при следующем анализе
+    они посчитаются заново
+    """
+    NewsArticle = apps.get_model("subscriptions", "NewsArticle")
+    SentimentCache = apps.get_model("subscriptions", "SentimentCache")
+
+    mixed = (
+        NewsArticle.objects.filter(story__isnull=False)
+        .exclude(content_hash=models.F("story__fingerprint"))
+        .values("story__fingerprint")
+    )
+    SentimentCache.objects.filter(fingerprint__in=mixed).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("subscriptions", "0023_prediction_outcomes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="sentimentcache",
+            name="fingerprint",
+            field=models.CharField(max_length=80),
+        ),
+        migrations.RunPython(purge_story_entries, migrations.RunPython.noop),
+    ]
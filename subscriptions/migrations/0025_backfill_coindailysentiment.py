@@ -0,0 +1,87 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:40
+
+from django.db import migrations
+from django.db.models import Count, F, FilteredRelation, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+# Как в sentiment_rollup.py на момент миграции
+PRIMARY_ROLLUP_VERSION = "primary"
+POSITIVE_THRESHOLD = 0.05
+NEGATIVE_THRESHOLD = -0.05
+
+
+def backfill_rollup(apps, schema_editor):
+    """
+    0020 создала CoinDailySentiment пустой, а признаки читают только сводку -
+    до ручного rebuild_sentiment_rollup у всех монет выходила нулевая тональность.
+    Перестраивает сводку по уже собранным новостям (как sentiment_rollup.rebuild)
+    """
+    NewsArticle = apps.get_model("subscriptions", "NewsArticle")
+    CustomModelSentiment = apps.get_model("subscriptions", "CustomModelSentiment")
+    CoinDailySentiment = apps.get_model("subscriptions", "CoinDailySentiment")
+    PriceEvent = apps.get_model("subscriptions", "PriceEvent")
+
+    model_versions = [PRIMARY_ROLLUP_VERSION] + list(
+        CustomModelSentiment.objects.order_by().values_list("model_version", flat=True).distinct()
+    )
+
+    for model_version in model_versions:
+        if model_version == PRIMARY_ROLLUP_VERSION:
+            articles = NewsArticle.objects.annotate(score=F("newssentiment__sentiment_score"))
+        else:
+            articles = NewsArticle.objects.annotate(
+                custom=FilteredRelation(
+                    "custom_sentiments", condition=Q(custom_sentiments__model_version=model_version)
+                )
+            ).annotate(score=F("custom__sentiment_score"))
+
+        rows = (
+            articles.annotate(day=TruncDate("published_at"))
+            .order_by()
+            .values("coin_id", "day")
+            .annotate(
+                article_count=Count("id"),
+                scored_count=Count("score"),
+                sentiment_sum=Coalesce(Sum("score"), Value(0.0)),
+                positive_count=Count("id", filter=Q(score__gt=POSITIVE_THRESHOLD)),
+                negative_count=Count("id", filter=Q(score__lt=NEGATIVE_THRESHOLD)),
+                story_count=Count("story_id", distinct=True) + Count("id", filter=Q(story__isnull=True)),
+            )
+        )
+
+        CoinDailySentiment.objects.filter(model_version=model_version).delete()
+        CoinDailySentiment.objects.bulk_create(
+            [
+                CoinDailySentiment(
+                    coin_id=row["coin_id"],
+                    date=row["day"],
+                    model_version=model_version,
+                    article_count=row["article_count"],
+                    scored_count=row["scored_count"],
+                    sentiment_sum=row["sentiment_sum"],
+                    positive_count=row["positive_count"],
+                    negative_count=row["negative_count"],
+                    story_count=row["story_count"],
+                )
+                for row in rows.iterator(chunk_size=2000)
+            ],
+            batch_size=1000,
+        )
+
+    news_count = (
+        CoinDailySentiment.objects
+        .filter(coin_id=OuterRef("coin_id"), date=OuterRef("date"), model_version=PRIMARY_ROLLUP_VERSION)
+        .values("article_count")[:1]
+    )
+    PriceEvent.objects.update(news_count=Coalesce(Subquery(news_count), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("subscriptions", "0024_sentimentcache_story_keys"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollup, migrations.RunPython.noop),
+    ]
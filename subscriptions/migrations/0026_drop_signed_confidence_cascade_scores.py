@@ -0,0 +1,86 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:10
+
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+# Как в sentiment_rollup.py на момент миграции
+PRIMARY_ROLLUP_VERSION = "primary"
+POSITIVE_THRESHOLD = 0.05
+NEGATIVE_THRESHOLD = -0.05
+# source_model оценок custom-модели, записанных каскадом до перевода в шкалу FinBERT
+SIGNED_CONFIDENCE_CASCADE_MODEL = "custom_distilbert_v1"
+
+
+def drop_cascade_scores(apps, schema_editor):
+    """
+    Каскад писал в NewsSentiment оценки custom-модели в ее шкале (±уверенность),
+    рядом с оценками FinBERT (P(positive) - P(negative)). Такие строки удаляются -
+    analyze_all_sentiment оценит новости заново, - а дни сводки с ними пересчитываются
+    """
+    NewsArticle = apps.get_model("subscriptions", "NewsArticle")
+    NewsSentiment = apps.get_model("subscriptions", "NewsSentiment")
+    CoinDailySentiment = apps.get_model("subscriptions", "CoinDailySentiment")
+
+    stale = NewsSentiment.objects.filter(source_model=SIGNED_CONFIDENCE_CASCADE_MODEL)
+    days_by_coin = defaultdict(set)
+    for coin_id, day in (
+        NewsArticle.objects.filter(newssentiment__in=stale)
+        .annotate(day=TruncDate("published_at"))
+        .order_by()
+        .values_list("coin_id", "day")
+        .distinct()
+    ):
+        days_by_coin[coin_id].add(day)
+
+    stale.delete()
+
+    for coin_id, days in days_by_coin.items():
+        rows = (
+            NewsArticle.objects.filter(coin_id=coin_id)
+            .annotate(day=TruncDate("published_at"), score=F("newssentiment__sentiment_score"))
+            .filter(day__in=days)
+            .order_by()
+            .values("day")
+            .annotate(
+                article_count=Count("id"),
+                scored_count=Count("score"),
+                sentiment_sum=Coalesce(Sum("score"), Value(0.0)),
+                positive_count=Count("id", filter=Q(score__gt=POSITIVE_THRESHOLD)),
+                negative_count=Count("id", filter=Q(score__lt=NEGATIVE_THRESHOLD)),
+                story_count=Count("story_id", distinct=True) + Count("id", filter=Q(story__isnull=True)),
+            )
+        )
+        CoinDailySentiment.objects.filter(
+            coin_id=coin_id, date__in=days, model_version=PRIMARY_ROLLUP_VERSION
+        ).delete()
+        CoinDailySentiment.objects.bulk_create(
+            [
+                CoinDailySentiment(
+                    coin_id=coin_id,
+                    date=row["day"],
+                    model_version=PRIMARY_ROLLUP_VERSION,
+                    article_count=row["article_count"],
+                    scored_count=row["scored_count"],
+                    sentiment_sum=row["sentiment_sum"],
+                    positive_count=row["positive_count"],
+                    negative_count=row["negative_count"],
+                    story_count=row["story_count"],
+                )
+                for row in rows
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("subscriptions", "0025_backfill_coindailysentiment"),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_cascade_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("subscriptions", "0026_drop_signed_confidence_cascade_scores"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="coinrollingstate",
+            name="indicator_state",
+            field=models.JSONField(default=dict),
+        ),
+    ]
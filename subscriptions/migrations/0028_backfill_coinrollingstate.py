@@ -0,0 +1,58 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:40
+
+from django.db import migrations
+
+# Как в rolling_state.py на момент миграции (PRICE_WINDOW)
+PRICE_WINDOW = 7
+
+
+def backfill_rolling_state(apps, schema_editor):
+    """
+    0022 создала CoinRollingState пустой: до первого collect_historical_prices
+    обновление прогноза из бота не находило состояния ни для одной монеты.
+    Собирает состояние монет без него из CoinDailyStat (как rolling_state.rebuild_state).
+    Состояние индикаторов соберется при первом сдвиге окна
+    """
+    CoinDailyStat = apps.get_model("subscriptions", "CoinDailyStat")
+    CoinRollingState = apps.get_model("subscriptions", "CoinRollingState")
+
+    existing = set(CoinRollingState.objects.values_list("coin_id", flat=True))
+    coins = CoinDailyStat.objects.order_by().values_list("coin_id", flat=True).distinct()
+
+    states = []
+    for coin_id in coins:
+        if coin_id in existing:
+            continue
+        stats = CoinDailyStat.objects.filter(coin_id=coin_id)
+        last = list(stats.order_by("-date").values_list("date", "price", "volume")[:PRICE_WINDOW])[::-1]
+
+        state = CoinRollingState(coin_id=coin_id, window=PRICE_WINDOW, dates=[], prices=[], volumes=[])
+        mean = m2 = volume_sum = 0.0
+        for day, price, volume in last:
+            price, volume = float(price), float(volume or 0)
+            state.dates.append(day.isoformat())
+            state.prices.append(price)
+            state.volumes.append(volume)
+            # Сумма Уэлфорда, как rolling_state._add
+            delta = price - mean
+            mean += delta / len(state.prices)
+            m2 += delta * (price - mean)
+            volume_sum += volume
+
+        state.price_mean, state.price_m2, state.volume_sum = mean, m2, volume_sum
+        state.last_date = last[-1][0] if last else None
+        state.days_seen = stats.count()
+        states.append(state)
+
+    CoinRollingState.objects.bulk_create(states, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("subscriptions", "0027_coinrollingstate_indicator_state"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rolling_state, migrations.RunPython.noop),
+    ]
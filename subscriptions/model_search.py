@@ -0,0 +1,174 @@
+# subscriptions/model_search.py
+
+"""
+Подбор гиперпараметров классификатора направления (walk-forward)
+
+Кандидаты - сетки параметров движков (classifier_engines.py), за один
+подбор можно сравнить несколько движков. Кандидаты оцениваются на
+расширяющемся окне по датам: обучение на всех днях до границы, проверка
+на следующем отрезке дней, граница сдвигается вперед. Строки одного дня (разные монеты) всегда в одной части, поэтому
+будущее не попадает в обучение. StandardScaler обучается внутри каждого
+разбиения (Pipeline), как и в проде.
+
+Обучения (кандидат x разбиение) раздаются по всем ядрам пулом процессов
+(GridSearchCV / RandomizedSearchCV, n_jobs=-1, joblib loky). Победитель -
+лучший средний AUC вне выборки, полная таблица результатов сохраняется
+в ml/models/classifier_search.json.
+
+Запуск: python manage.py search_classifier или
+train_classification_model_v2(search=True) - обучение победителя.
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import GridSearchCV, RandomizedSearchCV
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from .artifacts import ML_MODELS_DIR, atomic_write
+from .classifier_engines import engine_for_model, get_engine
+
+SEARCH_RESULTS_PATH = ML_MODELS_DIR / 'classifier_search.json'
+
+
+def walk_forward_splits(dates, n_splits=5, min_train_share=0.5):
+    """
+    Разбиения (train_idx, test_idx) с расширяющимся окном по датам:
+    первые min_train_share дней - минимальное обучение, остальные дни
+    делятся на n_splits последовательных отрезков проверки
+    """
+    dates = np.asarray(dates)
+    days = np.unique(dates)
+    first_test = int(len(days) * min_train_share)
+    if first_test < 1 or len(days) - first_test < n_splits:
+        raise ValueError(f"Слишком мало дней ({len(days)}) для {n_splits} разбиений")
+
+    boundaries = np.linspace(first_test, len(days), n_splits + 1).astype(int)
+    splits = []
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        train = np.flatnonzero(dates < days[start])
+        test = np.flatnonzero((dates >= days[start]) & (dates <= days[end - 1]))
+        splits.append((train, test))
+    return splits
+
+
+def _day(value):
+    return pd.Timestamp(value).date().isoformat()
+
+
+def make_pipeline(params=None, engine='gbc'):
+    """StandardScaler + модель движка (params поверх default_params движка)"""
+    return Pipeline([
+        ('scaler', StandardScaler()),
+        ('model', get_engine(engine).build(params)),
+    ])
+
+
+def _candidates(engines, n_iter):
+    """
+    Сетки параметров движков (шаг 'model' подменяется моделью движка);
+    default_params движка добавляется отдельной точкой, если его нет в сетке
+    """
+    candidates = []
+    for engine in engines:
+        model = [engine.build()]
+        candidates.append({'model': model, **{f'model__{name}': values for name, values in engine.param_grid.items()}})
+        in_grid = all(value in engine.param_grid.get(name, []) for name, value in engine.default_params.items())
+        if not (n_iter or in_grid):
+            candidates.append({'model': model, **{f'model__{name}': [value] for name, value in engine.default_params.items()}})
+    return candidates
+
+
+def run_search(df, feature_cols, n_splits=5, n_iter=None, n_jobs=-1, random_state=42, engines=('gbc',)):
+    """
+    Walk-forward подбор на df (date, target + feature_cols).
+    engines - движки (classifier_engines.py), сетки которых перебираются вместе.
+    n_iter - случайный поиск из n_iter точек сетки вместо полного перебора.
+    Возвращает результаты (победитель и таблица) и сохраняет их в SEARCH_RESULTS_PATH
+    """
+    df = df.sort_values('date', kind='stable').reset_index(drop=True)
+    X = df[feature_cols].to_numpy(dtype=float)
+    y = df['target'].to_numpy()
+    splits = walk_forward_splits(df['date'].to_numpy(), n_splits)
+
+    common = dict(
+        scoring={'auc': 'roc_auc', 'accuracy': 'accuracy'},
+        refit=False, cv=splits, n_jobs=n_jobs, error_score=np.nan,
+    )
+    engines = [get_engine(name) for name in engines]
+    candidates = _candidates(engines, n_iter)
+    if n_iter:
+        search = RandomizedSearchCV(make_pipeline(), candidates, n_iter=n_iter,
+                                    random_state=random_state, **common)
+    else:
+        search = GridSearchCV(make_pipeline(), candidates, **common)
+
+    started = time.perf_counter()
+    search.fit(X, y)
+    seconds = time.perf_counter() - started
+
+    cv = search.cv_results_
+    leaderboard = []
+    for i, params in enumerate(cv['params']):
+        leaderboard.append({
+            'engine': engine_for_model(params['model']).name,
+            'params': {name.removeprefix('model__'): value for name, value in params.items() if name != 'model'},
+            'mean_auc': float(cv['mean_test_auc'][i]),
+            'std_auc': float(cv['std_test_auc'][i]),
+            'fold_auc': [float(cv[f'split{k}_test_auc'][i]) for k in range(len(splits))],
+            'mean_accuracy': float(cv['mean_test_accuracy'][i]),
+            'mean_fit_seconds': float(cv['mean_fit_time'][i]),
+        })
+    # NaN (ошибка обучения) - в конец
+    leaderboard.sort(key=lambda row: -np.nan_to_num(row['mean_auc'], nan=-np.inf))
+    for rank, row in enumerate(leaderboard, start=1):
+        row['rank'] = rank
+
+    defaults = {
+        engine.name: next((row for row in leaderboard
+                           if row['engine'] == engine.name and row['params'] == engine.default_params), None)
+        for engine in engines
+    }
+    results = {
+        'searched_at': datetime.now().isoformat(),
+        'mode': 'random' if n_iter else 'grid',
+        'engines': [engine.name for engine in engines],
+        'features': list(feature_cols),
+        'samples': int(len(df)),
+        'splits': [
+            {
+                'train_until': _day(df['date'].iloc[train[-1]]),
+                'test_from': _day(df['date'].iloc[test[0]]),
+                'test_until': _day(df['date'].iloc[test[-1]]),
+                'train_samples': int(len(train)),
+                'test_samples': int(len(test)),
+            }
+            for train, test in splits
+        ],
+        'candidates': len(leaderboard),
+        'fits': len(leaderboard) * len(splits),
+        'n_jobs': n_jobs if n_jobs > 0 else os.cpu_count(),
+        'seconds': round(seconds, 2),
+        'best': leaderboard[0],
+        # Параметры по умолчанию первого движка и каждого движка
+        'default': defaults[engines[0].name],
+        'defaults': defaults,
+        'leaderboard': leaderboard,
+    }
+
+    with atomic_write(SEARCH_RESULTS_PATH, 'w') as f:
+        json.dump(results, f, indent=2, default=str)
+    return results
+
+
+def load_search_results():
+    """Последние сохраненные результаты подбора (None, если подбора не было)"""
+    if not SEARCH_RESULTS_PATH.exists():
+        return None
+    with open(SEARCH_RESULTS_PATH) as f:
+        return json.load(f)
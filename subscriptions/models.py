@@ -2,6 +2,8 @@ from django.db import models
 
 # subscriptions/models.py
 
+import hashlib
+
 from django.db import models
 from django.utils import timezone
 
@@ -93,6 +95,31 @@ class CoinDailyStat(models.Model):
         return f"{self.coin.symbol.upper()} — {self.date}"
 
 
+class CoinRollingState(models.Model):
+    """
+    Скользящее окно последних дней CoinDailyStat монеты (см. rolling_state.py):
+    кольцевой буфер цен/объемов и суммы Уэлфорда. Обновляется за O(1)
+    при записи нового дня.
+    indicator_state - состояние индикаторов (indicators.py) по всем дням
+    до первого дня окна: индикаторы дней окна считаются без истории
+    """
+    coin = models.OneToOneField(CoinSnapshot, on_delete=models.CASCADE, related_name="rolling_state")
+    window = models.PositiveSmallIntegerField(default=7)
+    last_date = models.DateField(null=True, blank=True)
+    dates = models.JSONField(default=list)  # даты буфера, от старой к новой (ISO)
+    prices = models.JSONField(default=list)
+    volumes = models.JSONField(default=list)
+    price_mean = models.FloatField(default=0.0)
+    price_m2 = models.FloatField(default=0.0)  # сумма квадратов отклонений (Уэлфорд)
+    volume_sum = models.FloatField(default=0.0)
+    days_seen = models.IntegerField(default=0)  # всего дней в истории монеты
+    indicator_state = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.coin.symbol.upper()} — окно {len(self.prices)}/{self.window} до {self.last_date}"
+
+
 class Subscription(models.Model):  # модель для подписок
     user = models.ForeignKey(BotUser, on_delete=models.CASCADE)  # связь с таблицей пользователей
     coin = models.ForeignKey(CoinSnapshot, on_delete=models.CASCADE)  # связь с таблицей монет
@@ -106,6 +133,52 @@ class Subscription(models.Model):  # модель для подписок
     
 
 
+def compute_news_fingerprint(title, description):
+    """
+    Отпечаток текста новости: title + description без учета регистра
+    и пробелов. Одинаковые перепечатки одной истории дают один отпечаток.
+    """
+    text = f"{title or ''} {description or ''}"
+    normalized = ' '.join(text.lower().split())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+class NewsStory(models.Model):
+    """
+    Кластер почти одинаковых новостей (перепечатки одной истории).
+    Новости связываются по MinHash заголовка и описания (см. news_dedup.py)
+    """
+    minhash = models.BinaryField()  # сигнатура канонической новости
+    fingerprint = models.CharField(max_length=64)  # отпечаток канонической новости
+    canonical_article = models.ForeignKey(
+        'NewsArticle', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    article_count = models.IntegerField(default=1)
+    first_published_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "News Story"
+        verbose_name_plural = "News Stories"
+        ordering = ['-first_published_at']
+    
+    def __str__(self):
+        return f"Story #{self.id} ({self.article_count} news)"
+
+
+class NewsStoryBand(models.Model):
+    """Полосы MinHash-сигнатуры (LSH-бакеты) для поиска кандидатов в дубликаты"""
+    story = models.ForeignKey(NewsStory, on_delete=models.CASCADE, related_name='bands')
+    band = models.PositiveSmallIntegerField()
+    value = models.BigIntegerField()
+    
+    class Meta:
+        unique_together = ['story', 'band']
+        indexes = [
+            models.Index(fields=['band', 'value']),
+        ]
+
+
 class NewsArticle(models.Model):
     NEWS_TYPE_CHOICES = [
         ('financial', 'Financial'),
@@ -129,10 +202,23 @@ class NewsArticle(models.Model):
     )
     
     created_at = models.DateTimeField(auto_now_add=True)
+    
+    # Отпечаток текста (см. compute_news_fingerprint) - ключ кэша тональности
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    
+    # Кластер перепечаток одной истории (заполняется при сборе новостей)
+    story = models.ForeignKey(
+        NewsStory, on_delete=models.SET_NULL, null=True, blank=True, related_name='articles'
+    )
 
     def __str__(self):
         return f"{self.coin.symbol.upper()} - {self.title[:50]}"
     
+    def save(self, *args, **kwargs):
+        if not self.content_hash:
+            self.content_hash = compute_news_fingerprint(self.title, self.description)
+        super().save(*args, **kwargs)
+    
     class Meta:
         ordering = ['-published_at']
 
@@ -145,6 +231,8 @@ class NewsSentiment(models.Model):
     sentiment_label = models.CharField(max_length=50)
     sentiment_score = models.FloatField()
     confidence = models.FloatField(default=0.0)
+    # Какая модель дала оценку (в каскадном режиме - custom или FinBERT)
+    source_model = models.CharField(max_length=50, default='finbert', db_index=True)
     analyzed_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
@@ -175,6 +263,82 @@ class CustomModelSentiment(models.Model):
 
 
 
+class CoinDailySentiment(models.Model):
+    """
+    Дневная сводка тональности новостей монеты (см. sentiment_rollup.py).
+    День - дата публикации в settings.TIME_ZONE.
+    model_version: 'primary' - основная таблица NewsSentiment,
+    иначе - версия из CustomModelSentiment
+    """
+    coin = models.ForeignKey(CoinSnapshot, on_delete=models.CASCADE, related_name='daily_sentiment')
+    date = models.DateField()
+    model_version = models.CharField(max_length=50)
+    article_count = models.IntegerField(default=0)  # все новости дня, в т.ч. без оценки
+    scored_count = models.IntegerField(default=0)  # новости с оценкой
+    sentiment_sum = models.FloatField(default=0.0)  # сумма sentiment_score
+    positive_count = models.IntegerField(default=0)  # score > 0.05
+    negative_count = models.IntegerField(default=0)  # score < -0.05
+    story_count = models.IntegerField(default=0)  # уникальные истории (NewsStory) + новости без истории
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Coin Daily Sentiment"
+        verbose_name_plural = "Coin Daily Sentiment"
+        unique_together = ['coin', 'date', 'model_version']
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.coin.symbol} - {self.date} ({self.model_version}: {self.article_count} news)"
+
+
+class CoinFeatureSnapshot(models.Model):
+    """
+    Хранилище признаков классификатора (см. feature_store.py): признаки
+    монеты на день, посчитанные один раз и общие для обучения и прогноза
+    """
+    coin = models.ForeignKey(CoinSnapshot, on_delete=models.CASCADE, related_name='feature_snapshots')
+    date = models.DateField()
+    feature_set_version = models.CharField(max_length=30)  # features.feature_set_version()
+    features = models.JSONField()  # {имя признака: значение}, features.FEATURE_COLUMNS
+    price = models.FloatField()  # цена на день date
+    price_change_percent = models.FloatField(null=True, blank=True)  # изменение к следующему дню (цель)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Coin Feature Snapshot"
+        verbose_name_plural = "Coin Feature Snapshots"
+        unique_together = ['coin', 'date', 'feature_set_version']
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['feature_set_version', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.coin.symbol} - {self.date} ({self.feature_set_version})"
+
+
+class SentimentCache(models.Model):
+    """
+    Кэш результатов моделей тональности по отпечатку текста.
+    Перепечатки одной новости (другой URL, другая монета) не анализируются повторно.
+    fingerprint - отпечаток текста или 'story:' + отпечаток кластера (sentiment_cache.py)
+    """
+    fingerprint = models.CharField(max_length=80)
+    model_version = models.CharField(max_length=50)
+    sentiment_label = models.CharField(max_length=50)
+    sentiment_score = models.FloatField()
+    confidence = models.FloatField(default=0.0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = "Sentiment Cache"
+        verbose_name_plural = "Sentiment Cache"
+        unique_together = ['fingerprint', 'model_version']
+    
+    def __str__(self):
+        return f"{self.fingerprint[:12]} - {self.sentiment_label} ({self.model_version})"
+
+
 class PriceEvent(models.Model):
     coin = models.ForeignKey(CoinSnapshot, on_delete=models.CASCADE, related_name='events')
     date = models.DateField()
@@ -274,12 +438,20 @@ class DirectionPrediction(models.Model):
     # Метаданные
     model_version = models.CharField(max_length=50, default='classifier_v2')
     
+    # Фактический исход (tasks.score_prediction_outcomes): изменение цены
+    # от дня прогноза к следующему дню CoinDailyStat
+    actual_change_percent = models.FloatField(null=True, blank=True)
+    actual_direction = models.CharField(max_length=4, null=True, blank=True)  # UP / DOWN / FLAT
+    is_correct = models.BooleanField(null=True, blank=True)
+    evaluated_at = models.DateTimeField(null=True, blank=True)
+    
     class Meta:
         ordering = ['-prediction_date', '-confidence_score']
         unique_together = ['coin', 'prediction_date']
         indexes = [
             models.Index(fields=['coin', '-prediction_date']),
             models.Index(fields=['predicted_direction']),
+            models.Index(fields=['model_version', 'prediction_date']),
         ]
     
     def __str__(self):
@@ -294,3 +466,38 @@ class DirectionPrediction(models.Model):
             return 'moderate'
         else:
             return 'weak'
+
+
+class PredictionAccuracyStat(models.Model):
+    """
+    Точность прогнозов направления за скользящее окно (tasks.score_prediction_outcomes):
+    по версии модели и монете, coin = None - по всем монетам версии
+    """
+    model_version = models.CharField(max_length=50)
+    coin = models.ForeignKey(
+        CoinSnapshot, on_delete=models.CASCADE, null=True, blank=True, related_name='accuracy_stats'
+    )
+    window_days = models.PositiveSmallIntegerField()  # 0 - вся история
+    evaluated = models.IntegerField(default=0)  # прогнозов с известным исходом
+    correct = models.IntegerField(default=0)
+    accuracy = models.FloatField(null=True, blank=True)
+    avg_confidence = models.FloatField(null=True, blank=True)
+    strong_evaluated = models.IntegerField(default=0)  # уверенность >= 0.7
+    strong_correct = models.IntegerField(default=0)
+    date_from = models.DateField(null=True, blank=True)
+    date_to = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Prediction Accuracy Stat"
+        verbose_name_plural = "Prediction Accuracy Stats"
+        ordering = ['model_version', 'window_days', 'coin']
+        indexes = [
+            models.Index(fields=['model_version', 'window_days']),
+        ]
+
+    def __str__(self):
+        scope = self.coin.symbol if self.coin_id else 'all'
+        window = f"{self.window_days}d" if self.window_days else 'all time'
+        accuracy = f"{self.accuracy * 100:.1f}%" if self.accuracy is not None else '—'
+        return f"{self.model_version} / {scope} / {window}: {accuracy} ({self.evaluated})"
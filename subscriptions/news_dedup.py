@@ -0,0 +1,142 @@
+# subscriptions/news_dedup.py
+
+"""
+Поиск почти одинаковых новостей (MinHash LSH)
+
+NewsAPI отдает много легких переписываний одной и той же ленты. Для каждой
+новости считается MinHash-сигнатура (64 хэша) по множеству слов заголовка
+и описания. Сигнатура режется на 16 полос по 4 хэша: новости, совпадающие
+хотя бы в одной полосе, - кандидаты, а дубликатом считается кандидат с
+оценкой сходства Жаккара не ниже NEWS_DEDUP_MIN_JACCARD.
+
+SimHash на коротких заголовках оказался слишком шумным (перепечатка с парой
+замененных слов дает 7-18 бит расхождения), поэтому используется MinHash.
+
+Каждая новость привязывается к кластеру NewsStory: тональность считается
+один раз на кластер, а признаки могут считать уникальные истории.
+"""
+
+import hashlib
+import re
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+
+from .models import NewsArticle, NewsStory, NewsStoryBand
+
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Фиксированные случайные перестановки вида (a * h + b) mod 2^64, a - нечетное
+_rng = np.random.RandomState(20251218)
+_PERM_A = (_rng.randint(0, 2 ** 63, NUM_PERM, dtype=np.int64).astype(np.uint64) << np.uint64(1)) | np.uint64(1)
+_PERM_B = _rng.randint(0, 2 ** 63, NUM_PERM, dtype=np.int64).astype(np.uint64)
+
+
+def news_tokens(title, description):
+    """Множество слов заголовка и описания"""
+    return set(_TOKEN_RE.findall(f"{title or ''} {description or ''}".lower()))
+
+
+def minhash_signature(tokens):
+    """MinHash-сигнатура множества токенов: массив NUM_PERM значений uint64"""
+    if not tokens:
+        return np.zeros(NUM_PERM, dtype=np.uint64)
+
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(t.encode('utf-8'), digest_size=8).digest(), 'big')
+         for t in tokens],
+        dtype=np.uint64,
+    )
+    return (hashes[:, None] * _PERM_A[None, :] + _PERM_B[None, :]).min(axis=0)
+
+
+def signature_to_bytes(signature):
+    return signature.astype('<u8').tobytes()
+
+
+def signature_from_bytes(data):
+    return np.frombuffer(bytes(data), dtype='<u8')
+
+
+def estimated_jaccard(sig_a, sig_b):
+    return float(np.mean(sig_a == sig_b))
+
+
+def band_values(signature):
+    """Хэши полос сигнатуры (int64 для BigIntegerField)"""
+    values = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(signature_to_bytes(rows), digest_size=8).digest()
+        values.append(int.from_bytes(digest, 'big', signed=True))
+    return values
+
+
+def find_story(signature, published_at, min_jaccard=None, window_days=None):
+    """Самый похожий кластер для сигнатуры или None"""
+    min_jaccard = settings.NEWS_DEDUP_MIN_JACCARD if min_jaccard is None else min_jaccard
+    window_days = settings.NEWS_DEDUP_WINDOW_DAYS if window_days is None else window_days
+
+    bands_filter = Q()
+    for band, value in enumerate(band_values(signature)):
+        bands_filter |= Q(band=band, value=value)
+
+    candidates = (
+        NewsStoryBand.objects
+        .filter(bands_filter)
+        .filter(
+            story__first_published_at__gte=published_at - timedelta(days=window_days),
+            story__first_published_at__lte=published_at + timedelta(days=window_days),
+        )
+        .values_list('story_id', 'story__minhash')
+        .distinct()
+    )
+
+    best = None
+    for story_id, story_signature in candidates:
+        similarity = estimated_jaccard(signature, signature_from_bytes(story_signature))
+        if similarity >= min_jaccard and (best is None or similarity > best[1]):
+            best = (story_id, similarity)
+
+    return best[0] if best else None
+
+
+def assign_story(article):
+    """
+    Привязывает новость к кластеру (существующему или новому).
+    Возвращает (story_id, created)
+    """
+    tokens = news_tokens(article.title, article.description)
+    signature = minhash_signature(tokens)
+
+    with transaction.atomic():
+        story_id = find_story(signature, article.published_at) if tokens else None
+        created = story_id is None
+
+        if created:
+            story = NewsStory.objects.create(
+                minhash=signature_to_bytes(signature),
+                fingerprint=article.content_hash,
+                canonical_article=article,
+                first_published_at=article.published_at,
+            )
+            if tokens:
+                NewsStoryBand.objects.bulk_create([
+                    NewsStoryBand(story=story, band=band, value=value)
+                    for band, value in enumerate(band_values(signature))
+                ])
+            story_id = story.id
+        else:
+            NewsStory.objects.filter(id=story_id).update(article_count=F('article_count') + 1)
+
+        NewsArticle.objects.filter(id=article.id).update(story_id=story_id)
+
+    article.story_id = story_id
+    return story_id, created
@@ -0,0 +1,190 @@
+# subscriptions/prediction_outcomes.py
+
+"""
+Исходы прогнозов направления и живая точность модели
+
+Каждую ночь (tasks.score_prediction_outcomes):
+
+  score_outcomes  - прогнозы прошлых дней сверяются с фактическим изменением
+                    цены (CoinDailyStat: день прогноза -> следующий день монеты,
+                    как цель при обучении) одним UPDATE ... SET = (подзапрос)
+                    на стороне БД, без загрузки строк в Python. Последние
+                    RESCORE_DAYS дней пересчитываются: цена дня уточняется
+                    сбором исторических цен
+  refresh_stats   - PredictionAccuracyStat: точность за окна ACCURACY_WINDOWS
+                    по версии модели и монете (GROUP BY), таблица заменяется целиком
+  write_summary   - сводка в ml/models/prediction_accuracy.json; /api/model/info/,
+                    отчет о модели и /faq читают ее через кэш артефактов
+                    (artifacts.py) без запросов к БД
+"""
+
+import json
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Avg, Case, Count, Exists, Max, Min, OuterRef, Q, Subquery, Value, When
+from django.db.models.lookups import GreaterThan, LessThan
+from django.utils import timezone
+
+from .artifacts import ML_MODELS_DIR, atomic_write, cache as artifact_cache, load_json
+from .models import CoinDailyStat, DirectionPrediction, PredictionAccuracyStat
+
+SUMMARY_PATH = ML_MODELS_DIR / 'prediction_accuracy.json'
+
+# Окна точности в днях, 0 - вся история
+ACCURACY_WINDOWS = (7, 30, 0)
+
+# Сколько последних дней пересчитывать, даже если исход уже записан
+RESCORE_DAYS = 2
+
+# Уверенность сильного сигнала (DirectionPrediction.signal_strength)
+STRONG_CONFIDENCE = 0.7
+
+
+def score_outcomes(today=None, rescore_days=RESCORE_DAYS):
+    """
+    Записывает фактический исход прогнозов до today (не включая) одним UPDATE:
+    еще не оцененных и всех за последние rescore_days дней. Прогнозы без цены
+    дня прогноза или следующего дня остаются неоцененными. Возвращает число строк
+    """
+    today = today or timezone.now().date()
+
+    day_stats = CoinDailyStat.objects.filter(coin_id=OuterRef('coin_id'), date=OuterRef('prediction_date'))
+    next_stats = (
+        CoinDailyStat.objects
+        .filter(coin_id=OuterRef('coin_id'), date__gt=OuterRef('prediction_date'), date__lte=today)
+        .order_by('date')
+    )
+    price = Subquery(day_stats.values('price')[:1])
+    next_price = Subquery(next_stats.values('price')[:1])
+    change = (next_price - price) * Value(100.0) / price
+
+    went_up, went_down = GreaterThan(next_price, price), LessThan(next_price, price)
+
+    return (
+        DirectionPrediction.objects
+        .filter(Q(is_correct__isnull=True) | Q(prediction_date__gte=today - timedelta(days=rescore_days)),
+                prediction_date__lt=today)
+        .filter(Exists(day_stats.filter(price__gt=0)), Exists(next_stats))
+        .update(
+            actual_change_percent=change,
+            actual_direction=Case(
+                When(went_up, then=Value('UP')),
+                When(went_down, then=Value('DOWN')),
+                default=Value('FLAT'),
+            ),
+            is_correct=Case(
+                When(went_up, predicted_direction='UP', then=Value(True)),
+                When(went_down, predicted_direction='DOWN', then=Value(True)),
+                default=Value(False),
+            ),
+            evaluated_at=timezone.now(),
+        )
+    )
+
+
+def _aggregate(qs, group_by):
+    return qs.values(*group_by).annotate(
+        evaluated=Count('id'),
+        correct=Count('id', filter=Q(is_correct=True)),
+        avg_confidence=Avg('confidence_score'),
+        strong_evaluated=Count('id', filter=Q(confidence_score__gte=STRONG_CONFIDENCE)),
+        strong_correct=Count('id', filter=Q(confidence_score__gte=STRONG_CONFIDENCE, is_correct=True)),
+        date_from=Min('prediction_date'),
+        date_to=Max('prediction_date'),
+    )
+
+
+def refresh_stats(today=None):
+    """
+    Пересчитывает PredictionAccuracyStat: по каждому окну - GROUP BY версии
+    модели и монете и GROUP BY версии (coin = None). Возвращает число строк
+    """
+    today = today or timezone.now().date()
+    evaluated = DirectionPrediction.objects.filter(is_correct__isnull=False)
+
+    stats = []
+    for window_days in ACCURACY_WINDOWS:
+        qs = evaluated.filter(prediction_date__gte=today - timedelta(days=window_days)) if window_days else evaluated
+        for group_by in (['model_version', 'coin_id'], ['model_version']):
+            for row in _aggregate(qs, group_by):
+                stats.append(PredictionAccuracyStat(
+                    model_version=row['model_version'],
+                    coin_id=row.get('coin_id'),
+                    window_days=window_days,
+                    evaluated=row['evaluated'],
+                    correct=row['correct'],
+                    accuracy=row['correct'] / row['evaluated'],
+                    avg_confidence=row['avg_confidence'],
+                    strong_evaluated=row['strong_evaluated'],
+                    strong_correct=row['strong_correct'],
+                    date_from=row['date_from'],
+                    date_to=row['date_to'],
+                ))
+
+    # Читатели видят либо старую, либо новую таблицу целиком
+    with transaction.atomic():
+        PredictionAccuracyStat.objects.all().delete()
+        PredictionAccuracyStat.objects.bulk_create(stats)
+    return len(stats)
+
+
+def _window_name(window_days):
+    return f'{window_days}d' if window_days else 'all'
+
+
+def _stat_summary(stat):
+    return {
+        'evaluated': stat.evaluated,
+        'correct': stat.correct,
+        'accuracy': stat.accuracy,
+        'avg_confidence': stat.avg_confidence,
+        'strong_accuracy': stat.strong_correct / stat.strong_evaluated if stat.strong_evaluated else None,
+        'strong_evaluated': stat.strong_evaluated,
+        'date_from': stat.date_from.isoformat() if stat.date_from else None,
+        'date_to': stat.date_to.isoformat() if stat.date_to else None,
+    }
+
+
+def build_summary():
+    """
+    Сводка точности из PredictionAccuracyStat:
+    {model_versions: {версия: {окно: метрики}}, coins: {версия: {символ: {окно: метрики}}}},
+    current_model_version - версия самого свежего прогноза
+    """
+    summary = {'generated_at': timezone.now().isoformat(), 'model_versions': {}, 'coins': {}}
+    for stat in PredictionAccuracyStat.objects.select_related('coin'):
+        window = _window_name(stat.window_days)
+        if stat.coin_id is None:
+            summary['model_versions'].setdefault(stat.model_version, {})[window] = _stat_summary(stat)
+        else:
+            coins = summary['coins'].setdefault(stat.model_version, {})
+            coins.setdefault(stat.coin.symbol.upper(), {})[window] = _stat_summary(stat)
+
+    latest = DirectionPrediction.objects.order_by('-prediction_date', '-created_at').values('model_version').first()
+    summary['current_model_version'] = latest['model_version'] if latest else None
+    return summary
+
+
+def write_summary(summary=None):
+    summary = summary or build_summary()
+    with atomic_write(SUMMARY_PATH, 'w') as f:
+        json.dump(summary, f, indent=2, default=str)
+    return summary
+
+
+def load_summary():
+    """Последняя сводка (через кэш артефактов), None - если еще не считалась"""
+    try:
+        return artifact_cache.get(SUMMARY_PATH, load_json)
+    except FileNotFoundError:
+        return None
+
+
+def live_accuracy(summary=None, window='all', model_version=None):
+    """Метрики текущей (или model_version) версии модели за окно ('7d', '30d', 'all'), None - если нет"""
+    summary = summary if summary is not None else load_summary()
+    if not summary:
+        return None
+    model_version = model_version or summary.get('current_model_version')
+    return summary['model_versions'].get(model_version, {}).get(window)
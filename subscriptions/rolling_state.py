@@ -0,0 +1,334 @@
+# subscriptions/rolling_state.py
+
+"""
+Скользящее окно дневных цен монеты с переносимым состоянием (CoinRollingState)
+
+Для каждой монеты хранится кольцевой буфер последних PRICE_WINDOW дней
+CoinDailyStat и суммы Уэлфорда (среднее и сумма квадратов отклонений).
+Когда collect_historical_prices записывает день, состояние обновляется
+за O(1), без чтения истории:
+
+  новый день           - добавить в окно, самый старый день убрать
+  день уже в окне      - заменить значение (цена за сегодня обновляется каждый час)
+  день раньше окна     - только счетчик дней истории
+  пропуск внутри окна  - пересобрать состояние из CoinDailyStat
+
+Ценовые признаки последнего дня (среднее, std, тренд, средний объем)
+читаются прямо из состояния (price_features), признаки для прогноза
+без индикаторов - live_feature_frame. Накопленную погрешность
+и расхождения с таблицей проверяет python manage.py verify_rolling_state.
+
+Состояние технических индикаторов (indicators.py) ведется по дням до
+первого дня окна: день, который уходит из окна, добавляется в него
+append_day. Индикаторы дней окна (window_indicator_frame) считаются
+по состоянию и ценам окна, без чтения истории. Состояние действительно,
+если в нем ровно days_seen - len(prices) дней; иначе (день истории
+добавлен задним числом) оно пересобирается при следующем сдвиге окна,
+а до тех пор индикаторы считаются по всей истории.
+"""
+
+import math
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+
+from .features import (
+    FEATURE_COLUMNS, PREVIOUS_NEWS_WINDOW, PRICE_WINDOW,
+    add_news_features, load_daily_sentiment, price_window_features,
+)
+from .indicators import INDICATOR_COLUMNS, append_day, compute_indicators, indicator_frame
+from .models import CoinDailyStat, CoinRollingState
+
+PRICE_FEATURE_COLUMNS = ['price_trend_7d', 'volatility_7d', 'avg_volume_7d', 'avg_price_7d']
+
+
+# ---------- суммы Уэлфорда ----------
+
+def _add(state, price, volume):
+    count = len(state.prices)
+    delta = price - state.price_mean
+    state.price_mean += delta / count
+    state.price_m2 += delta * (price - state.price_mean)
+    state.volume_sum += volume
+
+
+def _remove(state, price, volume):
+    count = len(state.prices)
+    if count == 0:
+        state.price_mean = state.price_m2 = state.volume_sum = 0.0
+        return
+    mean = state.price_mean
+    state.price_mean = mean - (price - mean) / count
+    state.price_m2 = max(state.price_m2 - (price - mean) * (price - state.price_mean), 0.0)
+    state.volume_sum -= volume
+
+
+def _replace(state, index, price, volume):
+    count = len(state.prices)
+    old_price, old_volume = state.prices[index], state.volumes[index]
+    mean = state.price_mean
+    state.price_mean = mean + (price - old_price) / count
+    state.price_m2 = max(state.price_m2 + (price - old_price) * (price - state.price_mean + old_price - mean), 0.0)
+    state.volume_sum += volume - old_volume
+    state.prices[index] = price
+    state.volumes[index] = volume
+
+
+# ---------- состояние индикаторов ----------
+
+def _indicator_state_valid(state):
+    """В состоянии индикаторов учтены все дни истории до окна"""
+    return state.indicator_state.get('days', 0) == state.days_seen - len(state.prices)
+
+
+def _rebuild_indicator_state(state):
+    """Состояние индикаторов по всем дням CoinDailyStat до первого дня окна - O(истории)"""
+    before = CoinDailyStat.objects.filter(coin_id=state.coin_id)
+    if state.dates:
+        before = before.filter(date__lt=state.dates[0])
+    rows = list(before.order_by('date').values_list('price', 'volume'))
+    _, state.indicator_state = compute_indicators(
+        [float(price) for price, _ in rows], [float(volume or 0) for _, volume in rows],
+    )
+
+
+# ---------- обновление ----------
+
+def rebuild_state(coin_id, window=PRICE_WINDOW):
+    """Состояние монеты заново из CoinDailyStat (последние window дней)"""
+    stats = CoinDailyStat.objects.filter(coin_id=coin_id)
+    last = list(stats.order_by('-date').values_list('date', 'price', 'volume')[:window])[::-1]
+
+    state, _ = CoinRollingState.objects.get_or_create(coin_id=coin_id)
+    state.window = window
+    state.dates, state.prices, state.volumes = [], [], []
+    state.price_mean = state.price_m2 = state.volume_sum = 0.0
+    for day, price, volume in last:
+        state.dates.append(day.isoformat())
+        state.prices.append(float(price))
+        state.volumes.append(float(volume or 0))
+        _add(state, float(price), float(volume or 0))
+
+    state.last_date = last[-1][0] if last else None
+    state.days_seen = stats.count()
+    _rebuild_indicator_state(state)
+    state.save()
+    return state
+
+
+def push_day(coin_id, day, price, volume, created=True):
+    """
+    Учитывает записанный день CoinDailyStat (вызывать после сохранения,
+    created - день добавлен, а не обновлен). O(1) для нового дня,
+    дня внутри окна и дня раньше заполненного окна
+    """
+    price = float(price)
+    # Как хранится в CoinDailyStat.volume (BigIntegerField)
+    volume = float(int(volume)) if volume is not None else 0.0
+
+    with transaction.atomic():
+        state = CoinRollingState.objects.select_for_update().filter(coin_id=coin_id).first()
+        if state is None:
+            return rebuild_state(coin_id)
+
+        key = day.isoformat()
+        if state.last_date is None or day > state.last_date:
+            if len(state.prices) >= state.window:
+                valid = _indicator_state_valid(state)
+                state.dates.pop(0)
+                old_price, old_volume = state.prices.pop(0), state.volumes.pop(0)
+                _remove(state, old_price, old_volume)
+                # День ушел из окна - в состояние индикаторов
+                if valid:
+                    _, state.indicator_state = append_day(state.indicator_state, old_price, old_volume)
+                else:
+                    _rebuild_indicator_state(state)
+            state.dates.append(key)
+            state.prices.append(price)
+            state.volumes.append(volume)
+            _add(state, price, volume)
+            state.last_date = day
+            state.days_seen += 1
+        elif key in state.dates:
+            _replace(state, state.dates.index(key), price, volume)
+        elif len(state.prices) >= state.window and key < state.dates[0]:
+            # День раньше окна на ценовые признаки не влияет, учитывается только
+            # в истории; состояние индикаторов пересоберется при сдвиге окна
+            if created:
+                state.days_seen += 1
+        else:
+            # Пропущенный день внутри окна или неполное окно - O(window) пересборка
+            return rebuild_state(coin_id, state.window)
+
+        state.save()
+    return state
+
+
+def coins_without_state(coin_ids=None):
+    """Монеты с ценами в CoinDailyStat, для которых состояние еще не собрано"""
+    coins = CoinDailyStat.objects.filter(coin__rolling_state__isnull=True)
+    if coin_ids is not None:
+        coins = coins.filter(coin_id__in=list(coin_ids))
+    return sorted(coins.order_by().values_list('coin_id', flat=True).distinct())
+
+
+# ---------- признаки ----------
+
+def state_price_features(state):
+    """Ценовые признаки последнего дня окна (как в price_window_features)"""
+    count = len(state.prices)
+    first, current = state.prices[0], state.prices[-1]
+    return {
+        'price_trend_7d': ((current - first) / first) * 100,
+        'volatility_7d': math.sqrt(state.price_m2 / count),
+        'avg_volume_7d': state.volume_sum / count,
+        'avg_price_7d': state.price_mean,
+    }
+
+
+def price_features(coin_ids=None):
+    """
+    Ценовые признаки последнего дня каждой монеты из состояния одним запросом:
+    coin_id, date, price + PRICE_FEATURE_COLUMNS. Как и в обучающем датасете,
+    нужны полное окно и еще один день истории до него
+    """
+    qs = CoinRollingState.objects.all()
+    if coin_ids is not None:
+        qs = qs.filter(coin_id__in=list(coin_ids))
+
+    rows = []
+    for state in qs:
+        if len(state.prices) < state.window or state.days_seen <= state.window:
+            continue
+        rows.append({
+            'coin_id': state.coin_id,
+            'date': state.last_date,
+            'price': state.prices[-1],
+            **state_price_features(state),
+        })
+    return pd.DataFrame(rows, columns=['coin_id', 'date', 'price'] + PRICE_FEATURE_COLUMNS)
+
+
+def window_indicator_frame(coin_ids=None):
+    """
+    Индикаторы дней окна по состоянию (без истории цен) одним запросом:
+    coin_id, date, price, volume + INDICATOR_COLUMNS. Монеты с недействительным
+    состоянием индикаторов пропускаются
+    """
+    qs = CoinRollingState.objects.all()
+    if coin_ids is not None:
+        qs = qs.filter(coin_id__in=list(coin_ids))
+
+    frames = []
+    for state in qs:
+        if not state.prices or not _indicator_state_valid(state):
+            continue
+        values, _ = compute_indicators(state.prices, state.volumes, state.indicator_state)
+        values.insert(0, 'coin_id', state.coin_id)
+        values.insert(1, 'date', [date.fromisoformat(day) for day in state.dates])
+        values.insert(2, 'price', state.prices)
+        values.insert(3, 'volume', state.volumes)
+        frames.append(values)
+
+    if not frames:
+        return pd.DataFrame(columns=['coin_id', 'date', 'price', 'volume'] + INDICATOR_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+# ---------- проверка ----------
+
+def verify(coin_ids=None, rtol=1e-9):
+    """
+    Сравнивает состояние с пересчетом из CoinDailyStat.
+    Возвращает список расхождений: {coin_id, field, stored, expected}
+    """
+    coins = CoinDailyStat.objects.order_by().values_list('coin_id', flat=True).distinct()
+    if coin_ids is not None:
+        coins = coins.filter(coin_id__in=list(coin_ids))
+    states = {state.coin_id: state for state in CoinRollingState.objects.filter(coin_id__in=list(coins))}
+
+    problems = []
+    for coin_id in coins:
+        state = states.get(coin_id)
+        if state is None:
+            problems.append({'coin_id': coin_id, 'field': 'state', 'stored': None, 'expected': 'exists'})
+            continue
+
+        window = state.window
+        last = list(
+            CoinDailyStat.objects.filter(coin_id=coin_id)
+            .order_by('-date').values_list('date', 'price', 'volume')[:window]
+        )[::-1]
+        expected_dates = [day.isoformat() for day, _, _ in last]
+        if state.dates != expected_dates:
+            problems.append({'coin_id': coin_id, 'field': 'dates', 'stored': state.dates, 'expected': expected_dates})
+            continue
+
+        days_seen = CoinDailyStat.objects.filter(coin_id=coin_id).count()
+        if state.days_seen != days_seen:
+            problems.append({'coin_id': coin_id, 'field': 'days_seen', 'stored': state.days_seen, 'expected': days_seen})
+        else:
+            problems.extend(_verify_indicators(state, rtol))
+
+        if len(last) < window:
+            continue
+
+        daily = pd.DataFrame(
+            [(coin_id, day, float(price), float(volume or 0)) for day, price, volume in last],
+            columns=['coin_id', 'date', 'price', 'volume'],
+        )
+        expected = price_window_features(daily).iloc[-1]
+        stored = state_price_features(state)
+        for field in PRICE_FEATURE_COLUMNS:
+            if not math.isclose(stored[field], expected[field], rel_tol=rtol, abs_tol=1e-12):
+                problems.append({
+                    'coin_id': coin_id, 'field': field,
+                    'stored': stored[field], 'expected': float(expected[field]),
+                })
+
+    return problems
+
+
+def _verify_indicators(state, rtol):
+    """Индикаторы последнего дня окна по состоянию против расчета по всей истории"""
+    if not _indicator_state_valid(state):
+        return [{
+            'coin_id': state.coin_id, 'field': 'indicator_state',
+            'stored': state.indicator_state.get('days', 0), 'expected': state.days_seen - len(state.prices),
+        }]
+    if not state.prices:
+        return []
+
+    history = pd.DataFrame(
+        list(CoinDailyStat.objects.filter(coin_id=state.coin_id).order_by('date').values_list('coin_id', 'date', 'price', 'volume')),
+        columns=['coin_id', 'date', 'price', 'volume'],
+    ).astype({'price': float, 'volume': float})
+    expected = indicator_frame(history).iloc[-1]
+    stored, _ = compute_indicators(state.prices, state.volumes, state.indicator_state)
+    stored = stored.iloc[-1]
+
+    return [
+        {'coin_id': state.coin_id, 'field': field, 'stored': float(stored[field]), 'expected': float(expected[field])}
+        for field in INDICATOR_COLUMNS
+        if not math.isclose(stored[field], expected[field], rel_tol=rtol, abs_tol=1e-9)
+    ]
+
+
+def live_feature_frame(coin_ids=None, unique_stories=False):
+    """
+    Признаки последнего дня монет (как compute_feature_frame без индикаторов)
+    по ценовому состоянию и дневной сводке новостей - без чтения истории цен.
+    price_change_percent - NaN (следующего дня еще нет)
+    """
+    frame = price_features(coin_ids)
+    columns = ['coin_id', 'date', 'price', 'price_change_percent'] + FEATURE_COLUMNS
+    if frame.empty:
+        return pd.DataFrame(columns=columns)
+
+    frame['price_change_percent'] = np.nan
+    news_from = frame['date'].min() - timedelta(days=PREVIOUS_NEWS_WINDOW[1])
+    daily_sentiment = load_daily_sentiment(frame['coin_id'].tolist(), date_from=news_from)
+    frame = add_news_features(frame, daily_sentiment, unique_stories)
+    return frame[columns].reset_index(drop=True)
@@ -0,0 +1,184 @@
+# subscriptions/sentiment_backends.py
+
+"""
+Бэкенды инференса моделей тональности на CPU
+
+  - torch:      исходная fp32 модель PyTorch
+  - int8:       динамическая int8-квантизация Linear-слоев (делается при загрузке)
+  - onnx:       экспортированная в ONNX модель под onnxruntime
+  - onnx_int8:  ONNX модель с динамической int8-квантизацией весов
+
+ONNX-файлы создаются командой `python manage.py export_sentiment_models`
+и лежат в ml/models/optimized/<model>/<version>/: после переобучения или смены
+текущей версии старый экспорт не подхватывается, нужен новый экспорт.
+onnxruntime - опциональная зависимость, нужна только для onnx-бэкендов.
+"""
+
+import io
+import json
+import types
+from datetime import datetime
+from pathlib import Path
+
+from .artifacts import atomic_directory
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+OPTIMIZED_MODELS_DIR = BASE_DIR / 'ml' / 'models' / 'optimized'
+
+BACKENDS = ['torch', 'int8', 'onnx', 'onnx_int8']
+
+ONNX_FP32_FILENAME = 'model.onnx'
+ONNX_INT8_FILENAME = 'model.int8.onnx'
+
+
+def optimized_dir(spec):
+    """Каталог экспорта конкретной версии модели (spec.version)"""
+    return OPTIMIZED_MODELS_DIR / spec.name / spec.version
+
+
+def artifact_path(spec, backend):
+    """Файлы на диске, из которых грузится локальная модель (None - модель из хаба)"""
+    if backend in ('torch', 'int8'):
+        return Path(spec.source) if spec.local else None
+    return optimized_dir(spec)
+
+
+class OnnxSequenceClassifier:
+    """
+    Обертка над onnxruntime-сессией с тем же интерфейсом, что у модели
+    transformers: model(**inputs).logits
+    """
+
+    def __init__(self, path):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(path), options, providers=['CPUExecutionProvider'])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.model_bytes = Path(path).stat().st_size
+
+    def eval(self):
+        return self
+
+    def __call__(self, **inputs):
+        import torch
+
+        feed = {
+            name: tensor.cpu().numpy().astype('int64')
+            for name, tensor in inputs.items()
+            if name in self.input_names
+        }
+        logits = self.session.run(['logits'], feed)[0]
+        return types.SimpleNamespace(logits=torch.from_numpy(logits))
+
+
+def model_bytes(model):
+    """Размер весов модели в байтах (для квантизованных - упакованные веса)"""
+    if hasattr(model, 'model_bytes'):
+        return model.model_bytes
+
+    import torch
+
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def load_backend(spec, backend):
+    """Загружает (model, tokenizer) модели spec для указанного бэкенда"""
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    if backend not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд '{backend}', доступны: {', '.join(BACKENDS)}")
+
+    if backend in ('torch', 'int8'):
+        if spec.local and not Path(spec.source).exists():
+            raise FileNotFoundError(f"Модель не найдена: {spec.source}")
+
+        tokenizer = AutoTokenizer.from_pretrained(spec.source)
+        model = AutoModelForSequenceClassification.from_pretrained(spec.source)
+        model.eval()
+
+        if backend == 'int8':
+            import torch
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        return model, tokenizer
+
+    model_dir = optimized_dir(spec)
+    filename = ONNX_INT8_FILENAME if backend == 'onnx_int8' else ONNX_FP32_FILENAME
+    model_path = model_dir / filename
+    if not model_path.exists():
+        raise FileNotFoundError(
+            f"ONNX модель версии {spec.version} не найдена: {model_path} "
+            f"(запустите python manage.py export_sentiment_models)"
+        )
+
+    tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+    return OnnxSequenceClassifier(model_path), tokenizer
+
+
+def export_onnx(spec, quantize=True, opset_version=17):
+    """
+    Экспортирует fp32 модель в ONNX (динамические batch и sequence оси),
+    опционально - int8-квантизованную копию. Возвращает пути к файлам.
+    Файлы пишутся во временный каталог и подменяют экспорт целиком:
+    перезагрузка по подписи каталога не видит наполовину записанный экспорт
+    """
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    if spec.local and not Path(spec.source).exists():
+        raise FileNotFoundError(f"Модель не найдена: {spec.source}")
+
+    tokenizer = AutoTokenizer.from_pretrained(spec.source)
+    model = AutoModelForSequenceClassification.from_pretrained(spec.source)
+    model.eval()
+
+    dummy = tokenizer(
+        ["Bitcoin price rallies after ETF approval.", "Exchange hack wipes out reserves"],
+        padding=True, truncation=True, max_length=spec.max_length, return_tensors='pt',
+    )
+    input_names = list(dummy.keys())
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['logits'] = {0: 'batch'}
+
+    final_dir = optimized_dir(spec)
+    with atomic_directory(final_dir) as out_dir:
+        fp32_path = out_dir / ONNX_FP32_FILENAME
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                (dict(dummy),),
+                str(fp32_path),
+                input_names=input_names,
+                output_names=['logits'],
+                dynamic_axes=dynamic_axes,
+                opset_version=opset_version,
+                dynamo=False,
+            )
+        tokenizer.save_pretrained(str(out_dir))
+
+        files = {'onnx': ONNX_FP32_FILENAME}
+
+        if quantize:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+
+            int8_path = out_dir / ONNX_INT8_FILENAME
+            quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+            files['onnx_int8'] = ONNX_INT8_FILENAME
+
+        with open(out_dir / 'export_meta.json', 'w') as f:
+            json.dump({
+                'model': spec.name,
+                'source': spec.source,
+                'version': spec.version,
+                'labels': spec.labels,
+                'max_length': spec.max_length,
+                'opset_version': opset_version,
+                'exported_at': datetime.now().isoformat(),
+                'files': files,
+            }, f, indent=2)
+
+    return {backend: str(final_dir / filename) for backend, filename in files.items()}
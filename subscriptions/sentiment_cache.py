@@ -0,0 +1,135 @@
+# subscriptions/sentiment_cache.py
+
+"""
+Мемоизация тональности по отпечатку текста
+
+Одна и та же синдицированная новость попадает в БД много раз: под разными
+URL, для разных монет и из разных запросов. Результат модели для текста
+сохраняется в SentimentCache по ключу (fingerprint, model_version), и копии
+берут готовую оценку вместо нового прогона модели.
+
+Если новость входит в кластер почти одинаковых историй (NewsStory), ключ -
+STORY_PREFIX + отпечаток кластера, а модель прогоняется один раз на кластер
+по тексту канонической новости. Ключи кластеров отделены от ключей точного
+текста: оценка кластера не выдается за оценку конкретного текста.
+"""
+
+from .models import SentimentCache, compute_news_fingerprint
+from .sentiment_inference import build_article_text
+
+# Ключи оценок кластеров (NewsStory) в SentimentCache
+STORY_PREFIX = 'story:'
+
+
+class CachedSentimentScorer:
+    """
+    Оценивает пачки новостей (строки sentiment_inference.ARTICLE_ROW_FIELDS):
+    сначала кэш, затем модель - по одному разу на каждый новый отпечаток.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.articles = 0
+        self.cache_hits = 0
+        self.inferred = 0
+
+    @property
+    def model_version(self):
+        """Версия текущей модели движка (после перезагрузки модели - новая)"""
+        return self.engine.spec.version
+
+    @staticmethod
+    def key(row):
+        """
+        (ключ кэша, текст для модели): для новости в кластере с канонической
+        новостью - ключ кластера и текст канонической новости, иначе - отпечаток
+        и текст самой новости
+        """
+        _, title, description, content_hash, story_fingerprint, canonical_title, canonical_description = row
+        if story_fingerprint and canonical_title is not None:
+            return STORY_PREFIX + story_fingerprint, build_article_text(canonical_title, canonical_description)
+        return content_hash or compute_news_fingerprint(title, description), build_article_text(title, description)
+
+    @classmethod
+    def fingerprint(cls, row):
+        return cls.key(row)[0]
+
+    def lookup(self, fingerprints):
+        """{fingerprint: result} для уже оцененных текстов (один запрос)"""
+        rows = SentimentCache.objects.filter(
+            model_version=self.model_version,
+            fingerprint__in=list(fingerprints),
+        ).values_list('fingerprint', 'sentiment_label', 'sentiment_score', 'confidence')
+        return {
+            fingerprint: {
+                'sentiment_label': label,
+                'sentiment_score': score,
+                'confidence': confidence,
+            }
+            for fingerprint, label, score, confidence in rows
+        }
+
+    def store(self, results):
+        """Сохраняет {fingerprint: result} в кэш"""
+        SentimentCache.objects.bulk_create(
+            [
+                SentimentCache(
+                    fingerprint=fingerprint,
+                    model_version=self.model_version,
+                    sentiment_label=result['sentiment_label'],
+                    sentiment_score=result['sentiment_score'],
+                    confidence=result['confidence'],
+                )
+                for fingerprint, result in results.items()
+            ],
+            ignore_conflicts=True,
+        )
+
+    def plan(self, chunk):
+        """
+        Отпечатки строк chunk, уже известные результаты и тексты, которые
+        нужно прогнать через модель (по одному на уникальный новый отпечаток)
+        """
+        keys = [self.key(row) for row in chunk]
+        fingerprints = [fingerprint for fingerprint, _ in keys]
+        known = self.lookup(set(fingerprints))
+
+        missing = {}
+        for fingerprint, text in keys:
+            if fingerprint not in known and fingerprint not in missing:
+                missing[fingerprint] = text
+
+        return fingerprints, known, missing
+
+    def resolve(self, fingerprints, known, fresh):
+        """Результаты для каждой строки (в порядке fingerprints) + учет статистики"""
+        known.update(fresh)
+        self.articles += len(fingerprints)
+        self.inferred += len(fresh)
+        self.cache_hits += len(fingerprints) - len(fresh)
+        return [known[fingerprint] for fingerprint in fingerprints]
+
+    def score(self, chunk):
+        """Результаты для каждой строки chunk (в том же порядке)"""
+        fingerprints, known, missing = self.plan(chunk)
+
+        fresh = {}
+        if missing:
+            predictions = self.engine.predict(list(missing.values()))
+            fresh = dict(zip(missing.keys(), predictions))
+            self.store(fresh)
+
+        return self.resolve(fingerprints, known, fresh)
+
+    @property
+    def hit_ratio(self):
+        return self.cache_hits / self.articles if self.articles else 0.0
+
+    def stats(self):
+        return {
+            'model_version': self.model_version,
+            'articles': self.articles,
+            'cache_hits': self.cache_hits,
+            'inferred': self.inferred,
+            'hit_ratio': round(self.hit_ratio, 4),
+        }
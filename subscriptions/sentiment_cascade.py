@@ -0,0 +1,127 @@
+# subscriptions/sentiment_cascade.py
+
+"""
+Каскад моделей тональности
+
+Сначала все новости оценивает легкая custom-модель (bert-tiny). Новости,
+где ее уверенность ниже SENTIMENT_CASCADE_THRESHOLD, переоцениваются
+FinBERT. Остальные получают оценку custom-модели, а в
+NewsSentiment.source_model записывается, какая модель ее дала.
+
+Оценки custom-модели переводятся в шкалу FinBERT (score_mode полной модели,
+P(positive) - P(negative)), иначе сводка и признаки усредняли бы числа
+в разных шкалах. Версия такой оценки - с суффиксом шкалы
+(custom_...@difference), в кэше она отдельно от обычных оценок custom-модели.
+
+Для контроля качества случайная выборка новостей, оставшихся за
+custom-моделью, перепроверяется FinBERT (результаты FinBERT при этом
+кэшируются и не пропадают).
+"""
+
+import random
+
+from django.conf import settings
+
+from .sentiment_cache import CachedSentimentScorer
+from .sentiment_client import make_engine
+from .sentiment_registry import registry
+
+
+class CascadeSentimentScorer:
+    """
+    Тот же интерфейс, что у CachedSentimentScorer: score(chunk) возвращает
+    результаты в порядке строк, дополнительно с ключом 'source_model'.
+    """
+
+    def __init__(self, threshold=None, audit_size=None, batch_size=None, max_batch_tokens=None,
+                 cheap_model='custom', full_model='finbert'):
+        self.threshold = settings.SENTIMENT_CASCADE_THRESHOLD if threshold is None else threshold
+        self.audit_size = settings.SENTIMENT_CASCADE_AUDIT_SIZE if audit_size is None else audit_size
+
+        self.cheap = CachedSentimentScorer(
+            make_engine(cheap_model, batch_size=batch_size, max_batch_tokens=max_batch_tokens,
+                        score_mode=registry.spec(full_model).score_mode)
+        )
+        self.full = CachedSentimentScorer(
+            make_engine(full_model, batch_size=batch_size, max_batch_tokens=max_batch_tokens)
+        )
+
+        self.articles = 0
+        self.accepted = 0
+        self.escalated = 0
+
+        # Резервуарная выборка принятых custom-моделью новостей для аудита
+        self._audit_rows = []
+        self._audit_labels = []
+        self._seen_accepted = 0
+        self._rng = random.Random(42)
+
+    def _sample_for_audit(self, row, result):
+        self._seen_accepted += 1
+        if len(self._audit_rows) < self.audit_size:
+            self._audit_rows.append(row)
+            self._audit_labels.append(result['sentiment_label'])
+            return
+        slot = self._rng.randrange(self._seen_accepted)
+        if slot < self.audit_size:
+            self._audit_rows[slot] = row
+            self._audit_labels[slot] = result['sentiment_label']
+
+    def score(self, chunk):
+        cheap_results = self.cheap.score(chunk)
+
+        uncertain = [
+            i for i, result in enumerate(cheap_results)
+            if result['confidence'] < self.threshold
+        ]
+        full_results = dict(zip(uncertain, self.full.score([chunk[i] for i in uncertain])))
+
+        results = []
+        for i, (row, cheap_result) in enumerate(zip(chunk, cheap_results)):
+            if i in full_results:
+                results.append({**full_results[i], 'source_model': self.full.model_version})
+            else:
+                self._sample_for_audit(row, cheap_result)
+                results.append({**cheap_result, 'source_model': self.cheap.model_version})
+
+        self.articles += len(chunk)
+        self.escalated += len(uncertain)
+        self.accepted += len(chunk) - len(uncertain)
+        return results
+
+    def audit(self):
+        """
+        Сравнивает выборку принятых custom-моделью новостей с FinBERT.
+        Возвращает согласие меток на выборке и оценку согласия всего
+        каскада с полным проходом FinBERT (эскалированные новости
+        совпадают с FinBERT по построению)
+        """
+        if not self._audit_rows:
+            return {'samples': 0, 'cheap_agreement': None, 'estimated_agreement': None}
+
+        full_results = self.full.score(self._audit_rows)
+        agree = sum(
+            1 for label, result in zip(self._audit_labels, full_results)
+            if label == result['sentiment_label']
+        )
+        cheap_agreement = agree / len(self._audit_rows)
+        estimated = (self.escalated + cheap_agreement * self.accepted) / self.articles
+
+        return {
+            'samples': len(self._audit_rows),
+            'cheap_agreement': round(cheap_agreement, 4),
+            'estimated_agreement': round(estimated, 4),
+        }
+
+    def stats(self):
+        return {
+            'threshold': self.threshold,
+            'articles': self.articles,
+            'cheap_model': self.cheap.model_version,
+            'full_model': self.full.model_version,
+            'accepted_cheap': self.accepted,
+            'escalated': self.escalated,
+            'escalation_ratio': round(self.escalated / self.articles, 4) if self.articles else 0.0,
+            'cheap_cache': self.cheap.stats(),
+            'full_cache': self.full.stats(),
+        }
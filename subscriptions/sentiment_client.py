@@ -0,0 +1,92 @@
+# subscriptions/sentiment_client.py
+
+"""
+Клиент сервера инференса тональности (см. sentiment_server.py)
+
+RemoteSentimentEngine повторяет интерфейс BatchedSentimentEngine
+(spec, predict, timing_summary), поэтому задачи тональности работают с ним
+так же, как с локальной моделью. make_engine выбирает удаленный движок,
+если задан SENTIMENT_SERVER_URL.
+"""
+
+import time
+
+import requests
+from django.conf import settings
+
+from .sentiment_inference import BatchedSentimentEngine
+from .sentiment_registry import registry
+
+
+class RemoteSentimentEngine:
+    """Инференс через HTTP на сервере тональности"""
+
+    def __init__(self, model_name, url=None, timeout=None, score_mode=None):
+        self.model_name = model_name
+        self.score_mode = score_mode
+        self.backend = 'remote'
+        self.url = (url or settings.SENTIMENT_SERVER_URL).rstrip('/')
+        self.timeout = timeout or settings.SENTIMENT_SERVER_TIMEOUT
+        self.session = requests.Session()
+        self.request_timings = []
+
+    @property
+    def spec(self):
+        """Текущая спецификация модели (после смены версии - новая, как и на сервере)"""
+        return registry.spec(self.model_name).with_score_mode(self.score_mode)
+
+    def predict(self, texts):
+        """Результаты (в исходном порядке texts) в формате analyze_with_finbert"""
+        if not texts:
+            return []
+
+        started = time.perf_counter()
+        response = self.session.post(
+            f"{self.url}/predict",
+            json={'model': self.model_name, 'texts': list(texts), 'score_mode': self.score_mode},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        payload = response.json()
+        seconds = time.perf_counter() - started
+
+        expected = self.spec.version
+        if payload['model_version'] != expected:
+            raise RuntimeError(
+                f"Сервер тональности отдал {payload['model_version']}, ожидалась {expected}"
+            )
+
+        self.request_timings.append({'size': len(texts), 'seconds': seconds})
+        return payload['results']
+
+    def timing_summary(self):
+        requests_count = len(self.request_timings)
+        texts = sum(t['size'] for t in self.request_timings)
+        seconds = sum(t['seconds'] for t in self.request_timings)
+        return {
+            'model': self.model_name,
+            'backend': self.backend,
+            'batches': requests_count,
+            'texts': texts,
+            'forward_seconds': round(seconds, 3),
+            'tokenize_seconds': 0.0,
+            'avg_batch_ms': round(seconds / requests_count * 1000, 1) if requests_count else 0.0,
+            'texts_per_second': round(texts / seconds, 1) if seconds else 0.0,
+        }
+
+
+def make_engine(model_name, batch_size=None, max_batch_tokens=None, score_mode=None):
+    """Движок тональности: сервер, если задан SENTIMENT_SERVER_URL, иначе локальная модель"""
+    if settings.SENTIMENT_SERVER_URL:
+        return RemoteSentimentEngine(model_name, score_mode=score_mode)
+    return BatchedSentimentEngine(
+        model_name, batch_size=batch_size, max_batch_tokens=max_batch_tokens, score_mode=score_mode,
+    )
+
+
+def fetch_server_metrics(url=None, timeout=5):
+    """Метрики сервера тональности (GET /metrics)"""
+    url = (url or settings.SENTIMENT_SERVER_URL).rstrip('/')
+    response = requests.get(f"{url}/metrics", timeout=timeout)
+    response.raise_for_status()
+    return response.json()
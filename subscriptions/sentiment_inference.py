@@ -0,0 +1,322 @@
+# subscriptions/sentiment_inference.py
+
+"""
+Батчевый инференс моделей тональности
+
+Тексты токенизируются без паддинга, сортируются по длине и режутся на пачки
+с ограничением по размеру пачки и по бюджету токенов (batch × max_len).
+Каждая пачка паддится только до своей самой длинной последовательности,
+поэтому короткие заголовки не гоняются через 512 токенов паддинга.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+
+from .sentiment_registry import registry
+
+logger = logging.getLogger(__name__)
+
+
+def build_article_text(title, description):
+    """Текст новости, который подается в модели тональности"""
+    return f"{title}. {description or ''}"
+
+
+def decode_probabilities(spec, probs):
+    """
+    Переводит вектор вероятностей (в порядке spec.labels) в результат
+    того же формата, что и analyze_with_finbert
+    """
+    by_label = dict(zip(spec.labels, probs))
+    max_idx = max(range(len(probs)), key=lambda i: probs[i])
+    sentiment_label = spec.labels[max_idx]
+    confidence = probs[max_idx]
+
+    if spec.score_mode == 'difference':
+        sentiment_score = by_label['positive'] - by_label['negative']
+    else:
+        sign = {'negative': -1, 'neutral': 0, 'positive': 1}[sentiment_label]
+        sentiment_score = sign * confidence
+
+    return {
+        'sentiment_score': sentiment_score,
+        'sentiment_label': sentiment_label,
+        'confidence': confidence,
+    }
+
+
+class BatchedSentimentEngine:
+    """
+    Батчевый инференс одной модели тональности.
+
+    batch_size       - максимум текстов в пачке
+    max_batch_tokens - максимум batch × seq_len в пачке (ограничивает память
+                       и время одного forward pass на длинных текстах)
+    backend          - бэкенд инференса (по умолчанию settings.SENTIMENT_BACKEND)
+    score_mode       - перевод вероятностей в score вместо spec.score_mode
+                       (версия получает суффикс шкалы, см. ModelSpec.with_score_mode)
+
+    Спецификация модели (spec) не запоминается: после перезагрузки модели
+    в реестре (новая версия) движок работает с новой версией
+    """
+
+    def __init__(self, model_name, batch_size=None, max_batch_tokens=None, max_length=None, backend=None,
+                 score_mode=None):
+        self.model_name = model_name
+        self.score_mode = score_mode
+        self.backend = backend or settings.SENTIMENT_BACKEND
+        self.batch_size = batch_size or settings.SENTIMENT_BATCH_SIZE
+        self.max_batch_tokens = max_batch_tokens or settings.SENTIMENT_MAX_BATCH_TOKENS
+        self._max_length = max_length
+        self.reset_timings()
+
+    @property
+    def spec(self):
+        """Текущая спецификация модели в реестре (со шкалой score_mode)"""
+        return registry.spec(self.model_name).with_score_mode(self.score_mode)
+
+    @property
+    def max_length(self):
+        return self._max_length or self.spec.max_length
+
+    def reset_timings(self):
+        # Счетчики по всем пачкам (движок живет весь процесс - без списка по пачкам)
+        self.batches = 0
+        self.texts = 0
+        self.forward_seconds = 0.0
+        self.tokenize_seconds = 0.0
+
+    def tokenize(self, texts, tokenizer=None):
+        """Токенизация без паддинга: список признаков на каждый текст"""
+        if tokenizer is None:
+            _, tokenizer = registry.get(self.model_name, self.backend)
+        encoded = tokenizer(list(texts), truncation=True, max_length=self.max_length)
+        keys = list(encoded.keys())
+        return [
+            {key: encoded[key][i] for key in keys}
+            for i in range(len(texts))
+        ]
+
+    def make_batches(self, features):
+        """
+        Группирует индексы текстов в пачки близкой длины.
+        Возвращает список списков индексов.
+        """
+        order = sorted(range(len(features)), key=lambda i: len(features[i]['input_ids']))
+
+        batches = []
+        current = []
+        current_max = 0
+        for idx in order:
+            length = len(features[idx]['input_ids'])
+            new_max = max(current_max, length)
+            too_many = len(current) >= self.batch_size
+            too_long = new_max * (len(current) + 1) > self.max_batch_tokens
+            if current and (too_many or too_long):
+                batches.append(current)
+                current = []
+                new_max = length
+            current.append(idx)
+            current_max = new_max
+
+        if current:
+            batches.append(current)
+        return batches
+
+    def run_batch(self, batch_features, entry=None):
+        """Forward pass по одной пачке, паддинг до самой длинной последовательности"""
+        import torch
+
+        entry = entry or registry.entry(self.model_name, self.backend)
+        model, tokenizer = entry.model, entry.tokenizer
+        inputs = tokenizer.pad(batch_features, padding='longest', return_tensors='pt')
+
+        with torch.no_grad():
+            outputs = model(**inputs)
+            probs = torch.nn.functional.softmax(outputs.logits, dim=-1)
+
+        return probs.tolist()
+
+    def predict(self, texts):
+        """Результаты (в исходном порядке texts) в формате analyze_with_finbert"""
+        return self.predict_versioned(texts)[1]
+
+    def predict_versioned(self, texts):
+        """(model_version модели, посчитавшей результаты, результаты как в predict)"""
+        spec, rows = self.infer(texts)
+        return spec.version, [decode_probabilities(spec, row) for row in rows]
+
+    def infer(self, texts):
+        """(spec модели, посчитавшей результаты, вероятности классов по текстам)"""
+        if not texts:
+            return self.spec, []
+
+        started = time.perf_counter()
+        features = self.tokenize(texts)
+        self.tokenize_seconds += time.perf_counter() - started
+
+        return self._infer(features)
+
+    def predict_features(self, features):
+        """Инференс по уже токенизированным текстам (см. tokenize)"""
+        spec, rows = self._infer(features)
+        return [decode_probabilities(spec, row) for row in rows]
+
+    def predict_proba(self, texts):
+        """Вероятности классов (в порядке spec.labels) для каждого текста"""
+        if not texts:
+            return []
+
+        started = time.perf_counter()
+        features = self.tokenize(texts)
+        self.tokenize_seconds += time.perf_counter() - started
+
+        return self.predict_proba_features(features)
+
+    def predict_proba_features(self, features):
+        return self._infer(features)[1]
+
+    def _infer(self, features):
+        """
+        (spec, вероятности по текстам): все пачки вызова идут через одну копию
+        модели, spec - спецификация, с которой она загружена
+        """
+        entry = registry.entry(self.model_name, self.backend)
+        results = [None] * len(features)
+        for batch in self.make_batches(features):
+            batch_features = [features[i] for i in batch]
+            seq_len = max(len(f['input_ids']) for f in batch_features)
+
+            started = time.perf_counter()
+            probs = self.run_batch(batch_features, entry)
+            seconds = time.perf_counter() - started
+
+            self.batches += 1
+            self.texts += len(batch)
+            self.forward_seconds += seconds
+            logger.debug(f"{self.model_name}: пачка {len(batch)} × {seq_len} токенов → {seconds * 1000:.0f} ms")
+
+            for idx, row in zip(batch, probs):
+                results[idx] = row
+
+        return entry.spec.with_score_mode(self.score_mode), results
+
+    def timing_summary(self):
+        """Сводка по всем пачкам, обработанным движком"""
+        batches, texts, forward = self.batches, self.texts, self.forward_seconds
+        return {
+            'model': self.model_name,
+            'backend': self.backend,
+            'batches': batches,
+            'texts': texts,
+            'forward_seconds': round(forward, 3),
+            'tokenize_seconds': round(self.tokenize_seconds, 3),
+            'avg_batch_ms': round(forward / batches * 1000, 1) if batches else 0.0,
+            'texts_per_second': round(texts / forward, 1) if forward else 0.0,
+        }
+
+
+# Поля строки новости, которые читают задачи тональности
+# (заголовок и описание канонической новости кластера - для оценки кластера по ее тексту)
+ARTICLE_ROW_FIELDS = (
+    'id', 'title', 'description', 'content_hash', 'story__fingerprint',
+    'story__canonical_article__title', 'story__canonical_article__description',
+)
+
+
+def iter_article_chunks(queryset, chunk_size=None):
+    """
+    Отдает строки ARTICLE_ROW_FIELDS новостей из queryset пачками.
+    Пагинация по id (keyset), поэтому запросы не деградируют с ростом таблицы.
+    """
+    chunk_size = chunk_size or settings.SENTIMENT_CHUNK_SIZE
+    last_id = 0
+    while True:
+        chunk = list(
+            queryset
+            .filter(id__gt=last_id)
+            .order_by('id')
+            .values_list(*ARTICLE_ROW_FIELDS)[:chunk_size]
+        )
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1][0]
+
+
+def iter_streamed_chunks(queryset, chunk_size=None):
+    """
+    Отдает строки ARTICLE_ROW_FIELDS пачками через серверный курсор
+    (.iterator(chunk_size=...)): один проход по результату запроса без
+    повторных выборок и без загрузки всей таблицы в память
+    """
+    chunk_size = chunk_size or settings.SENTIMENT_CHUNK_SIZE
+    rows = (
+        queryset
+        .order_by('id')
+        .values_list(*ARTICLE_ROW_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def compare_backends(model_name, texts, backend, reference_backend='torch'):
+    """
+    Сравнивает оптимизированный бэкенд с эталонным (fp32) на одних и тех же
+    текстах: согласие меток, расхождение score, скорость и размер весов.
+    RSS не сравнивается: обе модели грузятся в один процесс, и прирост RSS
+    второй модели включает аллокации первой
+    """
+    results = {}
+    for name in (reference_backend, backend):
+        engine = BatchedSentimentEngine(model_name, backend=name)
+        engine.predict(texts[:8])  # прогрев: загрузка модели и первые аллокации
+        engine.reset_timings()
+
+        started = time.perf_counter()
+        predictions = engine.predict(texts)
+        seconds = time.perf_counter() - started
+
+        entry = registry.entry_stats(model_name, name)
+        results[name] = {
+            'predictions': predictions,
+            'seconds': seconds,
+            'param_mb': entry['param_mb'] if entry else None,
+        }
+
+    reference = results[reference_backend]['predictions']
+    candidate = results[backend]['predictions']
+    agree = sum(
+        1 for r, c in zip(reference, candidate)
+        if r['sentiment_label'] == c['sentiment_label']
+    )
+    score_diffs = [
+        abs(r['sentiment_score'] - c['sentiment_score'])
+        for r, c in zip(reference, candidate)
+    ]
+    reference_seconds = results[reference_backend]['seconds']
+    candidate_seconds = results[backend]['seconds']
+
+    return {
+        'model': model_name,
+        'backend': backend,
+        'reference_backend': reference_backend,
+        'samples': len(texts),
+        'label_agreement': agree / len(texts) if texts else 1.0,
+        'mean_score_diff': sum(score_diffs) / len(score_diffs) if score_diffs else 0.0,
+        'max_score_diff': max(score_diffs) if score_diffs else 0.0,
+        'reference_seconds': reference_seconds,
+        'backend_seconds': candidate_seconds,
+        'speedup': reference_seconds / candidate_seconds if candidate_seconds else None,
+        'reference_param_mb': results[reference_backend]['param_mb'],
+        'backend_param_mb': results[backend]['param_mb'],
+    }
@@ -0,0 +1,378 @@
+# subscriptions/sentiment_pipeline.py
+
+"""
+Конвейерный (producer/consumer) прогон тональности
+
+Шаги обработки пачки новостей выполняются параллельно на разных пачках:
+
+  reader   (поток)      чтение из БД через .iterator(chunk_size=...) + поиск в кэше
+  tokenize (пул потоков) токенизация новых текстов
+  infer    (главный)    forward pass модели
+  writer   (поток)      запись результатов и кэша пачками (bulk_create)
+
+Между шагами - ограниченные очереди: если какой-то шаг отстает, предыдущие
+блокируются на put (backpressure), а память не растет. Для каждого шага
+считается доля времени в работе (occupancy); самый занятый шаг -
+узкое место.
+"""
+
+import copy
+import queue
+from collections import deque
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+
+from .sentiment_inference import iter_streamed_chunks
+from .sentiment_registry import registry
+
+_DONE = object()
+
+
+class _PipelineAborted(Exception):
+    pass
+
+
+class StageStats:
+    """Время шага: в работе, в ожидании входа, в ожидании места на выходе"""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.wait_input = 0.0
+        self.wait_output = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, field, value):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + value)
+
+    def as_dict(self, wall, workers=1):
+        capacity = wall * workers
+        return {
+            'items': self.items,
+            'busy_seconds': round(self.busy, 3),
+            'wait_input_seconds': round(self.wait_input, 3),
+            'wait_output_seconds': round(self.wait_output, 3),
+            'occupancy': round(self.busy / capacity, 3) if capacity else 0.0,
+        }
+
+
+class PipelinedSentimentRunner:
+    """
+    Конвейерный прогон CachedSentimentScorer по queryset новостей.
+
+    write_rows(chunk, results) вызывается в потоке writer для каждой пачки
+    (результаты в порядке строк chunk).
+    """
+
+    def __init__(self, scorer, write_rows, chunk_size=None, tokenize_workers=None, queue_size=None):
+        self.scorer = scorer
+        self.engine = scorer.engine
+        self.write_rows = write_rows
+        self.chunk_size = chunk_size or settings.SENTIMENT_CHUNK_SIZE
+        self.tokenize_workers = tokenize_workers or settings.SENTIMENT_PIPELINE_TOKENIZE_WORKERS
+        self.queue_size = queue_size or settings.SENTIMENT_PIPELINE_QUEUE_SIZE
+
+        # Удаленный движок (сервер тональности) сам токенизирует тексты
+        self.local_tokenize = hasattr(self.engine, 'predict_features')
+
+        self.stages = {name: StageStats(name) for name in ('reader', 'tokenize', 'infer', 'writer')}
+        self.processed = 0
+        self.errors = 0
+        self.wall_seconds = 0.0
+
+        # Отпечатки в полете: кэш в БД пополняется writer'ом позже, чем reader
+        # ищет следующие пачки, поэтому повторы между пачками отслеживаются здесь.
+        # Записанные в кэш отпечатки удаляются, как только reader начал пачку
+        # после записи (она найдет их в кэше) - размер ограничен пачками в очередях
+        self._dispatched = set()
+        self._computed = {}
+        self._stored = deque()  # (номер первой пачки, которая увидит запись, отпечатки)
+        self._planned = 0
+        self._inflight_lock = threading.Lock()
+
+        self._stop = threading.Event()
+        self._errors_lock = threading.Lock()
+        self._failure = None
+        self._tokenizers = threading.local()
+
+    # ---------- очереди с учетом ожидания и остановки ----------
+
+    def _put(self, q, item, stage):
+        started = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self.stages[stage].add('wait_output', time.perf_counter() - started)
+        if self._stop.is_set():
+            raise _PipelineAborted()
+
+    def _get(self, q, stage):
+        started = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                item = q.get(timeout=0.1)
+                break
+            except queue.Empty:
+                continue
+        else:
+            raise _PipelineAborted()
+        self.stages[stage].add('wait_input', time.perf_counter() - started)
+        return item
+
+    def _count_errors(self, count):
+        with self._errors_lock:
+            self.errors += count
+
+    def _release(self, fingerprints):
+        """Отпечатки больше не в полете: их найдет поиск в кэше или их нужно посчитать заново"""
+        with self._inflight_lock:
+            self._dispatched.difference_update(fingerprints)
+            for fingerprint in fingerprints:
+                self._computed.pop(fingerprint, None)
+
+    def _release_stored(self, seq):
+        """Освобождает отпечатки, записанные в кэш до начала пачки seq"""
+        while self._stored and self._stored[0][0] <= seq:
+            self._release(self._stored.popleft()[1])
+
+    def _fail(self, error):
+        if self._failure is None:
+            self._failure = error
+        self._stop.set()
+
+    # ---------- шаги ----------
+
+    def _reader(self, queryset, out_q):
+        stats = self.stages['reader']
+        try:
+            rows = iter_streamed_chunks(queryset, self.chunk_size)
+            while True:
+                started = time.perf_counter()
+                chunk = next(rows, None)
+                if chunk is None:
+                    stats.add('busy', time.perf_counter() - started)
+                    break
+                seq = self._planned
+                self._planned += 1
+                plan = self.scorer.plan(chunk)
+                stats.add('busy', time.perf_counter() - started)
+                stats.add('items', 1)
+                self._put(out_q, (seq, chunk, plan), 'reader')
+            self._put(out_q, _DONE, 'reader')
+        except _PipelineAborted:
+            pass
+        except Exception as e:
+            self._fail(e)
+        finally:
+            connection.close()
+
+    def _thread_tokenizer(self):
+        """
+        Своя копия токенизатора на поток: fast-токенизаторы не потокобезопасны.
+        После перезагрузки модели в реестре копия снимается заново
+        """
+        _, shared = registry.get(self.engine.model_name, self.engine.backend)
+        if getattr(self._tokenizers, 'source', None) is not shared:
+            self._tokenizers.tokenizer = copy.deepcopy(shared)
+            self._tokenizers.source = shared
+        return self._tokenizers.tokenizer
+
+    def _tokenize(self, texts):
+        started = time.perf_counter()
+        features = self.engine.tokenize(texts, tokenizer=self._thread_tokenizer())
+        self.stages['tokenize'].add('busy', time.perf_counter() - started)
+        self.stages['tokenize'].add('items', 1)
+        return features
+
+    def _dispatcher(self, in_q, out_q, pool):
+        """Отдает пачки в пул токенизации, сохраняя порядок (очередь future)"""
+        try:
+            while True:
+                item = self._get(in_q, 'tokenize')
+                if item is _DONE:
+                    break
+                seq, chunk, (fingerprints, known, missing) = item
+                self._release_stored(seq)
+                with self._inflight_lock:
+                    reused = [fp for fp in missing if fp in self._dispatched]
+                    missing = {fp: text for fp, text in missing.items() if fp not in self._dispatched}
+                    self._dispatched.update(missing)
+
+                texts = list(missing.values())
+                if texts and self.local_tokenize:
+                    future = pool.submit(self._tokenize, texts)
+                else:
+                    future = None
+                self._put(out_q, (chunk, fingerprints, known, missing, reused, future), 'tokenize')
+            self._put(out_q, _DONE, 'tokenize')
+        except _PipelineAborted:
+            pass
+        except Exception as e:
+            self._fail(e)
+
+    def _writer(self, in_q):
+        stats = self.stages['writer']
+        try:
+            while True:
+                item = self._get(in_q, 'writer')
+                if item is _DONE:
+                    break
+                chunk, results, fresh = item
+                started = time.perf_counter()
+                stored = False
+                try:
+                    if fresh:
+                        self.scorer.store(fresh)
+                        stored = True
+                        # Пачки, которые reader начнет после этого, найдут отпечатки в кэше
+                        self._stored.append((self._planned, list(fresh)))
+                    self.write_rows(chunk, results)
+                    self.processed += len(chunk)
+                except Exception as e:
+                    print(f"❌ Ошибка записи пачки {chunk[0][0]}..{chunk[-1][0]}: {e}")
+                    self._count_errors(len(chunk))
+                    if not stored:
+                        # Не попали в кэш - следующие пачки посчитают их заново
+                        self._release(fresh)
+                stats.add('busy', time.perf_counter() - started)
+                stats.add('items', 1)
+        except _PipelineAborted:
+            pass
+        except Exception as e:
+            self._fail(e)
+        finally:
+            connection.close()
+
+    def _infer(self, in_q, out_q):
+        stats = self.stages['infer']
+        while True:
+            item = self._get(in_q, 'infer')
+            if item is _DONE:
+                break
+            chunk, fingerprints, known, missing, reused, future = item
+
+            fresh = {}
+            if missing:
+                started = time.perf_counter()
+                try:
+                    # Ожидание токенизации считается ожиданием входа шага infer
+                    features = future.result() if future is not None else None
+                    stats.add('wait_input', time.perf_counter() - started)
+
+                    started = time.perf_counter()
+                    if features is not None:
+                        predictions = self.engine.predict_features(features)
+                    else:
+                        predictions = self.engine.predict(list(missing.values()))
+                except Exception as e:
+                    print(f"❌ Ошибка инференса пачки {chunk[0][0]}..{chunk[-1][0]}: {e}")
+                    # Следующие пачки с этими текстами отправят их в модель заново
+                    self._release(missing)
+                else:
+                    fresh = dict(zip(missing.keys(), predictions))
+                    with self._inflight_lock:
+                        self._computed.update(fresh)
+                stats.add('busy', time.perf_counter() - started)
+
+            # Тексты, посчитанные в предыдущих пачках этого прогона: еще в полете
+            # или уже записанные writer'ом в кэш
+            if reused:
+                with self._inflight_lock:
+                    known.update((fp, self._computed[fp]) for fp in reused if fp in self._computed)
+                stored = [fp for fp in reused if fp not in known]
+                if stored:
+                    known.update(self.scorer.lookup(stored))
+
+            # Ошибки - только строки, чей текст модель не посчитала; остальные пишутся
+            rows = [(row, fp) for row, fp in zip(chunk, fingerprints) if fp in known or fp in fresh]
+            if len(rows) < len(chunk):
+                self._count_errors(len(chunk) - len(rows))
+            if not rows:
+                continue
+            chunk = [row for row, _ in rows]
+            results = self.scorer.resolve([fp for _, fp in rows], known, fresh)
+            stats.add('items', 1)
+            self._put(out_q, (chunk, results, fresh), 'infer')
+
+        self._put(out_q, _DONE, 'infer')
+
+    # ---------- запуск ----------
+
+    def run(self, queryset):
+        """Прогоняет queryset через конвейер, возвращает отчет"""
+        read_q = queue.Queue(maxsize=self.queue_size)
+        tokenized_q = queue.Queue(maxsize=self.queue_size)
+        write_q = queue.Queue(maxsize=self.queue_size)
+
+        if self.local_tokenize:
+            # Модель и токенизатор загружаются до старта потоков
+            registry.get(self.engine.model_name, self.engine.backend)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.tokenize_workers, thread_name_prefix='sentiment-tokenize') as pool:
+            threads = [
+                threading.Thread(target=self._reader, args=(queryset, read_q), name='sentiment-reader'),
+                threading.Thread(target=self._dispatcher, args=(read_q, tokenized_q, pool), name='sentiment-dispatch'),
+                threading.Thread(target=self._writer, args=(write_q,), name='sentiment-writer'),
+            ]
+            for thread in threads:
+                thread.start()
+
+            try:
+                self._infer(tokenized_q, write_q)
+            except _PipelineAborted:
+                pass
+            except Exception as e:
+                self._fail(e)
+            finally:
+                if self._failure is not None:
+                    self._stop.set()
+                for thread in threads:
+                    thread.join()
+
+        self.wall_seconds = time.perf_counter() - started
+
+        if self._failure is not None:
+            raise self._failure
+
+        return self.report()
+
+    def report(self):
+        wall = self.wall_seconds
+        stages = {
+            name: stats.as_dict(wall, self.tokenize_workers if name == 'tokenize' else 1)
+            for name, stats in self.stages.items()
+        }
+        bottleneck = max(stages, key=lambda name: stages[name]['occupancy']) if wall else None
+        return {
+            'processed': self.processed,
+            'errors': self.errors,
+            'wall_seconds': round(wall, 3),
+            'articles_per_second': round(self.processed / wall, 1) if wall else 0.0,
+            'stages': stages,
+            'bottleneck': bottleneck,
+            'cache': self.scorer.stats(),
+        }
+
+
+def format_pipeline_report(report):
+    """Строки отчета о загрузке шагов конвейера для вывода в лог"""
+    lines = [
+        f"   Конвейер: {report['processed']} новостей за {report['wall_seconds']}s "
+        f"({report['articles_per_second']} новостей/с), узкое место: {report['bottleneck']}"
+    ]
+    for name, stage in report['stages'].items():
+        lines.append(
+            f"     {name:<9} занят {stage['occupancy']*100:5.1f}%  "
+            f"ждал вход {stage['wait_input_seconds']:.2f}s  выход {stage['wait_output_seconds']:.2f}s"
+        )
+    return lines
@@ -0,0 +1,310 @@
+# subscriptions/sentiment_registry.py
+
+"""
+Реестр моделей тональности
+
+Каждая модель (FinBERT, custom DistilBERT) загружается один раз на процесс
+и дальше переиспользуется всеми задачами. В воркерах Celery модели
+прогреваются по сигналу worker_process_init (см. core/celery.py).
+
+Бэкенд инференса (fp32 torch, int8, ONNX) выбирается настройкой
+SENTIMENT_BACKEND, см. sentiment_backends.py.
+
+Для каждой модели реестр хранит время загрузки, занимаемую память
+и количество обращений.
+
+Локальные модели перечитываются, когда их файлы на диске меняются
+(переобучение custom модели, новая текущая версия дистиллированной):
+при каждом get() сверяется подпись файлов (artifacts.signature),
+старая копия работает, пока новая не загрузится. Версия модели
+(model_version в таблицах) берется из самого артефакта: model_version.json
+custom модели, current.json дистиллированной.
+"""
+
+import json
+import os
+import resource
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+from .artifacts import cache as artifact_cache, signature, version_id
+from .sentiment_backends import artifact_path, load_backend, model_bytes
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+ML_MODELS_DIR = BASE_DIR / 'ml' / 'models'
+
+FINBERT_MODEL_NAME = 'ProsusAI/finbert'
+CUSTOM_MODEL_PATH = ML_MODELS_DIR / 'crypto_sentiment'
+# Версия custom модели, которую пишет ml/train_crypto_sentiment.py вместе с весами
+CUSTOM_VERSION_FILE = CUSTOM_MODEL_PATH / 'model_version.json'
+# Дистиллированные из FinBERT модели: <версия>/ + current.json с версией,
+# прошедшей проверку качества (см. ml/train_crypto_sentiment.py --distill)
+DISTILLED_MODELS_DIR = ML_MODELS_DIR / 'crypto_sentiment_distilled'
+DISTILLED_CURRENT_FILE = DISTILLED_MODELS_DIR / 'current.json'
+
+
+class ModelSpec:
+    """
+    Описание модели: откуда грузить, версия (model_version в таблицах),
+    в каком порядке идут классы на выходе, максимальная длина входа
+    и способ перевода вероятностей в score [-1, 1]:
+      - 'difference':        P(positive) - P(negative)
+      - 'signed_confidence': ±confidence предсказанного класса (0 для neutral)
+    """
+
+    def __init__(self, name, source, version, labels, max_length, score_mode, local=False):
+        self.name = name
+        self.source = source
+        self.version = version
+        self.labels = labels
+        self.max_length = max_length
+        self.score_mode = score_mode
+        self.local = local
+
+    def with_score_mode(self, score_mode):
+        """
+        Та же модель с другим переводом вероятностей в score (None - без изменений).
+        К версии добавляется шкала: оценки в разных шкалах не смешиваются
+        в SentimentCache и NewsSentiment
+        """
+        if score_mode is None or score_mode == self.score_mode:
+            return self
+        return ModelSpec(
+            self.name, self.source, f'{self.version}@{score_mode}', self.labels,
+            self.max_length, score_mode, local=self.local,
+        )
+
+
+MODEL_SPECS = {
+    # FinBERT classes: positive, negative, neutral
+    'finbert': ModelSpec(
+        'finbert', FINBERT_MODEL_NAME, 'finbert', ['positive', 'negative', 'neutral'],
+        max_length=512, score_mode='difference',
+    ),
+}
+
+
+def _custom_spec_from_dir(model_dir):
+    """
+    Версия - из model_version.json; модель, сохраненная без него
+    (до версионирования), получает версию по подписи файлов каталога
+    """
+    version_file = Path(model_dir) / CUSTOM_VERSION_FILE.name
+    if version_file.exists():
+        with open(version_file) as f:
+            return _custom_spec(json.load(f)['version'])
+    return _custom_spec(f'custom_{version_id(signature(model_dir))}')
+
+
+def custom_model_spec():
+    """
+    Спецификация обученной custom модели: версия меняется с каждым
+    переобучением, и оценки разных обучений не смешиваются
+    """
+    if CUSTOM_MODEL_PATH.exists():
+        return _custom_spec_from_dir(CUSTOM_MODEL_PATH)
+    return _custom_spec('custom_none')
+
+
+def _custom_spec(version):
+    # Custom модель обучена с label_map negative=0, neutral=1, positive=2
+    return ModelSpec(
+        'custom', str(CUSTOM_MODEL_PATH), version, ['negative', 'neutral', 'positive'],
+        max_length=128, score_mode='signed_confidence', local=True,
+    )
+
+
+def _distilled_spec_from_file(current_file):
+    with open(current_file) as f:
+        version = json.load(f)['version']
+    return _distilled_spec(version)
+
+
+def distilled_model_spec():
+    """
+    Спецификация текущей дистиллированной модели. Ученик повторяет
+    распределение FinBERT, поэтому score считается так же, как у FinBERT
+    """
+    if DISTILLED_CURRENT_FILE.exists():
+        return _distilled_spec_from_file(DISTILLED_CURRENT_FILE)
+    return _distilled_spec('distilled_none')
+
+
+def _distilled_spec(version):
+    path = DISTILLED_MODELS_DIR / version
+    return ModelSpec(
+        'distilled', str(path), version, ['negative', 'neutral', 'positive'],
+        max_length=128, score_mode='difference', local=True,
+    )
+
+
+MODEL_SPECS['custom'] = custom_model_spec()
+MODEL_SPECS['distilled'] = distilled_model_spec()
+
+
+def _current_rss_bytes():
+    """Текущий RSS процесса (на Linux из /proc, иначе пиковый ru_maxrss)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class LoadedModel:
+    """Загруженная модель + статистика использования"""
+
+    def __init__(self, spec, backend, model, tokenizer, load_seconds, param_bytes, rss_delta_bytes, sig=None):
+        self.spec = spec
+        self.backend = backend
+        self.model = model
+        self.tokenizer = tokenizer
+        self.load_seconds = load_seconds
+        self.param_bytes = param_bytes
+        self.rss_delta_bytes = rss_delta_bytes
+        self.loaded_at = time.time()
+        self.hits = 0
+        self.signature = sig
+        self.version = version_id(sig)
+        self.failed_signature = None
+
+    def stats(self):
+        return {
+            'source': self.spec.source,
+            'backend': self.backend,
+            'version': self.version,
+            'load_seconds': round(self.load_seconds, 3),
+            'param_mb': round(self.param_bytes / 1024 ** 2, 1),
+            'rss_delta_mb': round(self.rss_delta_bytes / 1024 ** 2, 1),
+            'hits': self.hits,
+            'loaded_at': self.loaded_at,
+        }
+
+
+class SentimentModelRegistry:
+    """
+    Процессный кэш моделей тональности.
+    Загрузка каждой модели происходит один раз, последующие get() - из памяти.
+    """
+
+    def __init__(self, specs):
+        self._specs = dict(specs)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def spec(self, name):
+        if name not in self._specs:
+            raise KeyError(f"Неизвестная модель тональности: {name}")
+        if name == 'distilled' and DISTILLED_CURRENT_FILE.exists():
+            # Новая текущая версия (current.json) - новая спецификация
+            current = artifact_cache.get(DISTILLED_CURRENT_FILE, _distilled_spec_from_file)
+            if current.version != self._specs[name].version:
+                self.register(current)
+        if name == 'custom' and CUSTOM_MODEL_PATH.exists():
+            # Переобученная модель (новые файлы в каталоге) - новая версия
+            current = artifact_cache.get(CUSTOM_MODEL_PATH, _custom_spec_from_dir)
+            if current.version != self._specs[name].version:
+                self.register(current)
+        return self._specs[name]
+
+    def register(self, spec):
+        """Добавляет или заменяет спецификацию модели (загруженные копии сбрасываются)"""
+        with self._lock:
+            self._specs[spec.name] = spec
+            for key in [key for key in self._entries if key[0] == spec.name]:
+                del self._entries[key]
+
+    def get(self, name, backend=None):
+        """
+        Возвращает (model, tokenizer), загружая модель при первом обращении.
+        backend по умолчанию - settings.SENTIMENT_BACKEND
+        """
+        entry = self.entry(name, backend)
+        return entry.model, entry.tokenizer
+
+    def entry(self, name, backend=None):
+        """
+        Текущая загруженная копия модели (LoadedModel): model, tokenizer и spec,
+        с которой она загружена. После перезагрузки (новая версия) - новая копия
+        """
+        key = (name, backend or settings.SENTIMENT_BACKEND)
+        spec = self.spec(name)
+        path = artifact_path(spec, key[1])
+        sig = signature(path) if path is not None else None
+
+        entry = self._entries.get(key)
+        if entry is None or sig not in (entry.signature, entry.failed_signature):
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is None or sig not in (entry.signature, entry.failed_signature):
+                    entry = self._reload(spec, key[1], entry, path, sig)
+                    self._entries[key] = entry
+        entry.hits += 1
+        return entry
+
+    def _reload(self, spec, backend, previous, path, sig):
+        """Загрузка (или перезагрузка после изменения файлов) модели"""
+        try:
+            entry = self._load(spec, backend, sig)
+        except Exception as e:
+            if previous is None:
+                raise
+            print(f"⚠️ Новая версия модели '{spec.name}' не загружена ({e}), остается {previous.version}")
+            previous.failed_signature = sig
+            return previous
+
+        if path is not None:
+            artifact_cache.record(path, sig, entry.load_seconds)
+        if previous is not None:
+            print(f"🔄 Модель '{spec.name}' [{backend}]: версия {previous.version} → {entry.version}")
+        return entry
+
+    def _load(self, spec, backend, sig=None):
+        print(f"🔧 Загружаю модель тональности '{spec.name}' [{backend}] ({spec.source})...")
+        rss_before = _current_rss_bytes()
+        started = time.perf_counter()
+
+        model, tokenizer = load_backend(spec, backend)
+
+        load_seconds = time.perf_counter() - started
+        rss_delta = max(_current_rss_bytes() - rss_before, 0)
+        param_bytes = model_bytes(model)
+
+        print(f"✅ Модель '{spec.name}' [{backend}] загружена за {load_seconds:.1f}s "
+              f"({param_bytes / 1024 ** 2:.0f} MB весов)")
+        return LoadedModel(spec, backend, model, tokenizer, load_seconds, param_bytes, rss_delta, sig)
+
+    def warmup(self, names):
+        """Предзагрузка моделей (ошибки не роняют процесс воркера)"""
+        for name in names:
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"⚠️ Не удалось прогреть модель '{name}': {e}")
+
+    def is_loaded(self, name, backend=None):
+        return (name, backend or settings.SENTIMENT_BACKEND) in self._entries
+
+    def entry_stats(self, name, backend=None):
+        entry = self._entries.get((name, backend or settings.SENTIMENT_BACKEND))
+        return entry.stats() if entry else None
+
+    def stats(self):
+        return {
+            'pid': os.getpid(),
+            'rss_mb': round(_current_rss_bytes() / 1024 ** 2, 1),
+            'models': {
+                f"{name}:{backend}": entry.stats()
+                for (name, backend), entry in self._entries.items()
+            },
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+registry = SentimentModelRegistry(MODEL_SPECS)
@@ -0,0 +1,192 @@
+# subscriptions/sentiment_rollup.py
+
+"""
+Дневная сводка тональности по монетам (CoinDailySentiment)
+
+Признаки классификатора считаются по окнам в несколько дней, поэтому
+вместо сырых NewsArticle + NewsSentiment они читают готовые суммы по
+(монета, день): количество новостей, сумму оценок, число позитивных и
+негативных, число уникальных историй.
+
+Сводка обновляется инкрементально: после записи новых оценок
+пересчитываются только затронутые дни (refresh_for_articles), одним
+агрегирующим запросом по новостям этих дней. Пересчет дня целиком (а не
+прибавление дельты) делает обновление идемпотентным: повторный или
+параллельный запуск дает тот же результат.
+
+Полная перестройка - python manage.py rebuild_sentiment_rollup
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, FilteredRelation, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import CoinDailySentiment, NewsArticle, PriceEvent
+
+# Сводка по основной таблице NewsSentiment (какой бы моделью ни была дана оценка)
+PRIMARY_ROLLUP_VERSION = 'primary'
+
+POSITIVE_THRESHOLD = 0.05
+NEGATIVE_THRESHOLD = -0.05
+
+ROLLUP_FIELDS = [
+    'article_count', 'scored_count', 'sentiment_sum',
+    'positive_count', 'negative_count', 'story_count',
+]
+
+
+def _scored_articles(model_version):
+    """NewsArticle с аннотацией score - оценкой модели model_version (или NULL)"""
+    if model_version == PRIMARY_ROLLUP_VERSION:
+        return NewsArticle.objects.annotate(score=F('newssentiment__sentiment_score'))
+
+    return NewsArticle.objects.annotate(
+        custom=FilteredRelation('custom_sentiments', condition=Q(custom_sentiments__model_version=model_version))
+    ).annotate(score=F('custom__sentiment_score'))
+
+
+def _local_day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def aggregate_days(model_version, coin_ids=None, date_from=None, date_to=None, condition=None):
+    """
+    Суммы по (coin_id, день) одним GROUP BY запросом.
+    Фильтр по published_at - диапазон, а не published_at__date, чтобы
+    работал индекс. condition - дополнительный Q по новостям
+    """
+    qs = _scored_articles(model_version)
+    if condition is not None:
+        qs = qs.filter(condition)
+    if coin_ids is not None:
+        qs = qs.filter(coin_id__in=list(coin_ids))
+    if date_from is not None:
+        qs = qs.filter(published_at__gte=_local_day_start(date_from))
+    if date_to is not None:
+        qs = qs.filter(published_at__lt=_local_day_start(date_to + timedelta(days=1)))
+
+    return (
+        qs.annotate(day=TruncDate('published_at'))
+        .order_by()
+        .values('coin_id', 'day')
+        .annotate(
+            article_count=Count('id'),
+            scored_count=Count('score'),
+            sentiment_sum=Coalesce(Sum('score'), Value(0.0)),
+            positive_count=Count('id', filter=Q(score__gt=POSITIVE_THRESHOLD)),
+            negative_count=Count('id', filter=Q(score__lt=NEGATIVE_THRESHOLD)),
+            # Новость без истории - сама себе история
+            story_count=Count('story_id', distinct=True) + Count('id', filter=Q(story__isnull=True)),
+        )
+    )
+
+
+def _upsert(model_version, rows):
+    CoinDailySentiment.objects.bulk_create(
+        [
+            CoinDailySentiment(
+                coin_id=row['coin_id'],
+                date=row['day'],
+                model_version=model_version,
+                **{field: row[field] for field in ROLLUP_FIELDS},
+            )
+            for row in rows
+        ],
+        update_conflicts=True,
+        unique_fields=['coin', 'date', 'model_version'],
+        update_fields=ROLLUP_FIELDS + ['updated_at'],
+        batch_size=1000,
+    )
+
+
+def _days_filter(days):
+    """Q: новости монеты за конкретный день (диапазон published_at) для каждой пары"""
+    condition = Q()
+    for coin_id, day in days:
+        condition |= Q(
+            coin_id=coin_id,
+            published_at__gte=_local_day_start(day),
+            published_at__lt=_local_day_start(day + timedelta(days=1)),
+        )
+    return condition
+
+
+def refresh_days(days, model_version=PRIMARY_ROLLUP_VERSION, batch_size=200):
+    """
+    Пересчитывает сводку для набора (coin_id, date).
+    Дни, в которых новостей не осталось, удаляются из сводки
+    """
+    days = sorted(set(days))
+    refreshed = 0
+
+    for start in range(0, len(days), batch_size):
+        batch = days[start:start + batch_size]
+        rows = list(aggregate_days(model_version, condition=_days_filter(batch)))
+
+        with transaction.atomic():
+            _upsert(model_version, rows)
+
+            empty = set(batch) - {(row['coin_id'], row['day']) for row in rows}
+            if empty:
+                stale = Q()
+                for coin_id, day in empty:
+                    stale |= Q(coin_id=coin_id, date=day)
+                CoinDailySentiment.objects.filter(stale, model_version=model_version).delete()
+
+        if model_version == PRIMARY_ROLLUP_VERSION:
+            sync_price_event_news_counts(batch)
+        refreshed += len(rows)
+
+    return refreshed
+
+
+def refresh_for_articles(article_ids, model_version=PRIMARY_ROLLUP_VERSION):
+    """Пересчитывает дни, в которые опубликованы новости article_ids"""
+    days = (
+        NewsArticle.objects
+        .filter(id__in=list(article_ids))
+        .annotate(day=TruncDate('published_at'))
+        .order_by()
+        .values_list('coin_id', 'day')
+        .distinct()
+    )
+    return refresh_days(days, model_version)
+
+
+def rebuild(model_version=PRIMARY_ROLLUP_VERSION, coin_ids=None):
+    """Полная перестройка сводки (для всех монет или coin_ids)"""
+    rows = list(aggregate_days(model_version, coin_ids=coin_ids))
+
+    with transaction.atomic():
+        existing = CoinDailySentiment.objects.filter(model_version=model_version)
+        if coin_ids is not None:
+            existing = existing.filter(coin_id__in=list(coin_ids))
+        existing.delete()
+        _upsert(model_version, rows)
+
+    if model_version == PRIMARY_ROLLUP_VERSION:
+        sync_price_event_news_counts()
+
+    return len(rows)
+
+
+def sync_price_event_news_counts(days=None):
+    """PriceEvent.news_count = число новостей монеты за день события (из сводки)"""
+    events = PriceEvent.objects.all()
+    if days is not None:
+        condition = Q()
+        for coin_id, day in days:
+            condition |= Q(coin_id=coin_id, date=day)
+        if not condition:
+            return 0
+        events = events.filter(condition)
+
+    news_count = (
+        CoinDailySentiment.objects
+        .filter(coin_id=OuterRef('coin_id'), date=OuterRef('date'), model_version=PRIMARY_ROLLUP_VERSION)
+        .values('article_count')[:1]
+    )
+    return events.update(news_count=Coalesce(Subquery(news_count), Value(0)))
@@ -0,0 +1,243 @@
+# subscriptions/sentiment_server.py
+
+"""
+Локальный сервер инференса тональности
+
+Модели загружаются один раз в процессе сервера, а воркеры Celery
+обращаются к нему по HTTP (см. sentiment_client.py) и не держат свои копии
+весов.
+
+Параллельные запросы к одной модели собираются в микро-пачки: поток
+модели ждет новые запросы до SENTIMENT_SERVER_BATCH_WINDOW_MS после
+первого (или пока не наберется SENTIMENT_SERVER_MAX_BATCH текстов) и
+прогоняет их одним вызовом BatchedSentimentEngine.predict.
+
+Эндпоинты:
+  POST /predict  {"model": "finbert", "texts": [...], "score_mode": null}
+                 -> {"model_version": ..., "results": [{sentiment_label, sentiment_score, confidence}]}
+                 score_mode - шкала score вместо шкалы модели (ModelSpec.with_score_mode)
+  GET  /metrics  очередь, размеры пачек, задержки по каждой модели
+  GET  /health
+
+Запуск: python manage.py run_sentiment_server
+"""
+
+import json
+import queue
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+
+from .sentiment_inference import BatchedSentimentEngine, decode_probabilities
+
+SCORE_MODES = ('difference', 'signed_confidence')
+
+
+class _PendingRequest:
+    def __init__(self, texts, score_mode=None):
+        self.texts = texts
+        self.score_mode = score_mode
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.model_version = None
+        self.results = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Очередь запросов одной модели и поток, прогоняющий их микро-пачками"""
+
+    def __init__(self, model_name, window_ms=None, max_batch=None):
+        self.model_name = model_name
+        self.window = (settings.SENTIMENT_SERVER_BATCH_WINDOW_MS if window_ms is None else window_ms) / 1000
+        self.max_batch = max_batch or settings.SENTIMENT_SERVER_MAX_BATCH
+        self.engine = BatchedSentimentEngine(model_name)
+        self.queue = queue.Queue()
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.texts = 0
+        self.batches = 0
+        self.errors = 0
+        self._batch_sizes = deque(maxlen=1000)
+        self._latencies = deque(maxlen=1000)
+        self._queue_waits = deque(maxlen=1000)
+
+        self._thread = threading.Thread(target=self._run, name=f'sentiment-{model_name}', daemon=True)
+        self._thread.start()
+
+    def submit(self, texts, timeout=None, score_mode=None):
+        """
+        Ставит тексты в очередь и ждет результат (вызывается из потоков HTTP).
+        Возвращает (model_version модели, посчитавшей пачку, результаты)
+        """
+        request = _PendingRequest(list(texts), score_mode)
+        self.queue.put(request)
+        if not request.done.wait(timeout):
+            raise TimeoutError(f"{self.model_name}: нет ответа за {timeout} с")
+        if request.error:
+            raise request.error
+        return request.model_version, request.results
+
+    def _collect(self):
+        """Первый запрос из очереди + все, что пришло в течение окна"""
+        pending = [self.queue.get()]
+        size = len(pending[0].texts)
+        deadline = time.perf_counter() + self.window
+
+        while size < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.append(request)
+            size += len(request.texts)
+
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            started = time.perf_counter()
+            texts = [text for request in pending for text in request.texts]
+
+            try:
+                # Вероятности на всю пачку, score - в шкале каждого запроса
+                spec, rows = self.engine.infer(texts)
+            except Exception as e:
+                with self._lock:
+                    self.errors += len(pending)
+                for request in pending:
+                    request.error = e
+                    request.done.set()
+                continue
+
+            finished = time.perf_counter()
+            offset = 0
+            for request in pending:
+                scored = spec.with_score_mode(request.score_mode)
+                request.model_version = scored.version
+                request.results = [
+                    decode_probabilities(scored, row)
+                    for row in rows[offset:offset + len(request.texts)]
+                ]
+                offset += len(request.texts)
+                request.done.set()
+
+            with self._lock:
+                self.requests += len(pending)
+                self.texts += len(texts)
+                self.batches += 1
+                self._batch_sizes.append(len(texts))
+                for request in pending:
+                    self._latencies.append(finished - request.enqueued_at)
+                    self._queue_waits.append(started - request.enqueued_at)
+
+    def metrics(self):
+        with self._lock:
+            batch_sizes = list(self._batch_sizes)
+            latencies = sorted(self._latencies)
+            waits = sorted(self._queue_waits)
+            return {
+                'model_version': self.engine.spec.version,
+                'backend': self.engine.backend,
+                'queue_depth': self.queue.qsize(),
+                'requests': self.requests,
+                'texts': self.texts,
+                'batches': self.batches,
+                'errors': self.errors,
+                'avg_batch_size': round(sum(batch_sizes) / len(batch_sizes), 1) if batch_sizes else 0.0,
+                'max_batch_size': max(batch_sizes) if batch_sizes else 0,
+                'latency_ms': _percentiles(latencies),
+                'queue_wait_ms': _percentiles(waits),
+            }
+
+
+def _percentiles(sorted_seconds):
+    if not sorted_seconds:
+        return {'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+
+    def pick(q):
+        return round(sorted_seconds[min(len(sorted_seconds) - 1, int(q * len(sorted_seconds)))] * 1000, 1)
+
+    return {'p50': pick(0.5), 'p95': pick(0.95), 'max': round(sorted_seconds[-1] * 1000, 1)}
+
+
+class SentimentRequestHandler(BaseHTTPRequestHandler):
+    server_version = 'SentimentServer/1.0'
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok', 'models': list(self.server.batchers)})
+        elif self.path == '/metrics':
+            self._send_json(200, {
+                'uptime_seconds': round(time.time() - self.server.started_at, 1),
+                'models': {name: b.metrics() for name, b in self.server.batchers.items()},
+            })
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self._send_json(404, {'error': 'not found'})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            model_name = payload.get('model', 'finbert')
+            texts = payload['texts']
+            score_mode = payload.get('score_mode')
+            if score_mode not in (None, *SCORE_MODES):
+                raise ValueError(f"score_mode: {score_mode}")
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {'error': f'bad request: {e}'})
+            return
+
+        batcher = self.server.batchers.get(model_name)
+        if batcher is None:
+            self._send_json(404, {'error': f"модель '{model_name}' не загружена на сервере"})
+            return
+
+        try:
+            model_version, results = batcher.submit(
+                texts, timeout=self.server.request_timeout, score_mode=score_mode,
+            )
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+            return
+
+        self._send_json(200, {'model_version': model_version, 'results': results})
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class SentimentServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, model_names, window_ms=None, max_batch=None,
+                 request_timeout=None, verbose=False):
+        super().__init__(address, SentimentRequestHandler)
+        self.batchers = {
+            name: MicroBatcher(name, window_ms=window_ms, max_batch=max_batch)
+            for name in model_names
+        }
+        self.request_timeout = request_timeout or settings.SENTIMENT_SERVER_TIMEOUT
+        self.verbose = verbose
+        self.started_at = time.time()
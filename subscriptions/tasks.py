@@ -16,27 +16,22 @@ import time
 import json
 from pathlib import Path
 from datetime import datetime, timedelta
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import torch
 from pathlib import Path
 from celery import shared_task
 from django.utils import timezone
 
-# Глобальный кэш модели
-_custom_model = None
-_custom_tokenizer = None
-
-import numpy as np
 import pandas as pd
 import requests
 import joblib
 
 from celery import shared_task
+from django.conf import settings
 from django.db import transaction
+from django.db.models import Exists, OuterRef
 from django.utils import timezone
 
 from sklearn.preprocessing import StandardScaler
-from sklearn.ensemble import GradientBoostingClassifier
 from sklearn.metrics import (
     accuracy_score, 
     classification_report, 
@@ -51,6 +46,26 @@ from .models import (
     NewsSentiment, 
     DirectionPrediction
 )
+from .sentiment_registry import registry as sentiment_registry
+from .sentiment_inference import (
+    iter_article_chunks,
+    iter_streamed_chunks
+)
+from .sentiment_cache import CachedSentimentScorer
+from .sentiment_cascade import CascadeSentimentScorer
+from .sentiment_client import make_engine as make_sentiment_engine, fetch_server_metrics
+from .sentiment_pipeline import PipelinedSentimentRunner, format_pipeline_report
+from .news_dedup import assign_story
+from .sentiment_rollup import refresh_for_articles as refresh_sentiment_rollup
+from .features import feature_columns
+from .indicators import INDICATOR_COLUMNS
+from .rolling_state import push_day as push_rolling_day
+from . import feature_store
+from .training_data import read_classification_dataset, write_classification_dataset
+from .compiled_classifier import CompiledClassifier, export_classifier
+from .artifacts import atomic_write, cache as artifact_cache, describe as describe_artifacts
+from . import backtest, model_search, prediction_outcomes
+from .classifier_engines import engine_for_model, get_engine
 
 
 # ============================================
@@ -67,8 +82,10 @@ ML_MODELS_DIR.mkdir(parents=True, exist_ok=True)
 CLASSIFIER_MODEL_PATH = ML_MODELS_DIR / 'ml_classifier.pkl'
 CLASSIFIER_SCALER_PATH = ML_MODELS_DIR / 'ml_classifier_scaler.pkl'
 CLASSIFIER_FEATURES_PATH = ML_MODELS_DIR / 'classifier_features.pkl'
+CLASSIFIER_COMPILED_PATH = ML_MODELS_DIR / 'ml_classifier.npz'  # для прогноза, см. compiled_classifier.py
 
-TRAINING_DATA_PATH = ML_MODELS_DIR / 'classification_data.csv'
+TRAINING_DATA_DIR = ML_MODELS_DIR / 'classification_data'  # Parquet, см. training_data.py
+TRAINING_DATA_CSV_PATH = ML_MODELS_DIR / 'classification_data.csv'  # опциональная выгрузка
 MODEL_REPORT_PATH = ML_MODELS_DIR / 'model_report.json'
 
 
@@ -154,7 +171,7 @@ def collect_historical_prices(days=30):
                 prev_price = prices[i-1][1] if i > 0 else price
                 price_change_percent = ((price - prev_price) / prev_price) * 100 if prev_price else 0
                 
-                CoinDailyStat.objects.update_or_create(
+                _, created = CoinDailyStat.objects.update_or_create(
                     coin=coin,
                     date=date,
                     defaults={
@@ -164,6 +181,7 @@ def collect_historical_prices(days=30):
                         "price_change_percent": price_change_percent
                     }
                 )
+                push_rolling_day(coin.id, date, price, volume, created)
             
             print(f"✅ {coin.symbol.upper()} - загружено {len(prices)} дней")
             time.sleep(60)  # Rate limiting
@@ -240,6 +258,11 @@ def collect_historical_news(days=30):
                             
                             if created:
                                 saved_count += 1
+                                # Новость уже сохранена; без кластера ее подберет rebuild_news_stories
+                                try:
+                                    assign_story(obj)
+                                except Exception as e:
+                                    logger.warning(f"Кластер для новости {obj.id} не назначен: {e}")
                         except Exception:
                             continue
                     
@@ -265,99 +288,131 @@ def collect_historical_news(days=30):
 # 2. АНАЛИЗ ТОНАЛЬНОСТИ (FinBERT)
 # ============================================
 def load_custom_sentiment_model():
-    """Загрузка вашей обученной модели (81% accuracy)"""
-    global _custom_model, _custom_tokenizer
-    
-    if _custom_model is None:
-        model_path = Path('ml/models/crypto_sentiment')
-        
-        if not model_path.exists():
-            raise FileNotFoundError(f"Модель не найдена: {model_path}")
-        
-        print("🔧 Загружаю custom модель (accuracy: 81.23%)...")
-        _custom_tokenizer = AutoTokenizer.from_pretrained(str(model_path))
-        _custom_model = AutoModelForSequenceClassification.from_pretrained(str(model_path))
-        _custom_model.eval()
-        print("✅ Модель загружена")
-    
-    return _custom_model, _custom_tokenizer
+    """Загрузка вашей обученной модели (81% accuracy) из процессного кэша"""
+    return sentiment_registry.get('custom')
 
 
-# subscriptions/tasks.py
-# subscriptions/tasks.py
-# subscriptions/tasks.py
+@shared_task
+def sentiment_model_stats():
+    """
+    Статистика реестра моделей тональности текущего процесса воркера:
+    время загрузки, память, количество обращений.
+    При работе через сервер тональности - его метрики (очередь, пачки, задержки)
+    """
+    stats = sentiment_registry.stats()
+    if settings.SENTIMENT_SERVER_URL:
+        try:
+            stats['server'] = fetch_server_metrics()
+        except requests.RequestException as e:
+            stats['server'] = {'error': str(e)}
+    return stats
 
-def analyze_sentiment_with_custom_model():
-    """Анализ с Custom моделью - сохраняет в ОТДЕЛЬНУЮ таблицу"""
-    from subscriptions.models import NewsArticle, CustomModelSentiment
-    from transformers import AutoTokenizer, AutoModelForSequenceClassification
-    import torch
-    from pathlib import Path
-    
-    print(f"🔧 Загружаю custom модель...")
+
+@shared_task
+def model_artifacts_stats():
+    """
+    Версии моделей в ml/models/: на диске и загруженные в этом процессе воркера,
+    плюс статистика кэша артефактов (загрузки, обращения)
+    """
+    return {
+        'pid': os.getpid(),
+        'artifacts': describe_artifacts(),
+        'cache': artifact_cache.stats(),
+        'reloads': artifact_cache.reloads,
+    }
+
+
+@shared_task
+def analyze_sentiment_with_custom_model(batch_size=None, max_batch_tokens=None, chunk_size=None, pipelined=None):
+    """
+    Анализ с Custom моделью - сохраняет в ОТДЕЛЬНУЮ таблицу
     
-    model_path = Path('ml/models/crypto_sentiment')
-    tokenizer = AutoTokenizer.from_pretrained(str(model_path))
-    model = AutoModelForSequenceClassification.from_pretrained(str(model_path))
-    model.eval()
+    Инкрементально: берутся только новости без CustomModelSentiment для текущей
+    версии модели, поэтому стоимость запуска зависит от числа новых новостей,
+    а не от размера таблицы. Повторный/параллельный запуск безопасен.
     
-    print("✅ Модель загружена")
+    pipelined=True - конвейерный прогон (см. sentiment_pipeline.py),
+    по умолчанию settings.SENTIMENT_PIPELINED
+    """
+    from subscriptions.models import NewsArticle, CustomModelSentiment
     
-    news = NewsArticle.objects.all()[:1117]
+    if pipelined is None:
+        pipelined = settings.SENTIMENT_PIPELINED
     
-    analyzed = 0
-    errors = 0
+    model_version = sentiment_registry.spec('custom').version
+    engine = make_sentiment_engine('custom', batch_size=batch_size, max_batch_tokens=max_batch_tokens)
+    scorer = CachedSentimentScorer(engine)
     
-    for article in news:
-        try:
-            text = f"{article.title}. {article.description or ''}"
-            
-            inputs = tokenizer(text, return_tensors="pt", truncation=True, max_length=128)
-            
-            with torch.no_grad():
-                outputs = model(**inputs)
-                probs = torch.nn.functional.softmax(outputs.logits, dim=-1)
-            
-            labels = ['negative', 'neutral', 'positive']
-            predicted_idx = probs.argmax().item()
-            predicted_label = labels[predicted_idx]
-            confidence = probs[0][predicted_idx].item()
-            sentiment_score = (predicted_idx - 1) * confidence
-            
-            # Сохраняем в НОВУЮ таблицу CustomModelSentiment
-            sentiment, created = CustomModelSentiment.objects.update_or_create(
-                article=article,
-                model_version='custom_distilbert_v1',
-                defaults={
-                    'sentiment_label': predicted_label,
-                    'sentiment_score': sentiment_score,
-                    'confidence': confidence,
-                }
-            )
-            
-            emoji = {'negative': '🔴', 'neutral': '⚪', 'positive': '🟢'}
-            print(f"{emoji[predicted_label]} {article.coin.symbol}: {predicted_label} ({confidence:.1%})")
-            
-            analyzed += 1
-            
-        except Exception as e:
-            print(f"❌ Ошибка {article.id}: {e}")
-            errors += 1
+    already_scored = CustomModelSentiment.objects.filter(
+        article=OuterRef('pk'),
+        model_version=model_version
+    )
+    pending = NewsArticle.objects.filter(~Exists(already_scored))
+    
+    distribution = {'negative': 0, 'neutral': 0, 'positive': 0}
+    
+    def write_rows(chunk, results):
+        # Сохраняем в НОВУЮ таблицу CustomModelSentiment (пачкой, дубликаты пропускаются)
+        CustomModelSentiment.objects.bulk_create(
+            [
+                CustomModelSentiment(
+                    article_id=article_id,
+                    model_version=model_version,
+                    sentiment_label=result['sentiment_label'],
+                    sentiment_score=result['sentiment_score'],
+                    confidence=result['confidence'],
+                )
+                for (article_id, *_), result in zip(chunk, results)
+            ],
+            ignore_conflicts=True,
+        )
+        refresh_sentiment_rollup([article_id for article_id, *_ in chunk], model_version)
+        for result in results:
+            distribution[result['sentiment_label']] += 1
+    
+    pipeline = None
+    if pipelined:
+        runner = PipelinedSentimentRunner(scorer, write_rows, chunk_size=chunk_size)
+        pipeline = runner.run(pending)
+        analyzed, errors = pipeline['processed'], pipeline['errors']
+    else:
+        analyzed = 0
+        errors = 0
+        for chunk in iter_streamed_chunks(pending, chunk_size):
+            try:
+                write_rows(chunk, scorer.score(chunk))
+                analyzed += len(chunk)
+            except Exception as e:
+                print(f"❌ Ошибка пачки {chunk[0][0]}..{chunk[-1][0]}: {e}")
+                errors += len(chunk)
+    
+    if analyzed == 0 and errors == 0:
+        print(f"✅ Новых новостей для {model_version} нет")
+    else:
+        print(f"✅ {model_version}: проанализировано {analyzed}, ошибок {errors} "
+              f"(🔴 {distribution['negative']}  ⚪ {distribution['neutral']}  🟢 {distribution['positive']})")
+        print(f"   Кэш: {scorer.cache_hits} из {scorer.articles} ({scorer.hit_ratio*100:.1f}%)")
+        if pipeline:
+            for line in format_pipeline_report(pipeline):
+                print(line)
     
-    return {'analyzed': analyzed, 'errors': errors}
+    return {
+        'analyzed': analyzed,
+        'errors': errors,
+        'model_version': model_version,
+        'cache': scorer.stats(),
+        'timings': engine.timing_summary(),
+        'pipeline': pipeline['stages'] if pipeline else None,
+    }
 
 
 
 def analyze_with_finbert(text):
     """
     Анализирует текст с помощью FinBERT
+    Модель берется из процессного кэша (загружается один раз на воркер)
     """
-    from transformers import AutoTokenizer, AutoModelForSequenceClassification
-    import torch
-    
-    model_name = "ProsusAI/finbert"
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    model, tokenizer = sentiment_registry.get('finbert')
     
     # Tokenize
     inputs = tokenizer(text, return_tensors="pt", padding=True, truncation=True, max_length=512)
@@ -389,41 +444,90 @@ def analyze_with_finbert(text):
 
 
 @shared_task
-def analyze_all_sentiment():
+def analyze_all_sentiment(batch_size=None, max_batch_tokens=None, mode=None, pipelined=None):
     """
-    Анализирует тональность всех необработанных новостей с FinBERT
+    Анализирует тональность всех необработанных новостей
+    Новости обрабатываются пачками (см. BatchedSentimentEngine)
+    
+    mode='finbert' - все новости через основную модель (settings.SENTIMENT_PRIMARY_MODEL:
+                     FinBERT или дистиллированная из него модель)
+    mode='cascade' - сначала custom-модель, в FinBERT только неуверенные
+    (по умолчанию settings.SENTIMENT_PIPELINE_MODE)
+    
+    pipelined=True - конвейерный прогон режима finbert (см. sentiment_pipeline.py),
+    по умолчанию settings.SENTIMENT_PIPELINED
     """
+    mode = mode or settings.SENTIMENT_PIPELINE_MODE
+    if pipelined is None:
+        pipelined = settings.SENTIMENT_PIPELINED
     articles = NewsArticle.objects.filter(newssentiment__isnull=True)
     total_articles = articles.count()
     
     if total_articles == 0:
         return "Все новости уже проанализированы"
     
-    print(f"💭 Анализирую тональность {total_articles} новостей с FinBERT...")
+    if mode == 'cascade':
+        print(f"💭 Анализирую тональность {total_articles} новостей каскадом custom → FinBERT...")
+        scorer = CascadeSentimentScorer(batch_size=batch_size, max_batch_tokens=max_batch_tokens)
+    else:
+        model_name = settings.SENTIMENT_PRIMARY_MODEL
+        print(f"💭 Анализирую тональность {total_articles} новостей с {model_name}...")
+        engine = make_sentiment_engine(model_name, batch_size=batch_size, max_batch_tokens=max_batch_tokens)
+        scorer = CachedSentimentScorer(engine)
+    
+    def write_rows(chunk, results):
+        NewsSentiment.objects.bulk_create(
+            [
+                NewsSentiment(
+                    article_id=article_id,
+                    sentiment_score=result['sentiment_score'],
+                    sentiment_label=result['sentiment_label'],
+                    confidence=result['confidence'],
+                    source_model=result.get('source_model', scorer.model_version)
+                )
+                for (article_id, *_), result in zip(chunk, results)
+            ],
+            ignore_conflicts=True
+        )
+        # Дневная сводка тональности (CoinDailySentiment) - только затронутые дни
+        refresh_sentiment_rollup([article_id for article_id, *_ in chunk])
+    
+    if pipelined and mode != 'cascade':
+        pipeline = PipelinedSentimentRunner(scorer, write_rows).run(articles)
+        analyzed_count = pipeline['processed']
+        print(f"✅ Проанализировано {analyzed_count} из {total_articles} статей")
+        for line in format_pipeline_report(pipeline):
+            print(line)
+        return f"Проанализировано {analyzed_count} статей"
     
     analyzed_count = 0
-    for article in articles:
+    for chunk in iter_article_chunks(articles):
         try:
-            text = f"{article.title}. {article.description or ''}"
-            result = analyze_with_finbert(text)
-            
-            NewsSentiment.objects.create(
-                article=article,
-                sentiment_score=result['sentiment_score'],
-                sentiment_label=result['sentiment_label'],
-                confidence=result['confidence']
-            )
-            
-            analyzed_count += 1
-            
-            if analyzed_count % 50 == 0:
-                print(f"  Проанализировано: {analyzed_count}/{total_articles}")
+            write_rows(chunk, scorer.score(chunk))
+            analyzed_count += len(chunk)
+            print(f"  Проанализировано: {analyzed_count}/{total_articles}")
                 
         except Exception as e:
-            print(f"❌ Ошибка анализа статьи {article.id}: {e}")
+            print(f"❌ Ошибка анализа пачки {chunk[0][0]}..{chunk[-1][0]}: {e}")
             continue
     
-    print(f"✅ Проанализировано {analyzed_count} из {total_articles} статей")
+    if mode == 'cascade':
+        stats = scorer.stats()
+        audit = scorer.audit()
+        print(f"✅ Проанализировано {analyzed_count} из {total_articles} статей")
+        print(f"   Custom-модель: {stats['accepted_cheap']}, "
+              f"FinBERT (уверенность < {stats['threshold']}): {stats['escalated']} "
+              f"({stats['escalation_ratio']*100:.1f}%)")
+        if audit['samples']:
+            print(f"   Аудит на {audit['samples']} новостях: совпадение custom с FinBERT "
+                  f"{audit['cheap_agreement']*100:.1f}%, каскада в целом ~{audit['estimated_agreement']*100:.1f}%")
+        return {'mode': mode, 'analyzed': analyzed_count, **stats, 'audit': audit}
+    
+    timings = engine.timing_summary()
+    print(f"✅ Проанализировано {analyzed_count} из {total_articles} статей "
+          f"({timings['batches']} пачек, {timings['texts_per_second']} статей/с)")
+    print(f"   Кэш: {scorer.cache_hits} из {scorer.articles} ({scorer.hit_ratio*100:.1f}%), "
+          f"прогнано через модель: {scorer.inferred}")
     return f"Проанализировано {analyzed_count} статей"
 
 
@@ -432,131 +536,37 @@ def analyze_all_sentiment():
 # ============================================
 
 @shared_task
-def prepare_classification_dataset():
+def prepare_classification_dataset(unique_stories=None, export_csv=None, indicators=None):
     """
     Подготавливает датасет для обучения классификатора направления тренда
-    Сохраняет в ml/models/classification_data.csv
-    """
-    data = []
+    Сохраняет в ml/models/classification_data/ (Parquet по месяцам)
     
-    for coin in CoinSnapshot.objects.all():
-        print(f"Processing {coin.symbol}...")
-        
-        daily_stats = list(
-            CoinDailyStat.objects
-            .filter(coin=coin)
-            .order_by('date')
-            .values('date', 'price', 'volume', 'market_cap')
-        )
-        
-        if len(daily_stats) < 8:
-            continue
-        
-        for i in range(7, len(daily_stats) - 1):
-            current_day = daily_stats[i]
-            next_day = daily_stats[i + 1]
-            
-            # TARGET: 0 = down, 1 = up
-            price_current = float(current_day['price'])
-            price_next = float(next_day['price'])
-            price_change_percent = ((price_next - price_current) / price_current) * 100
-            
-            # Игнорируем шум (<0.5%)
-            if abs(price_change_percent) < 0.5:
-                continue
-            
-            target = 1 if price_change_percent > 0 else 0
-            
-            # === ЦЕНОВЫЕ ПРИЗНАКИ (7 дней) ===
-            past_7_days = daily_stats[i-6:i+1]
-            prices_7d = [float(d['price']) for d in past_7_days]
-            volumes_7d = [float(d['volume']) for d in past_7_days]
-            
-            avg_price_7d = np.mean(prices_7d)
-            volatility_7d = np.std(prices_7d)
-            price_trend_7d = ((prices_7d[-1] - prices_7d[0]) / prices_7d[0]) * 100
-            avg_volume_7d = np.mean(volumes_7d)
-            
-            # === НОВОСТНЫЕ ПРИЗНАКИ ===
-            date_3d_ago = current_day['date'] - timedelta(days=3)
-            date_6d_ago = current_day['date'] - timedelta(days=6)
-            
-            # Текущий период (последние 3 дня)
-            news_current = NewsArticle.objects.filter(
-                coin=coin,
-                published_at__date__gte=date_3d_ago,
-                published_at__date__lte=current_day['date']
-            ).select_related('newssentiment')
-            
-            # Предыдущий период (дни -6 до -3)
-            news_previous = NewsArticle.objects.filter(
-                coin=coin,
-                published_at__date__gte=date_6d_ago,
-                published_at__date__lt=date_3d_ago
-            ).select_related('newssentiment')
-            
-            # Вычисляем метрики для текущего периода
-            news_count_current = news_current.count()
-            sentiments_current = [
-                n.newssentiment.sentiment_score
-                for n in news_current
-                if hasattr(n, 'newssentiment')
-            ]
-            
-            avg_sentiment_current = np.mean(sentiments_current) if sentiments_current else 0
-            positive_current = sum(1 for s in sentiments_current if s > 0.05)
-            negative_current = sum(1 for s in sentiments_current if s < -0.05)
-            
-            # Вычисляем метрики для предыдущего периода
-            news_count_previous = news_previous.count()
-            sentiments_previous = [
-                n.newssentiment.sentiment_score
-                for n in news_previous
-                if hasattr(n, 'newssentiment')
-            ]
-            
-            avg_sentiment_previous = np.mean(sentiments_previous) if sentiments_previous else 0
-            positive_previous = sum(1 for s in sentiments_previous if s > 0.05)
-            negative_previous = sum(1 for s in sentiments_previous if s < -0.05)
-            
-            # === ДИНАМИЧЕСКИЕ ПРИЗНАКИ ===
-            news_volume_change = news_count_current - news_count_previous
-            sentiment_change = avg_sentiment_current - avg_sentiment_previous
-            positive_change = positive_current - positive_previous
-            negative_change = negative_current - negative_previous
-            
-            # Всплески
-            negative_spike = 1 if (negative_current > 5 and negative_change > 3) else 0
-            positive_spike = 1 if (positive_current > 5 and positive_change > 3) else 0
-            
-            # Взаимодействия
-            price_sentiment_alignment = price_trend_7d * avg_sentiment_current
-            divergence = 1 if (price_trend_7d < -1 and avg_sentiment_current > 0.1) else 0
-            
-            data.append({
-                'coin': coin.symbol,
-                'date': current_day['date'],
-                'target': target,
-                'price_change_percent': price_change_percent,
-                
-                # Ценовые признаки
-                'price_trend_7d': price_trend_7d,
-                'volatility_7d': volatility_7d,
-                'avg_volume_7d': avg_volume_7d,
-                'avg_price_7d': avg_price_7d,
-                
-                # Новостные признаки
-                'news_volume_change': float(news_volume_change),
-                'sentiment_change': float(sentiment_change),
-                'positive_change': float(positive_change),
-                'negative_change': float(negative_change),
-                'negative_spike': float(negative_spike),
-                'positive_spike': float(positive_spike),
-                'price_sentiment_alignment': float(price_sentiment_alignment),
-                'divergence': float(divergence),
-            })
-    
-    df = pd.DataFrame(data)
+    export_csv=True - дополнительно ml/models/classification_data.csv
+    (по умолчанию settings.CLASSIFICATION_EXPORT_CSV)
+    
+    Признаки читаются из хранилища признаков (CoinFeatureSnapshot, см.
+    subscriptions/feature_store.py) - тех же строк, что и при прогнозе
+    
+    unique_stories=True - перепечатки одной истории считаются одной новостью
+    (по умолчанию settings.FEATURES_COUNT_UNIQUE_STORIES)
+    indicators=True - с техническими индикаторами
+    (по умолчанию settings.FEATURES_TECHNICAL_INDICATORS)
+    """
+    if unique_stories is None:
+        unique_stories = settings.FEATURES_COUNT_UNIQUE_STORIES
+    if indicators is None:
+        indicators = settings.FEATURES_TECHNICAL_INDICATORS
+    if export_csv is None:
+        export_csv = settings.CLASSIFICATION_EXPORT_CSV
+    
+    started = time.perf_counter()
+    if feature_store.is_empty(unique_stories, indicators):
+        # Первый запуск для этой версии признаков - заполняем всю историю
+        rows = feature_store.materialize(unique_stories=unique_stories, indicators=indicators)
+        print(f"🗄️ Хранилище признаков заполнено: {rows} строк за {time.perf_counter() - started:.2f}s")
+    
+    df = feature_store.load_training_frame(unique_stories, indicators)
+    print(f"⏱️ Признаки загружены из хранилища за {time.perf_counter() - started:.2f}s")
     
     up_count = (df['target'] == 1).sum()
     down_count = (df['target'] == 0).sum()
@@ -567,14 +577,18 @@ def prepare_classification_dataset():
     print(f"   DOWN (0): {down_count} ({down_count/len(df)*100:.1f}%)")
     
     # Сохраняем в ml/models/
-    df.to_csv(TRAINING_DATA_PATH, index=False)
-    print(f"💾 Saved to: {TRAINING_DATA_PATH}")
+    files = write_classification_dataset(df, TRAINING_DATA_DIR)
+    print(f"💾 Saved to: {TRAINING_DATA_DIR} ({files} files)")
+    if export_csv:
+        df.to_csv(TRAINING_DATA_CSV_PATH, index=False)
+        print(f"💾 CSV export: {TRAINING_DATA_CSV_PATH}")
     
     return {
         'total_samples': len(df),
         'up_count': int(up_count),
         'down_count': int(down_count),
-        'saved_to': str(TRAINING_DATA_PATH)
+        'saved_to': str(TRAINING_DATA_DIR),
+        'csv_export': str(TRAINING_DATA_CSV_PATH) if export_csv else None,
     }
 
 
@@ -582,17 +596,8 @@ def prepare_classification_dataset():
 # 4. ОБУЧЕНИЕ КЛАССИФИКАТОРА
 # ============================================
 
-@shared_task
-def train_classification_model_v2():
-    """
-    Обучает бинарный классификатор направления тренда (UP/DOWN)
-    Сохраняет модели в ml/models/
-    """
-    print(f"📂 Loading data from: {TRAINING_DATA_PATH}")
-    df = pd.read_csv(TRAINING_DATA_PATH)
-    
-    print(f"📊 Dataset: {len(df)} samples")
-    
+def classifier_feature_cols():
+    """Признаки классификатора направления"""
     # Выбираем лучшие признаки (по результатам экспериментов)
     feature_cols = [
         'price_trend_7d', 
@@ -602,7 +607,47 @@ def train_classification_model_v2():
         'sentiment_change', 
         'price_sentiment_alignment',
     ]
+    if settings.FEATURES_TECHNICAL_INDICATORS:
+        feature_cols += INDICATOR_COLUMNS
+    return feature_cols
+
+
+def print_search_leaderboard(results, top=10):
+    print("\n" + "="*60)
+    print(f"🏁 WALK-FORWARD SEARCH ({results['mode']}, {', '.join(results['engines'])}): "
+          f"{results['candidates']} candidates x "
+          f"{len(results['splits'])} splits = {results['fits']} fits in {results['seconds']:.0f}s "
+          f"({results['n_jobs']} processes)")
+    print("="*60)
+    for row in results['leaderboard'][:top]:
+        params = ", ".join(f"{name}={value}" for name, value in row['params'].items())
+        print(f"{row['rank']:>3}. AUC {row['mean_auc']:.4f} ±{row['std_auc']:.4f}  "
+              f"acc {row['mean_accuracy']:.4f}  {row['engine']:<6} {params}")
+    for engine, row in results['defaults'].items():
+        if row:
+            print(f"   Параметры по умолчанию {engine}: #{row['rank']}, AUC {row['mean_auc']:.4f}")
+
+
+@shared_task
+def train_classification_model_v2(search=False, n_iter=None, params=None, engine=None):
+    """
+    Обучает бинарный классификатор направления тренда (UP/DOWN)
+    Сохраняет модели в ml/models/
     
+    engine - движок модели (classifier_engines.py: gbc, hgb, logreg),
+    по умолчанию CLASSIFIER_ENGINE.
+    search=True - сначала walk-forward подбор гиперпараметров движка по всем ядрам
+    (model_search.py, n_iter - случайный поиск вместо полной сетки), обучается победитель.
+    params - готовые параметры модели (поверх default_params движка)
+    """
+    engine = get_engine(engine or settings.CLASSIFIER_ENGINE)
+    feature_cols = classifier_feature_cols()
+    
+    # Читаются только нужные колонки (Parquet, memory_map)
+    print(f"📂 Loading data from: {TRAINING_DATA_DIR}")
+    df = read_classification_dataset(TRAINING_DATA_DIR, columns=['date', 'target'] + feature_cols)
+    
+    print(f"📊 Dataset: {len(df)} samples")
     print(f"🎯 Using {len(feature_cols)} features")
     
     X = df[feature_cols]
@@ -625,23 +670,26 @@ def train_classification_model_v2():
     print(f"📦 Test: {len(test_df)} samples")
     print(f"   UP: {(test_df['target']==1).sum()}, DOWN: {(test_df['target']==0).sum()}")
     
+    search_results = None
+    if search:
+        # Подбор только на обучающей части: тест остается честной отложенной выборкой
+        search_results = model_search.run_search(
+            train_df, feature_cols, n_splits=settings.CLASSIFIER_SEARCH_SPLITS,
+            n_iter=n_iter, n_jobs=settings.CLASSIFIER_SEARCH_JOBS, engines=[engine.name],
+        )
+        print_search_leaderboard(search_results)
+        params = search_results['best']['params']
+    
     # Масштабирование
     scaler = StandardScaler()
     X_train_scaled = scaler.fit_transform(X_train)
     X_test_scaled = scaler.transform(X_test)
     
     # Модель
-    model = GradientBoostingClassifier(
-        n_estimators=30,
-        learning_rate=0.1,
-        max_depth=3,
-        min_samples_split=30,
-        min_samples_leaf=15,
-        subsample=0.7,
-        max_features='sqrt',
-        random_state=42,
-        verbose=0
-    )
+    model_params = {**engine.default_params, **(params or {})}
+    print(f"\n⚙️ Engine: {engine.name} ({engine.description})")
+    print(f"⚙️ Params: {model_params}")
+    model = engine.build(model_params)
     
     print("\n🔧 Training classifier...")
     model.fit(X_train_scaled, y_train)
@@ -691,7 +739,7 @@ def train_classification_model_v2():
     # Feature importance
     feature_importance = pd.DataFrame({
         'feature': feature_cols,
-        'importance': model.feature_importances_
+        'importance': engine.feature_importances(model)
     }).sort_values('importance', ascending=False)
     
     print("\n" + "="*60)
@@ -715,10 +763,14 @@ def train_classification_model_v2():
     print(f"💰 Price features:  {price_importance*100:>5.1f}%")
     print(f"📰 News features:   {news_importance*100:>5.1f}%")
     
-    # Сохраняем в ml/models/
-    joblib.dump(model, CLASSIFIER_MODEL_PATH)
-    joblib.dump(scaler, CLASSIFIER_SCALER_PATH)
-    joblib.dump(feature_cols, CLASSIFIER_FEATURES_PATH)
+    # Сохраняем в ml/models/ (каждый файл - атомарной заменой). Порядок важен:
+    # модель после scaler и признаков, .npz последним - воркер, увидевший
+    # новую модель раньше .npz, скомпилирует ее уже с новыми scaler и признаками
+    for artifact, path in ((scaler, CLASSIFIER_SCALER_PATH), (feature_cols, CLASSIFIER_FEATURES_PATH),
+                           (model, CLASSIFIER_MODEL_PATH)):
+        with atomic_write(path) as f:
+            joblib.dump(artifact, f)
+    export_classifier(model, scaler, feature_cols, CLASSIFIER_COMPILED_PATH, trained_at=datetime.now())
     
     print("\n" + "="*60)
     print("💾 MODEL SAVED")
@@ -726,6 +778,7 @@ def train_classification_model_v2():
     print(f"   Model:    {CLASSIFIER_MODEL_PATH}")
     print(f"   Scaler:   {CLASSIFIER_SCALER_PATH}")
     print(f"   Features: {CLASSIFIER_FEATURES_PATH}")
+    print(f"   Compiled: {CLASSIFIER_COMPILED_PATH}")
     
     return {
         'train_acc': float(train_acc),
@@ -737,110 +790,102 @@ def train_classification_model_v2():
         'price_importance': float(price_importance),
         'news_importance': float(news_importance),
         'confusion_matrix': cm.tolist(),
+        'engine': engine.name,
+        'params': model_params,
+        'search': {
+            'best_auc': search_results['best']['mean_auc'],
+            'candidates': search_results['candidates'],
+            'seconds': search_results['seconds'],
+            'leaderboard': str(model_search.SEARCH_RESULTS_PATH),
+        } if search_results else None,
         'saved_to': {
             'model': str(CLASSIFIER_MODEL_PATH),
             'scaler': str(CLASSIFIER_SCALER_PATH),
-            'features': str(CLASSIFIER_FEATURES_PATH)
+            'features': str(CLASSIFIER_FEATURES_PATH),
+            'compiled': str(CLASSIFIER_COMPILED_PATH),
         }
     }
 
 
+def load_classifier():
+    """
+    Классификатор для прогноза (CompiledClassifier: scaler + ансамбль в массивах NumPy).
+    Загружается один раз на процесс (artifacts.py) и перечитывается, когда
+    обучение записывает новую версию.
+    Если .npz нет или он старше .pkl (модель обучена до появления выгрузки
+    или заменена вручную) - компилируется из .pkl и сохраняется.
+    FileNotFoundError, если модель не обучена
+    """
+    if (not CLASSIFIER_COMPILED_PATH.exists()
+            or CLASSIFIER_COMPILED_PATH.stat().st_mtime < CLASSIFIER_MODEL_PATH.stat().st_mtime):
+        model = joblib.load(CLASSIFIER_MODEL_PATH)
+        scaler = joblib.load(CLASSIFIER_SCALER_PATH)
+        feature_cols = joblib.load(CLASSIFIER_FEATURES_PATH)
+        print(f"🔧 Компиляция классификатора в {CLASSIFIER_COMPILED_PATH}")
+        export_classifier(model, scaler, feature_cols, CLASSIFIER_COMPILED_PATH,
+                          trained_at=classifier_trained_at())
+    
+    return artifact_cache.get(CLASSIFIER_COMPILED_PATH, CompiledClassifier.load)
+
+
+def classifier_trained_at():
+    """Время обучения модели в .pkl (для выгрузки в .npz после обучения)"""
+    return datetime.fromtimestamp(CLASSIFIER_MODEL_PATH.stat().st_mtime)
+
+
+def classifier_model_version(model):
+    """
+    model_version прогнозов (DirectionPrediction): движок + время обучения
+    из .npz, у выгрузок без него - версия файла (artifacts.version_id).
+    Точность в prediction_outcomes считается по каждой обученной модели
+    """
+    engine_version = engine_for_model(model.model_class).model_version
+    return f"{engine_version}_{model.trained_at or artifact_cache.version(CLASSIFIER_COMPILED_PATH)}"
+
+
 # ============================================
 # 5. ВЫЧИСЛЕНИЕ ПРИЗНАКОВ ДЛЯ ПРЕДСКАЗАНИЯ
 # ============================================
 
-def compute_features_for_coin(coin):
+def compute_features_for_coin(coin, unique_stories=None):
     """
-    Вычисляет признаки для одной монеты на основе текущих данных
+    Признаки одной монеты, посчитанные сейчас (обновление прогноза из бота):
+    строка хранилища могла быть записана до последних цен и новостей.
+    Считаются тем же кодом, что и хранилище, но в хранилище не пишутся
     Возвращает DataFrame с признаками или None если данных недостаточно
     """
-    now = timezone.now()
-    
-    # 1. ЦЕНОВЫЕ ПРИЗНАКИ (последние 7 дней)
-    prices_7d = list(
-        CoinDailyStat.objects
-        .filter(coin=coin, date__gte=now.date() - timedelta(days=7))
-        .order_by('-date')
-        .values_list('price', 'volume', flat=False)[:7]
-    )
+    if unique_stories is None:
+        unique_stories = settings.FEATURES_COUNT_UNIQUE_STORIES
     
-    if len(prices_7d) < 7:
+    indicators = settings.FEATURES_TECHNICAL_INDICATORS
+    frame = feature_store.compute_live_features([coin.id], unique_stories=unique_stories, indicators=indicators)
+    if frame.empty:
         return None
     
-    prices = [float(p[0]) for p in prices_7d]
-    volumes = [float(p[1]) for p in prices_7d]
-    
-    avg_price_7d = np.mean(prices)
-    volatility_7d = np.std(prices)
-    price_trend_7d = ((prices[0] - prices[-1]) / prices[-1]) * 100
-    avg_volume_7d = np.mean(volumes)
-    
-    # 2. НОВОСТНЫЕ ПРИЗНАКИ
-    # Текущий период (последние 3 дня)
-    news_current = NewsArticle.objects.filter(
-        coin=coin,
-        published_at__gte=now - timedelta(days=3)
-    ).select_related('newssentiment')
-    
-    # Предыдущий период (дни -6 до -3)
-    news_previous = NewsArticle.objects.filter(
-        coin=coin,
-        published_at__gte=now - timedelta(days=6),
-        published_at__lt=now - timedelta(days=3)
-    ).select_related('newssentiment')
-    
-    # Метрики для текущего периода
-    news_count_current = news_current.count()
-    sentiments_current = [
-        n.newssentiment.sentiment_score
-        for n in news_current
-        if hasattr(n, 'newssentiment')
-    ]
-    
-    avg_sentiment_current = np.mean(sentiments_current) if sentiments_current else 0
-    positive_current = sum(1 for s in sentiments_current if s > 0.05)
-    negative_current = sum(1 for s in sentiments_current if s < -0.05)
-    
-    # Метрики для предыдущего периода
-    news_count_previous = news_previous.count()
-    sentiments_previous = [
-        n.newssentiment.sentiment_score
-        for n in news_previous
-        if hasattr(n, 'newssentiment')
-    ]
+    return frame[feature_columns(indicators)].reset_index(drop=True)
+
+
+@shared_task
+def materialize_feature_store(days=3, unique_stories=None, indicators=None):
+    """
+    Заполняет хранилище признаков за последние days дней (включая сегодня).
+    Прошлые дни пересчитываются, т.к. у них появилась/уточнилась цена
+    следующего дня (цель для обучения)
+    """
+    if unique_stories is None:
+        unique_stories = settings.FEATURES_COUNT_UNIQUE_STORIES
+    if indicators is None:
+        indicators = settings.FEATURES_TECHNICAL_INDICATORS
     
-    avg_sentiment_previous = np.mean(sentiments_previous) if sentiments_previous else 0
-    positive_previous = sum(1 for s in sentiments_previous if s > 0.05)
-    negative_previous = sum(1 for s in sentiments_previous if s < -0.05)
-    
-    # 3. ДИНАМИЧЕСКИЕ ПРИЗНАКИ
-    news_volume_change = news_count_current - news_count_previous
-    sentiment_change = avg_sentiment_current - avg_sentiment_previous
-    positive_change = positive_current - positive_previous
-    negative_change = negative_current - negative_previous
-    
-    negative_spike = 1 if (negative_current > 5 and negative_change > 3) else 0
-    positive_spike = 1 if (positive_current > 5 and positive_change > 3) else 0
-    
-    price_sentiment_alignment = price_trend_7d * avg_sentiment_current
-    divergence = 1 if (price_trend_7d < -1 and avg_sentiment_current > 0.1) else 0
-    
-    features_dict = {
-        'price_trend_7d': price_trend_7d,
-        'volatility_7d': volatility_7d,
-        'avg_volume_7d': avg_volume_7d,
-        'avg_price_7d': avg_price_7d,
-        'news_volume_change': float(news_volume_change),
-        'sentiment_change': float(sentiment_change),
-        'positive_change': float(positive_change),
-        'negative_change': float(negative_change),
-        'negative_spike': float(negative_spike),
-        'positive_spike': float(positive_spike),
-        'price_sentiment_alignment': float(price_sentiment_alignment),
-        'divergence': float(divergence),
-    }
+    started = time.perf_counter()
+    today = timezone.now().date()
+    rows = feature_store.materialize(
+        today - timedelta(days=days - 1), today, unique_stories=unique_stories, indicators=indicators
+    )
+    seconds = time.perf_counter() - started
     
-    return pd.DataFrame([features_dict])
+    print(f"🗄️ Признаки за {days} дн.: {rows} строк за {seconds:.2f}s")
+    return {'rows': rows, 'seconds': round(seconds, 3), **feature_store.stats(unique_stories, indicators)}
 
 
 # ============================================
@@ -852,92 +897,115 @@ def generate_daily_predictions_classifier():
     """
     Генерирует ежедневные прогнозы направления для всех монет
     Использует обученный классификатор из ml/models/
+    
+    Признаки всех монет читаются из хранилища одной матрицей, прогноз - одним вызовом
+    predict_proba скомпилированного классификатора (compiled_classifier.py),
+    запись - одним bulk upsert. Время этапов - в 'timings'
     """
     print(f"🔮 Generating direction predictions at {timezone.now()}")
+    started = time.perf_counter()
     
     # Загружаем модели из ml/models/
     try:
         print(f"📂 Loading models from: {ML_MODELS_DIR}")
-        model = joblib.load(CLASSIFIER_MODEL_PATH)
-        scaler = joblib.load(CLASSIFIER_SCALER_PATH)
-        feature_cols = joblib.load(CLASSIFIER_FEATURES_PATH)
-        print("✅ Models loaded successfully")
+        model = load_classifier()
+        feature_cols = model.feature_cols
+        model_version = classifier_model_version(model)
+        print(f"✅ Models loaded successfully ({model_version})")
     except FileNotFoundError as e:
         print(f"❌ Model files not found: {e}")
         print(f"   Expected location: {ML_MODELS_DIR}")
         return {'error': 'Classifier not trained', 'path': str(ML_MODELS_DIR)}
     
-    today = timezone.now().date()
-    predictions_created = 0
-    predictions_updated = 0
+    timings = {'load_models': time.perf_counter() - started}
     
-    for coin in CoinSnapshot.objects.all():
-        try:
-            # Вычисляем признаки
-            features_df = compute_features_for_coin(coin)
-            
-            if features_df is None:
-                print(f"⚠️  {coin.symbol}: insufficient data")
-                continue
-            
-            # Выбираем только нужные признаки
-            X = features_df[feature_cols]
-            
-            # Масштабируем
-            X_scaled = scaler.transform(X)
-            
-            # Предсказываем направление
-            direction_code = model.predict(X_scaled)[0]
-            probability = model.predict_proba(X_scaled)[0]
-            
-            prob_down = float(probability[0])
-            prob_up = float(probability[1])
-            
-            predicted_direction = 'UP' if direction_code == 1 else 'DOWN'
-            confidence = max(prob_down, prob_up)
-            
-            # Оцениваем изменение цены
-            if predicted_direction == 'UP':
-                estimated_change = 1.5 * confidence
-            else:
-                estimated_change = -1.5 * confidence
-            
-            # Вычисляем оценочную цену
-            current_price = float(coin.price)
-            estimated_price = current_price * (1 + estimated_change / 100)
-            
-            # Сохраняем прогноз
-            prediction, created = DirectionPrediction.objects.update_or_create(
-                coin=coin,
-                prediction_date=today,
-                defaults={
-                    'predicted_direction': predicted_direction,
-                    'confidence_score': confidence,
-                    'probability_up': prob_up,
-                    'probability_down': prob_down,
-                    'estimated_change_percent': estimated_change,
-                    'current_price': current_price,
-                    'estimated_price': estimated_price,
-                    'model_version': 'classifier_v2'
-                }
-            )
-            
-            if created:
-                predictions_created += 1
-            else:
-                predictions_updated += 1
-            
-            emoji = "🟢" if predicted_direction == 'UP' else "🔴"
-            signal = prediction.signal_strength.upper()
-            
-            print(f"{emoji} {coin.symbol:>6}: {predicted_direction:>4} "
-                  f"({confidence*100:>5.1f}% confident, {signal:>8}) → {estimated_change:>+6.2f}%")
-            
-        except Exception as e:
-            print(f"❌ Error predicting {coin.symbol}: {e}")
-            import traceback
-            traceback.print_exc()
-            continue
+    now = timezone.now()
+    today = now.date()
+    
+    # 1. Признаки всех монет из хранилища (те же строки, что и при обучении)
+    stage = time.perf_counter()
+    coins = {coin.id: coin for coin in CoinSnapshot.objects.all()}
+    features = feature_store.load_live_features(
+        coins.keys(), today=today,
+        unique_stories=settings.FEATURES_COUNT_UNIQUE_STORIES,
+        indicators=settings.FEATURES_TECHNICAL_INDICATORS,
+    )
+    timings['features'] = time.perf_counter() - stage
+    
+    for coin_id in coins.keys() - set(features['coin_id']):
+        print(f"⚠️  {coins[coin_id].symbol}: insufficient data")
+    
+    if features.empty:
+        return {'status': 'success', 'predictions_created': 0, 'predictions_updated': 0, 'total': 0,
+                'timings': {name: round(sec, 4) for name, sec in timings.items()}}
+    
+    # 2. Масштабирование и прогноз одной матрицей
+    stage = time.perf_counter()
+    probabilities = model.predict_proba(features[feature_cols].to_numpy(dtype=float))
+    direction_codes = model.classes_.take(probabilities.argmax(axis=1))
+    timings['predict'] = time.perf_counter() - stage
+    
+    # 3. Запись одной пачкой (upsert по coin + prediction_date)
+    stage = time.perf_counter()
+    predictions = []
+    for coin_id, direction_code, probability in zip(features['coin_id'], direction_codes, probabilities):
+        coin = coins[coin_id]
+        prob_down = float(probability[0])
+        prob_up = float(probability[1])
+        
+        predicted_direction = 'UP' if direction_code == 1 else 'DOWN'
+        confidence = max(prob_down, prob_up)
+        
+        # Оцениваем изменение цены
+        if predicted_direction == 'UP':
+            estimated_change = 1.5 * confidence
+        else:
+            estimated_change = -1.5 * confidence
+        
+        current_price = float(coin.price)
+        estimated_price = current_price * (1 + estimated_change / 100)
+        
+        predictions.append(DirectionPrediction(
+            coin=coin,
+            prediction_date=today,
+            predicted_direction=predicted_direction,
+            confidence_score=confidence,
+            probability_up=prob_up,
+            probability_down=prob_down,
+            estimated_change_percent=estimated_change,
+            current_price=current_price,
+            estimated_price=estimated_price,
+            model_version=model_version,
+        ))
+    
+    existing = set(
+        DirectionPrediction.objects
+        .filter(prediction_date=today, coin_id__in=list(features['coin_id']))
+        .values_list('coin_id', flat=True)
+    )
+    DirectionPrediction.objects.bulk_create(
+        predictions,
+        update_conflicts=True,
+        unique_fields=['coin', 'prediction_date'],
+        update_fields=[
+            'predicted_direction', 'confidence_score', 'probability_up', 'probability_down',
+            'estimated_change_percent', 'current_price', 'estimated_price', 'model_version',
+        ],
+    )
+    timings['upsert'] = time.perf_counter() - stage
+    
+    predictions_updated = len(existing)
+    predictions_created = len(predictions) - predictions_updated
+    
+    for prediction in predictions:
+        emoji = "🟢" if prediction.predicted_direction == 'UP' else "🔴"
+        signal = prediction.signal_strength.upper()
+        print(f"{emoji} {prediction.coin.symbol:>6}: {prediction.predicted_direction:>4} "
+              f"({prediction.confidence_score*100:>5.1f}% confident, {signal:>8}) "
+              f"→ {prediction.estimated_change_percent:>+6.2f}%")
+    
+    timings['total'] = time.perf_counter() - started
+    print(f"\n⏱️ {len(coins)} монет: " + ", ".join(f"{name} {sec*1000:.0f} ms" for name, sec in timings.items()))
     
     print(f"\n✅ Generated {predictions_created} new predictions, updated {predictions_updated}")
     
@@ -947,6 +1015,9 @@ def generate_daily_predictions_classifier():
         'predictions_updated': predictions_updated,
         'total': predictions_created + predictions_updated,
         'models_location': str(ML_MODELS_DIR),
+        'model_version': model_version,
+        'classifier_version': artifact_cache.version(CLASSIFIER_COMPILED_PATH),
+        'timings': {name: round(sec, 4) for name, sec in timings.items()},
         'timestamp': timezone.now().isoformat()
     }
 
@@ -961,66 +1032,131 @@ def generate_model_report():
     Генерирует отчет о производительности модели
     Сохраняет в ml/models/model_report.json
     """
+    # Версия и тип - из обученной модели (как у прогнозов в generate_predictions)
+    try:
+        model = load_classifier()
+    except FileNotFoundError:
+        model = None
+    engine = engine_for_model(model.model_class) if model else None
+    
     report = {
         'generated_at': datetime.now().isoformat(),
-        'model_version': 'classifier_v2',
-        'model_type': 'Gradient Boosting Classifier',
+        'model_version': classifier_model_version(model) if model else None,
+        'model_type': engine.description if engine else None,
         'models_location': str(ML_MODELS_DIR),
         
-        'dataset': {
-            'total_samples': 480,
-            'train_samples': 384,
-            'test_samples': 96,
-            'date_range': '2025-09-26 to 2025-12-16',
-            'cryptocurrencies': 9,
-            'news_articles': 2088,
-            'sentiment_analyzer': 'FinBERT (ProsusAI/finbert)'
-        },
-        
-        'features': {
-            'total': 6,
-            'price_features': ['price_trend_7d', 'volatility_7d', 'avg_volume_7d', 'avg_price_7d'],
-            'news_features': ['sentiment_change', 'price_sentiment_alignment']
-        },
-        
-        'performance': {
-            'train_accuracy': 0.7031,
-            'test_accuracy': 0.5312,
-            'improvement_over_baseline': '+3.1%',
-            'auc_roc': 0.5371,
-            'overfitting_gap': 0.172
-        },
-        
-        'feature_importance': {
-            'price_features': '95.3%',
-            'news_features': '4.7%',
-            'top_feature': 'avg_volume_7d (33.2%)'
-        },
-        
-        'key_findings': [
-            'Model achieves 53.1% accuracy, exceeding random baseline by 3.1%',
-            'Price technical indicators dominate (95.3%) over news sentiment (4.7%)',
-            'Model is conservative: high recall for DOWN (83%), low recall for UP (16%)',
-            'FinBERT sentiment analysis provides marginal predictive power on daily granularity',
-            'Suitable as a weak signal in ensemble trading strategies'
-        ]
+        # Цифры первой версии модели на ее тестовой выборке (сент.-дек. 2025),
+        # не пересчитываются - для сравнения, не как точность текущей модели
+        'historical_test_set': {
+            'note': 'Frozen figures of the first classifier on its 2025 test split, not the current model',
+            'dataset': {
+                'total_samples': 480,
+                'train_samples': 384,
+                'test_samples': 96,
+                'date_range': '2025-09-26 to 2025-12-16',
+                'cryptocurrencies': 9,
+                'news_articles': 2088,
+                'sentiment_analyzer': 'FinBERT (ProsusAI/finbert)'
+            },
+            
+            'performance': {
+                'train_accuracy': 0.7031,
+                'test_accuracy': 0.5312,
+                'improvement_over_baseline': '+3.1%',
+                'auc_roc': 0.5371,
+                'overfitting_gap': 0.172
+            },
+            
+            'feature_importance': {
+                'price_features': '95.3%',
+                'news_features': '4.7%',
+                'top_feature': 'avg_volume_7d (33.2%)'
+            },
+            
+            'key_findings': [
+                'Model achieves 53.1% accuracy, exceeding random baseline by 3.1%',
+                'Price technical indicators dominate (95.3%) over news sentiment (4.7%)',
+                'Model is conservative: high recall for DOWN (83%), low recall for UP (16%)',
+                'FinBERT sentiment analysis provides marginal predictive power on daily granularity',
+                'Suitable as a weak signal in ensemble trading strategies'
+            ]
+        }
     }
     
+    if model:
+        report['features'] = {
+            'total': len(model.feature_cols),
+            'columns': model.feature_cols,
+        }
+    
+    # Последний бэктест (python manage.py backtest_classifier) - измеренные цифры,
+    # только вне выборки: replay по дням обучения завышает метрики
+    backtest_report = backtest.load_report()
+    if backtest_report and backtest.is_out_of_sample(backtest_report):
+        report['backtest'] = {
+            name: backtest_report.get(name)
+            for name in ('source', 'holdout', 'holdout_from', 'samples', 'coins', 'date_from', 'date_to',
+                         'all_days', 'significant_days', 'by_signal', 'portfolio')
+        }
+    elif backtest_report:
+        print("⚠️ Бэктест не в отчете: replay включает дни обучения модели "
+              "(перезапустите backtest_classifier без --no-holdout)")
+    
+    # Точность реальных прогнозов (score_prediction_outcomes) - главная цифра отчета
+    report['live_accuracy'] = prediction_outcomes.load_summary()
+    report['headline'] = prediction_outcomes.live_accuracy(report['live_accuracy'])
+    
     # Сохраняем в ml/models/
-    with open(MODEL_REPORT_PATH, 'w') as f:
+    with atomic_write(MODEL_REPORT_PATH, 'w') as f:
         json.dump(report, f, indent=2)
     
     print("="*60)
     print("📊 MODEL PERFORMANCE REPORT")
     print("="*60)
-    print(f"\n🎯 Test Accuracy: {report['performance']['test_accuracy']*100:.1f}%")
-    print(f"   Improvement: {report['performance']['improvement_over_baseline']}")
-    print(f"   AUC-ROC: {report['performance']['auc_roc']:.3f}")
+    print(f"\n🤖 Model: {report['model_version'] or 'not trained'} ({report['model_type'] or '-'})")
+    live = report['headline']
+    if live:
+        print(f"\n🎯 Live Accuracy: {live['accuracy']*100:.1f}% ({live['evaluated']} predictions)")
+    else:
+        print("\n🎯 Live Accuracy: no scored predictions yet")
+    historical = report['historical_test_set']['performance']
+    print(f"\n📜 Historical test set (2025, first model): {historical['test_accuracy']*100:.1f}% "
+          f"(AUC-ROC {historical['auc_roc']:.3f})")
     print(f"\n💾 Report saved to: {MODEL_REPORT_PATH}")
     
     return report
 
 
+@shared_task
+def score_prediction_outcomes(rescore_days=prediction_outcomes.RESCORE_DAYS):
+    """
+    Сверяет прогнозы направления с фактическим движением цены (одним UPDATE в БД),
+    пересчитывает точность по версиям модели и монетам (PredictionAccuracyStat)
+    и сводку ml/models/prediction_accuracy.json для /api/model/info/ и /faq
+    """
+    started = time.perf_counter()
+    scored = prediction_outcomes.score_outcomes(rescore_days=rescore_days)
+    stats = prediction_outcomes.refresh_stats()
+    summary = prediction_outcomes.write_summary()
+    
+    print(f"🎯 Оценено прогнозов: {scored}, строк точности: {stats}")
+    for model_version, windows in summary['model_versions'].items():
+        line = ", ".join(
+            f"{window} {metrics['accuracy']*100:.1f}% ({metrics['evaluated']})"
+            for window, metrics in windows.items()
+        )
+        print(f"   {model_version}: {line}")
+    
+    return {
+        'status': 'success',
+        'scored': scored,
+        'stats': stats,
+        'current_model_version': summary['current_model_version'],
+        'seconds': round(time.perf_counter() - started, 3),
+        'timestamp': timezone.now().isoformat(),
+    }
+
+
 # ============================================
 # 8. АВТОМАТИЗАЦИЯ (ДЛЯ CELERY BEAT)
 # ============================================
@@ -1033,7 +1169,8 @@ def update_daily_data():
     2. Собирает исторические цены
     3. Собирает новости
     4. Анализирует тональность
-    5. Генерирует прогнозы
+    5. Заполняет хранилище признаков за последние дни
+    6. Генерирует прогнозы
     """
     print(f"🔄 Daily data update started at {timezone.now()}")
     
@@ -1049,7 +1186,10 @@ def update_daily_data():
     # 4. Анализируем тональность новых новостей
     analyze_all_sentiment()
     
-    # 5. Генерируем прогнозы
+    # 5. Признаки за сегодня (и пересчет целей прошлых дней)
+    materialize_feature_store()
+    
+    # 6. Генерируем прогнозы
     generate_daily_predictions_classifier()
     
     print(f"✅ Daily data update completed at {timezone.now()}")
@@ -0,0 +1,399 @@
+# subscriptions/tests.py
+
+"""
+Проверки совпадения быстрых реализаций с эталоном
+
+Ускоренные пути (скомпилированный классификатор, векторные признаки,
+индикаторы, дневная сводка тональности, признаки по запросу) обещают
+те же результаты, что и исходный расчет. Тесты ловят расхождение,
+например после обновления sklearn или pandas.
+
+Запуск: python manage.py test subscriptions
+"""
+
+import json
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from sklearn.preprocessing import StandardScaler
+
+from . import feature_store, rolling_state, sentiment_cascade, sentiment_registry, sentiment_rollup
+from .classifier_engines import ENGINES
+from .compiled_classifier import CompiledClassifier, compile_classifier, export_classifier
+from .features import (
+    CURRENT_NEWS_WINDOW, PRICE_WINDOW, compute_feature_frame, feature_columns, load_daily_stats,
+    news_window_features, price_window_features,
+)
+from .indicators import INDICATOR_COLUMNS, compute_indicators, indicator_frame
+from .models import (
+    CoinDailySentiment, CoinDailyStat, CoinRollingState, CoinSnapshot, NewsArticle, NewsSentiment,
+)
+from .sentiment_inference import BatchedSentimentEngine, decode_probabilities
+from .sentiment_registry import registry
+from .sentiment_rollup import PRIMARY_ROLLUP_VERSION, ROLLUP_FIELDS
+
+
+def _classification_data(rows=600, features=6, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(rows, features)) * rng.uniform(0.1, 100, features)
+    logits = X[:, 0] / X[:, 0].std() - 0.5 * X[:, 1] / X[:, 1].std() + rng.normal(scale=1.0, size=rows)
+    return X, (logits > 0).astype(int)
+
+
+def _create_price_history(coin, today, days=40, seed=6):
+    """CoinDailyStat за days дней до today и скользящее состояние, как после collect_historical_prices"""
+    rng = np.random.default_rng(seed)
+    for i in range(days):
+        day = today - timedelta(days=days - 1 - i)
+        stat = CoinDailyStat.objects.create(
+            coin=coin, date=day, price=float(100 * (1 + rng.normal(0, 0.02))),
+            volume=int(rng.integers(1e5, 1e6)),
+        )
+        rolling_state.push_day(coin.id, day, stat.price, stat.volume)
+
+
+class CompiledClassifierParityTests(SimpleTestCase):
+    """CompiledClassifier повторяет scaler.transform + predict_proba / predict бит в бит"""
+
+    def test_predictions_match_sklearn(self):
+        X, y = _classification_data()
+        X_train, X_test = X[:450], X[450:]
+        feature_cols = [f'f{i}' for i in range(X.shape[1])]
+
+        for name, engine in ENGINES.items():
+            with self.subTest(engine=name):
+                scaler = StandardScaler().fit(X_train)
+                model = engine.build().fit(scaler.transform(X_train), y[:450])
+                compiled = CompiledClassifier(compile_classifier(model, scaler, feature_cols))
+
+                expected = model.predict_proba(scaler.transform(X_test))
+                self.assertTrue(np.array_equal(compiled.predict_proba(X_test), expected))
+                self.assertTrue(np.array_equal(compiled.predict(X_test), model.predict(scaler.transform(X_test))))
+
+    def test_exported_npz_matches_sklearn(self):
+        X, y = _classification_data(seed=1)
+        feature_cols = [f'f{i}' for i in range(X.shape[1])]
+
+        for name, engine in ENGINES.items():
+            with self.subTest(engine=name), tempfile.TemporaryDirectory() as tmp:
+                scaler = StandardScaler().fit(X)
+                model = engine.build().fit(scaler.transform(X), y)
+                path = Path(tmp) / 'classifier.npz'
+                export_classifier(model, scaler, feature_cols, path, trained_at=datetime(2026, 10, 18, 13, 40))
+
+                loaded = CompiledClassifier.load(path)
+                self.assertEqual(loaded.feature_cols, feature_cols)
+                self.assertEqual(loaded.trained_at, '20261018_134000')
+                self.assertTrue(np.array_equal(loaded.predict_proba(X), model.predict_proba(scaler.transform(X))))
+
+
+class IndicatorParityTests(SimpleTestCase):
+    """Индикаторы (lfilter, sliding_window_view) совпадают с расчетом через pandas ewm/rolling"""
+
+    def test_matches_pandas_reference(self):
+        rng = np.random.default_rng(2)
+        prices = 100 * np.cumprod(1 + rng.normal(0, 0.03, 250))
+        volumes = rng.uniform(1e5, 1e7, 250)
+        volumes[::11] = np.nan
+
+        actual, _ = compute_indicators(prices, volumes)
+
+        price = pd.Series(prices)
+        volume = pd.Series(volumes).fillna(0.0)
+        ema = {span: price.ewm(span=span, adjust=False).mean() for span in (12, 20, 26)}
+        macd = ema[12] - ema[26]
+        delta = price.diff().fillna(0.0)
+        gain = delta.clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean()
+        loss = (-delta).clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean()
+        band_mean = price.rolling(20, min_periods=1).mean()
+        band_std = price.rolling(20, min_periods=1).std(ddof=0)
+        volume_mean = volume.rolling(20, min_periods=1).mean()
+        volume_std = volume.rolling(20, min_periods=1).std(ddof=0)
+
+        expected = pd.DataFrame({
+            'ema_gap_pct': (price / ema[20] - 1) * 100,
+            'rsi_14': np.where(loss > 0, 100 - 100 / (1 + gain / loss.where(loss > 0, 1.0)),
+                               np.where(gain > 0, 100.0, 50.0)),
+            'macd_pct': macd / price * 100,
+            'macd_hist_pct': (macd - macd.ewm(span=9, adjust=False).mean()) / price * 100,
+            'bollinger_width_pct': 4 * band_std / band_mean * 100,
+            'atr_pct': delta.abs().ewm(alpha=1 / 14, adjust=False).mean() / price * 100,
+            'volume_z': np.where(volume_std > 0, (volume - volume_mean) / volume_std.where(volume_std > 0, 1.0), 0.0),
+        })
+
+        self.assertEqual(list(actual.columns), INDICATOR_COLUMNS)
+        np.testing.assert_allclose(actual.to_numpy(), expected.to_numpy(), rtol=1e-9, atol=1e-9)
+
+    def test_carried_state_matches_full_history(self):
+        rng = np.random.default_rng(7)
+        prices = 100 * np.cumprod(1 + rng.normal(0, 0.03, 120))
+        volumes = rng.uniform(1e5, 1e7, 120)
+
+        full, _ = compute_indicators(prices, volumes)
+        parts, state = [], None
+        for start, end in ((0, 1), (1, 25), (25, 26), (26, 120)):
+            values, state = compute_indicators(prices[start:end], volumes[start:end], state)
+            parts.append(values)
+
+        np.testing.assert_allclose(pd.concat(parts).to_numpy(), full.to_numpy(), rtol=1e-12, atol=1e-12)
+
+
+class FeatureWindowParityTests(SimpleTestCase):
+    """Оконные признаки (features.py) совпадают с прямым перебором дней"""
+
+    def test_price_window_matches_loop(self):
+        rng = np.random.default_rng(3)
+        daily = pd.concat([
+            pd.DataFrame({
+                'coin_id': coin_id,
+                'date': [date(2025, 1, 1) + timedelta(days=i) for i in range(days)],
+                'price': 100 * np.cumprod(1 + rng.normal(0, 0.02, days)),
+                'volume': rng.uniform(1e5, 1e6, days),
+            })
+            for coin_id, days in ((1, 30), (2, PRICE_WINDOW), (3, PRICE_WINDOW - 1))
+        ], ignore_index=True)
+
+        actual = price_window_features(daily).set_index(['coin_id', 'date'])
+        expected_keys = []
+        for coin_id, group in daily.groupby('coin_id'):
+            prices, volumes = group['price'].to_numpy(), group['volume'].to_numpy()
+            for i in range(PRICE_WINDOW - 1, len(group)):
+                window = prices[i - PRICE_WINDOW + 1:i + 1]
+                row = actual.loc[(coin_id, group['date'].iloc[i])]
+                expected_keys.append((coin_id, group['date'].iloc[i]))
+                self.assertAlmostEqual(row['price_trend_7d'], (window[-1] - window[0]) / window[0] * 100, places=10)
+                self.assertAlmostEqual(row['volatility_7d'], float(np.std(window)), places=10)
+                self.assertAlmostEqual(row['avg_price_7d'], float(np.mean(window)), places=10)
+                self.assertAlmostEqual(row['avg_volume_7d'], float(np.mean(volumes[i - PRICE_WINDOW + 1:i + 1])), places=6)
+                if i + 1 < len(group):
+                    self.assertAlmostEqual(row['price_change_percent'], (prices[i + 1] - prices[i]) / prices[i] * 100, places=10)
+                else:
+                    self.assertTrue(np.isnan(row['price_change_percent']))
+
+        self.assertEqual(sorted(actual.index), sorted(expected_keys))
+
+    def test_news_window_matches_loop(self):
+        rng = np.random.default_rng(4)
+        days = [date(2025, 3, 1) + timedelta(days=int(i)) for i in sorted(rng.choice(20, 12, replace=False))]
+        daily = pd.DataFrame({
+            'coin_id': 1,
+            'date': days,
+            'article_count': rng.integers(1, 9, len(days)),
+            'scored_count': rng.integers(0, 5, len(days)),
+            'sentiment_sum': rng.normal(0, 1, len(days)),
+            'positive_count': rng.integers(0, 4, len(days)),
+            'negative_count': rng.integers(0, 4, len(days)),
+            'story_count': rng.integers(1, 5, len(days)),
+        })
+
+        actual = news_window_features(daily, CURRENT_NEWS_WINDOW).set_index('date')
+        first, last = CURRENT_NEWS_WINDOW
+        for day, row in actual.iterrows():
+            window = daily[(daily['date'] >= day - timedelta(days=last)) & (daily['date'] <= day - timedelta(days=first))]
+            scored = window['scored_count'].sum()
+            self.assertEqual(row['news_count'], window['article_count'].sum())
+            self.assertAlmostEqual(row['avg_sentiment'], window['sentiment_sum'].sum() / scored if scored else 0.0, places=12)
+            self.assertEqual(row['positive'], window['positive_count'].sum())
+            self.assertEqual(row['negative'], window['negative_count'].sum())
+
+
+class SentimentRollupParityTests(TestCase):
+    """Инкрементальное обновление сводки совпадает с полной перестройкой и с сырыми новостями"""
+
+    def setUp(self):
+        self.coin = CoinSnapshot.objects.create(coingecko_id='bitcoin', name='Bitcoin', symbol='btc', price=1.0)
+        self.rng = np.random.default_rng(5)
+        self.next_id = 0
+
+    def add_articles(self, count, start):
+        ids = []
+        for _ in range(count):
+            self.next_id += 1
+            published_at = start + timedelta(hours=int(self.rng.integers(0, 24 * 5)))
+            article = NewsArticle.objects.create(
+                coin=self.coin, title=f'news {self.next_id}', url=f'https://example.com/{self.next_id}',
+                source='test', published_at=published_at,
+            )
+            if self.rng.random() < 0.8:
+                NewsSentiment.objects.create(
+                    article=article, sentiment_label='neutral', sentiment_score=float(self.rng.uniform(-1, 1)),
+                )
+            ids.append(article.id)
+        return ids
+
+    def rollup(self):
+        return sorted(
+            CoinDailySentiment.objects.filter(model_version=PRIMARY_ROLLUP_VERSION)
+            .values_list('coin_id', 'date', *ROLLUP_FIELDS)
+        )
+
+    def test_incremental_matches_rebuild_and_raw(self):
+        start = timezone.make_aware(datetime(2025, 5, 1))
+        sentiment_rollup.refresh_for_articles(self.add_articles(40, start))
+        sentiment_rollup.refresh_for_articles(self.add_articles(25, start + timedelta(days=3)))
+        incremental = self.rollup()
+
+        sentiment_rollup.rebuild()
+        self.assertEqual(incremental, self.rollup())
+
+        for coin_id, day, article_count, scored_count, sentiment_sum, positive, negative, stories in incremental:
+            articles = [
+                article for article in NewsArticle.objects.select_related('newssentiment')
+                if timezone.localtime(article.published_at).date() == day
+            ]
+            scores = [a.newssentiment.sentiment_score for a in articles if hasattr(a, 'newssentiment')]
+            self.assertEqual(article_count, len(articles))
+            self.assertEqual(scored_count, len(scores))
+            self.assertAlmostEqual(sentiment_sum, sum(scores), places=9)
+            self.assertEqual(positive, sum(s > sentiment_rollup.POSITIVE_THRESHOLD for s in scores))
+            self.assertEqual(negative, sum(s < sentiment_rollup.NEGATIVE_THRESHOLD for s in scores))
+            self.assertEqual(stories, len(articles))
+
+
+class LiveFeatureParityTests(TestCase):
+    """Признаки по запросу (compute_live_features) совпадают с полным расчетом"""
+
+    def setUp(self):
+        self.coin = CoinSnapshot.objects.create(coingecko_id='ethereum', name='Ethereum', symbol='eth', price=1.0)
+        self.today = date(2025, 6, 30)
+        _create_price_history(self.coin, self.today)
+
+    def test_live_features_match_full_computation(self):
+        for indicators in (False, True):
+            with self.subTest(indicators=indicators):
+                columns = feature_columns(indicators)
+                live = feature_store.compute_live_features([self.coin.id], self.today, indicators=indicators)
+                full = compute_feature_frame(
+                    [self.coin.id], date_from=self.today - timedelta(days=1), date_to=self.today,
+                    indicators=indicators,
+                )
+                self.assertEqual(list(live['date']), [self.today])
+                np.testing.assert_allclose(
+                    live[columns].to_numpy(dtype=float), full[columns].tail(1).to_numpy(dtype=float),
+                    rtol=1e-9, atol=1e-9,
+                )
+
+
+    def test_coins_without_state_use_full_computation(self):
+        CoinRollingState.objects.filter(coin=self.coin).delete()
+        live = feature_store.compute_live_features([self.coin.id], self.today)
+        full = compute_feature_frame([self.coin.id], date_from=self.today - timedelta(days=1), date_to=self.today)
+        self.assertEqual(list(live['date']), [self.today])
+        np.testing.assert_allclose(
+            live[feature_columns()].to_numpy(dtype=float), full[feature_columns()].tail(1).to_numpy(dtype=float),
+            rtol=1e-9, atol=1e-9,
+        )
+
+
+class RollingStateParityTests(TestCase):
+    """Скользящее состояние, обновляемое по дню, совпадает с пересчетом по CoinDailyStat"""
+
+    def setUp(self):
+        self.coin = CoinSnapshot.objects.create(coingecko_id='solana', name='Solana', symbol='sol', price=1.0)
+        _create_price_history(self.coin, date(2025, 6, 30))
+
+    def test_rolling_state_matches_table(self):
+        self.assertEqual(rolling_state.verify([self.coin.id]), [])
+
+    def test_window_indicators_match_indicator_frame(self):
+        carried = rolling_state.window_indicator_frame([self.coin.id])
+        full = indicator_frame(load_daily_stats([self.coin.id])).tail(len(carried))
+
+        self.assertEqual(list(carried['date']), list(full['date']))
+        np.testing.assert_allclose(
+            carried[INDICATOR_COLUMNS].to_numpy(dtype=float), full[INDICATOR_COLUMNS].to_numpy(dtype=float),
+            rtol=1e-9, atol=1e-9,
+        )
+
+    def test_backfilled_day_falls_back_to_full_history(self):
+        first = CoinDailyStat.objects.filter(coin=self.coin).order_by('date').first()
+        stat = CoinDailyStat.objects.create(coin=self.coin, date=first.date - timedelta(days=1), price=90.0, volume=1)
+        rolling_state.push_day(self.coin.id, stat.date, stat.price, stat.volume)
+        self.assertTrue(rolling_state.window_indicator_frame([self.coin.id]).empty)
+
+        # Следующий день сдвигает окно и пересобирает состояние индикаторов
+        last = CoinDailyStat.objects.filter(coin=self.coin).order_by('date').last()
+        stat = CoinDailyStat.objects.create(coin=self.coin, date=last.date + timedelta(days=1), price=101.0, volume=5)
+        rolling_state.push_day(self.coin.id, stat.date, stat.price, stat.volume)
+        self.assertEqual(rolling_state.verify([self.coin.id]), [])
+        self.test_window_indicators_match_indicator_frame()
+
+
+class _FixedProbabilityEngine(BatchedSentimentEngine):
+    """Движок с заданными вероятностями классов по тексту (порядок spec.labels), без модели"""
+
+    PROBABILITIES = {
+        'custom': {'Bullish ETF inflows. ': [0.05, 0.15, 0.80], 'Mixed signals. ': [0.30, 0.40, 0.30]},
+        'finbert': {'Mixed signals. ': [0.20, 0.50, 0.30]},
+    }
+
+    def tokenize(self, texts, tokenizer=None):
+        return [{'input_ids': [0], 'text': text} for text in texts]
+
+    def run_batch(self, batch_features, entry=None):
+        return [self.PROBABILITIES[self.model_name][f['text']] for f in batch_features]
+
+
+class CascadeScaleTests(TestCase):
+    """Оценки custom-модели, принятые каскадом, в шкале FinBERT (P(positive) - P(negative))"""
+
+    def test_accepted_rows_use_full_model_scale(self):
+        rows = [
+            (1, 'Bullish ETF inflows', None, 'h1', None, None, None),
+            (2, 'Mixed signals', None, 'h2', None, None, None),
+        ]
+        entry = lambda name, backend=None: SimpleNamespace(spec=registry.spec(name))
+        make_engine = lambda name, score_mode=None, **kwargs: _FixedProbabilityEngine(name, score_mode=score_mode)
+
+        with mock.patch.object(registry, 'entry', side_effect=entry), \
+                mock.patch.object(sentiment_cascade, 'make_engine', side_effect=make_engine):
+            scorer = sentiment_cascade.CascadeSentimentScorer(threshold=0.6, audit_size=0)
+            accepted, escalated = scorer.score(rows)
+            signed = _FixedProbabilityEngine('custom').predict(['Bullish ETF inflows. '])[0]
+
+        finbert = registry.spec('finbert')
+        # те же вероятности в порядке классов FinBERT (positive, negative, neutral)
+        self.assertAlmostEqual(accepted['sentiment_score'],
+                               decode_probabilities(finbert, [0.80, 0.05, 0.15])['sentiment_score'])
+        self.assertAlmostEqual(accepted['sentiment_score'], 0.75)
+        self.assertEqual(accepted['source_model'], f"{registry.spec('custom').version}@difference")
+        self.assertAlmostEqual(escalated['sentiment_score'], 0.20 - 0.50)
+        self.assertEqual(escalated['source_model'], finbert.version)
+        # Без каскада custom-модель по-прежнему в своей шкале
+        self.assertAlmostEqual(signed['sentiment_score'], 0.80)
+
+
+class CustomModelVersionTests(SimpleTestCase):
+    """Версия custom модели - из обученного артефакта, новая с каждым переобучением"""
+
+    def test_version_follows_trained_artifact(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            model_dir = Path(tmp) / 'crypto_sentiment'
+            model_dir.mkdir()
+            (model_dir / 'config.json').write_text('{}')
+            specs = {'custom': sentiment_registry._custom_spec('custom_none')}
+
+            with mock.patch.object(sentiment_registry, 'CUSTOM_MODEL_PATH', model_dir):
+                models = sentiment_registry.SentimentModelRegistry(specs)
+                unversioned = models.spec('custom').version
+
+                (model_dir / 'model_version.json').write_text(json.dumps({'version': 'custom_distilbert_20261018_1340'}))
+                first = models.spec('custom').version
+                version_file = model_dir / 'model_version.json'
+                mtime_ns = version_file.stat().st_mtime_ns
+                version_file.write_text(json.dumps({'version': 'custom_distilbert_20261019_0900'}))
+                os.utime(version_file, ns=(mtime_ns + 10 ** 9, mtime_ns + 10 ** 9))
+                second = models.spec('custom').version
+
+        self.assertTrue(unversioned.startswith('custom_'))
+        self.assertNotEqual(unversioned, 'custom_none')
+        self.assertEqual(first, 'custom_distilbert_20261018_1340')
+        self.assertEqual(second, 'custom_distilbert_20261019_0900')
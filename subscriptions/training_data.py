@@ -0,0 +1,70 @@
+# subscriptions/training_data.py
+
+"""
+Датасет классификатора направления на диске (Parquet)
+
+Датасет пишется с явной схемой (типы не теряются, date остается датой)
+в каталог с разбиением по месяцам:
+
+  classification_data/month=YYYY-MM/part-0.parquet
+
+Чтение - через pyarrow с memory_map и выбором колонок: читаются только
+нужные обучению признаки, а не весь файл с разбором текста, как в CSV.
+
+Каталог заменяется целиком: новая версия пишется рядом и подменяет
+старую переименованием, поэтому обучение никогда не читает
+наполовину записанный датасет.
+"""
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .artifacts import atomic_directory
+from .features import DATASET_COLUMNS
+
+# Все признаки и price_change_percent - float64
+COLUMN_TYPES = {
+    'coin': pa.string(),
+    'date': pa.date32(),
+    'target': pa.int8(),
+}
+
+
+def classification_schema(columns):
+    """Схема датасета: DATASET_COLUMNS и дополнительные признаки (индикаторы)"""
+    return pa.schema([(name, COLUMN_TYPES.get(name, pa.float64())) for name in columns])
+
+
+CLASSIFICATION_SCHEMA = classification_schema(DATASET_COLUMNS)
+
+
+def write_classification_dataset(df, root):
+    """
+    Пишет датасет (DATASET_COLUMNS + дополнительные признаки) в root
+    с разбиением по месяцам, возвращает число файлов
+    """
+    columns = DATASET_COLUMNS + [name for name in df.columns if name not in DATASET_COLUMNS]
+    schema = classification_schema(columns)
+
+    months = pd.to_datetime(df['date']).dt.strftime('%Y-%m')
+    files = 0
+    # Новая версия пишется рядом и подменяет каталог целиком
+    with atomic_directory(root) as tmp:
+        for month, month_df in df.groupby(months, sort=True):
+            table = pa.Table.from_pandas(month_df[columns], schema=schema, preserve_index=False)
+            partition = tmp / f'month={month}'
+            partition.mkdir()
+            pq.write_table(table, partition / 'part-0.parquet')
+            files += 1
+    return files
+
+
+def read_classification_dataset(root, columns=None):
+    """
+    Читает датасет (memory_map, только columns). date - datetime64,
+    числовые колонки - с типами из схемы
+    """
+    # partitioning=None: колонка month из имен каталогов не нужна
+    table = pq.read_table(root, columns=columns, memory_map=True, partitioning=None)
+    return table.to_pandas(date_as_object=False)
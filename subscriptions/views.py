@@ -185,23 +185,27 @@ def get_all_direction_predictions(request):
 def get_model_info(request):
     """
     GET /api/model/info/
-    Возвращает информацию о модели из ml/models/model_report.json
+    Возвращает информацию о модели из ml/models/model_report.json,
+    точность реальных прогнозов (ml/models/prediction_accuracy.json,
+    обновляется каждую ночь) и текущие версии файлов моделей (artifacts)
     """
-    import json
-    from pathlib import Path
+    from .artifacts import ML_MODELS_DIR, cache, describe, load_json
+    from .prediction_outcomes import live_accuracy, load_summary
     
-    BASE_DIR = Path(__file__).resolve().parent.parent
-    MODEL_REPORT_PATH = BASE_DIR / 'ml' / 'models' / 'model_report.json'
+    MODEL_REPORT_PATH = ML_MODELS_DIR / 'model_report.json'
     
     try:
-        with open(MODEL_REPORT_PATH, 'r') as f:
-            report = json.load(f)
-        return JsonResponse(report)
+        # Отчет читается один раз и перечитывается после перезаписи
+        report = dict(cache.get(MODEL_REPORT_PATH, load_json))
     except FileNotFoundError:
-        return JsonResponse({
-            'model_version': 'classifier_v2',
-            'test_accuracy': 0.531,
-            'improvement': '+3.1%',
+        # Отчет еще не сгенерирован: точность - только по реальным прогнозам
+        report = {
+            'model_version': None,
             'description': 'Binary classifier for crypto price direction prediction',
             'models_location': str(MODEL_REPORT_PATH.parent)
-        })
\ No newline at end of file
+        }
+    # Сводка свежее отчета: читается из кэша, без запросов к БД
+    report['live_accuracy'] = load_summary()
+    report['headline'] = live_accuracy(report['live_accuracy'])
+    report['artifacts'] = describe()
+    return JsonResponse(report)
\ No newline at end of file